@@ -0,0 +1,61 @@
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from scripts.dataset import DatasetIndex
+from scripts.validate import content_hashes
+from scripts.workers import default_jobs
+
+
+def create_files(directory: Path, count: int, size: int):
+    block = os.urandom(min(size, 1024 * 1024))
+    for i in range(count):
+        with open(directory / f"euro_brown_filled_light_labeled_open_{i + 1:03d}.jpg", "wb") as f:
+            f.write(i.to_bytes(8, "little"))
+            remaining = size - 8
+            while remaining > 0:
+                f.write(block[:remaining])
+                remaining -= len(block)
+
+
+def worker_counts(max_jobs: int):
+    counts = []
+    jobs = 1
+    while jobs < max_jobs:
+        counts.append(jobs)
+        jobs *= 2
+    counts.append(max_jobs)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure hashing throughput against worker count.")
+    parser.add_argument("--files", type=int, default=64)
+    parser.add_argument("--size-mb", type=float, default=8)
+    parser.add_argument("--max-jobs", type=int, default=default_jobs())
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        create_files(directory, args.files, size)
+        index = DatasetIndex.build(directory)
+        total_mb = args.files * size / (1024 * 1024)
+
+        print(f"Hashing {args.files} files, {total_mb:.0f} MiB in total")
+        print(f"{'jobs':>6} {'seconds':>10} {'MiB/s':>10} {'speedup':>8}")
+
+        baseline = None
+        for jobs in worker_counts(args.max_jobs):
+            start = time.perf_counter()
+            content_hashes(index.files, jobs=jobs)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"{jobs:>6} {elapsed:>10.3f} {total_mb / elapsed:>10.1f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import gc
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.synthetic import HEIC_EVERY, combinations
+from scripts.utils import parse_filename, parse_names
+
+
+def synthetic_names(count: int):
+    groups = ["_".join(values) for values in combinations()]
+    counters = [0] * len(groups)
+    names = []
+    for number in range(count):
+        group = number % len(groups)
+        counters[group] += 1
+        extension = "HEIC" if number % HEIC_EVERY == HEIC_EVERY - 1 else "jpg"
+        names.append(f"{groups[group]}_{counters[group]:03d}.{extension}")
+    return names
+
+
+def dict_record(name: str):
+    """The former parse_filename result: an 8-key dict of freshly split strings."""
+    path = Path(name)
+    parts = path.stem.split("_")
+    if len(parts) != 7:
+        return None
+    return {
+        "type": parts[0],
+        "color": parts[1],
+        "fill": parts[2],
+        "liquid": parts[3],
+        "label": parts[4],
+        "cap": parts[5],
+        "index": parts[6],
+        "ext": path.suffix.lower().lstrip("."),
+    }
+
+
+def dict_records(names):
+    """Records plus the group key tuple DatasetIndex built per file."""
+    out = []
+    for name in names:
+        info = dict_record(name)
+        out.append((info, tuple(info[field] for field in ("type", "color", "fill", "liquid", "label", "cap"))))
+    return out
+
+
+def compact_single(names):
+    out = []
+    for name in names:
+        info = parse_filename(Path(name))
+        out.append((info, info.key))
+    return out
+
+
+def compact_batch(names):
+    return [(info, info.key) for info in parse_names(names)]
+
+
+def measure(build, names):
+    """Return (seconds, bytes held by the result) of building records for names.
+
+       Time is taken in a separate run, since tracemalloc slows allocation down.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    records = build(names)
+    elapsed = time.perf_counter() - start
+    del records
+
+    gc.collect()
+    tracemalloc.start()
+    records = build(names)
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    return elapsed, held
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory and speed of filename record representations.")
+    parser.add_argument("--count", type=int, default=1000000)
+    args = parser.parse_args()
+
+    names = synthetic_names(args.count)
+    print(f"Parsing {args.count} filenames")
+    print(f"{'representation':<24} {'seconds':>9} {'MiB':>9} {'bytes/file':>11}")
+    for label, build in [("dict (former)", dict_records), ("compact, per file", compact_single), ("compact, batch", compact_batch)]:
+        seconds, held = measure(build, names)
+        print(f"{label:<24} {seconds:>9.2f} {held / 2 ** 20:>9.1f} {held / args.count:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from benchmarks.synthetic import PAYLOADS, generate
+from scripts import annotate, docs, stats, validate
+from scripts.dataset import DatasetIndex
+from scripts.utils import ATTR_FIELDS, parse_filename, parse_names
+
+import_script = importlib.import_module("scripts.import")
+
+DEFAULT_SIZES = [10000, 30000, 100000]
+DEFAULT_THRESHOLD = 0.2
+
+
+class Benchmark(NamedTuple):
+    name: str
+    run: Callable  # run(index) -> None; throughput is reported per indexed file
+
+
+def run_parse_filename(index):
+    for file in index.files:
+        parse_filename(file.path)
+
+
+def run_parse_names(index):
+    parse_names([file.name for file in index.files])
+
+
+def run_validate(index):
+    if not validate.main(return_success=True, index=index):
+        raise RuntimeError("Synthetic dataset did not validate")
+
+
+def run_stats(index):
+    stats.collect_statistics({field: None for field in ATTR_FIELDS}, index)
+
+
+def run_annotate(index):
+    annotate.generate_annotations(index)
+
+
+def run_docs(index):
+    docs.main(index)
+
+
+def run_import_allocation(index):
+    """Plan an import of one new image per existing one, allocating group indices."""
+    entries = [dict(file.info, filename=f"new_{number}.jpg") for number, file in enumerate(index.records)]
+    available = {entry["filename"] for entry in entries}
+    import_script.plan_entries(entries, available, DatasetIndex(index.images_dir, index.files))
+
+
+BENCHMARKS = [
+    Benchmark("parse_filename", run_parse_filename),
+    Benchmark("parse_names", run_parse_names),
+    Benchmark("validate", run_validate),
+    Benchmark("stats", run_stats),
+    Benchmark("annotate", run_annotate),
+    Benchmark("docs", run_docs),
+    Benchmark("import_allocation", run_import_allocation),
+]
+
+
+def time_benchmark(benchmark, index, repeat):
+    """Best wall time of repeat runs; output of the benchmarked code is discarded."""
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            benchmark.run(index)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_suite(sizes, root: Path, payload="tiny", repeat=3, benchmarks=BENCHMARKS):
+    """Time every benchmark on synthetic datasets of the given sizes.
+
+       Each dataset lives in its own working directory under root, so
+       caches and generated files of one size do not leak into another.
+    """
+    results = {benchmark.name: {} for benchmark in benchmarks}
+    cwd = os.getcwd()
+    try:
+        for size in sizes:
+            workspace = root / str(size)
+            generate(workspace / "images", size, payload)
+            os.chdir(workspace)
+            index = DatasetIndex.build(Path("images"))
+
+            for benchmark in benchmarks:
+                seconds = time_benchmark(benchmark, index, repeat)
+                results[benchmark.name][str(size)] = {
+                    "seconds": round(seconds, 6),
+                    "items_per_s": round(len(index.files) / seconds, 1),
+                }
+    finally:
+        os.chdir(cwd)
+    return {"version": 1, "sizes": list(sizes), "payload": payload, "results": results}
+
+
+def find_regressions(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return (benchmark, size, baseline, current) where throughput fell by more than threshold."""
+    regressions = []
+    for name, by_size in current["results"].items():
+        for size, result in by_size.items():
+            previous = baseline["results"].get(name, {}).get(size)
+            if previous and result["items_per_s"] < previous["items_per_s"] * (1 - threshold):
+                regressions.append((name, size, previous["items_per_s"], result["items_per_s"]))
+    return regressions
+
+
+def print_results(report):
+    sizes = [str(size) for size in report["sizes"]]
+    smallest = sizes[0]
+    print(f"{'benchmark':<20} {'files':>9} {'seconds':>10} {'files/s':>12} {'scaling':>8}")
+    for name, by_size in report["results"].items():
+        for size in sizes:
+            result = by_size[size]
+            # Time growth relative to dataset growth; 1.00 means linear scaling.
+            scaling = (result["seconds"] / by_size[smallest]["seconds"]) / (int(size) / int(smallest))
+            print(f"{name:<20} {size:>9} {result['seconds']:>10.4f} {result['items_per_s']:>12.0f} {scaling:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dataset scripts on synthetic datasets.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated dataset sizes (default: %(default)s)")
+    parser.add_argument("--payload", choices=PAYLOADS, default="tiny")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative throughput drop (default: %(default)s)")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run_suite(sizes, Path(tmp), args.payload, args.repeat)
+
+    print_results(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.baseline:
+        regressions = find_regressions(report, json.loads(args.baseline.read_text(encoding="utf-8")), args.threshold)
+        for name, size, before, after in regressions:
+            print(f"Regression: {name} at {size} files: {before:.0f} -> {after:.0f} files/s")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import os
+import struct
+import time
+from pathlib import Path
+
+from scripts.utils import SCHEMA
+
+PAYLOADS = ["tiny", "sparse", "real"]
+HEIC_EVERY = 10
+
+
+def combinations():
+    """All attribute tuples that pass validation, in a fixed order."""
+    return list(SCHEMA.combinations)
+
+
+def jpeg_header(number: int) -> bytes:
+    """Smallest JPEG prefix the header parser accepts; the number makes the content unique."""
+    sof = struct.pack(">BHHB", 8, 3024, 4032, 1) + b"\x01\x11\x00"
+    sos = b"\x01\x01\x00\x00\x3f\x00"
+    return (
+        b"\xff\xd8"
+        + b"\xff\xc0" + struct.pack(">H", len(sof) + 2) + sof
+        + b"\xff\xda" + struct.pack(">H", len(sos) + 2) + sos
+        + number.to_bytes(8, "little")
+    )
+
+
+def box(kind: bytes, payload: bytes, version_flags=None) -> bytes:
+    if version_flags is not None:
+        payload = struct.pack(">I", version_flags) + payload
+    return struct.pack(">I", len(payload) + 8) + kind + payload
+
+
+def heif_header() -> bytes:
+    ipco = box(b"ipco", box(b"ispe", struct.pack(">II", 4032, 3024), 0))
+    ipma = box(b"ipma", struct.pack(">IHBB", 1, 1, 1, 0x81), 0)
+    meta = box(b"meta", box(b"pitm", struct.pack(">H", 1), 0) + box(b"iprp", ipco + ipma), 0)
+    return box(b"ftyp", b"heic" + bytes(4) + b"mif1heic") + meta
+
+
+def write_image(path: Path, number: int, payload: str, size: int, block: bytes):
+    """Write a header-valid image; everything past the header is filler."""
+    unique = number.to_bytes(8, "little")
+    if path.suffix == ".HEIC":
+        head = heif_header()
+        total = len(head) + 16 if payload == "tiny" else max(size, len(head) + 16)
+        # The rest of the file is a single mdat box.
+        prefix = head + struct.pack(">I", total - len(head)) + b"mdat" + unique
+        trailer = b""
+    else:
+        prefix = jpeg_header(number)
+        trailer = b"\xff\xd9"
+        total = len(prefix) + 2 if payload == "tiny" else max(size, len(prefix) + 2)
+
+    with open(path, "wb") as f:
+        f.write(prefix)
+        if payload == "real":
+            remaining = total - len(prefix) - len(trailer)
+            while remaining > 0:
+                remaining -= f.write(block[:remaining])
+        f.truncate(total - len(trailer))
+        f.seek(0, 2)
+        f.write(trailer)
+
+
+def generate(directory: Path, count: int, payload="tiny", size=2 * 1024 * 1024):
+    """Create count validly named, unique images spread over all attribute combinations.
+
+       Groups are filled round-robin, so every group has consecutive indices
+       from 1. "tiny" files hold only headers, "sparse" files have the given
+       size without using disk space, "real" files are written in full.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    groups = combinations()
+    counters = [0] * len(groups)
+    block = os.urandom(min(size, 1024 * 1024)) if payload == "real" else b""
+
+    for number in range(count):
+        group = number % len(groups)
+        counters[group] += 1
+        extension = "HEIC" if number % HEIC_EVERY == HEIC_EVERY - 1 else "jpg"
+        name = "_".join(groups[group]) + f"_{counters[group]:03d}.{extension}"
+        write_image(directory / name, number, payload, size, block)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic images/ tree.")
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--payload", choices=PAYLOADS, default="tiny")
+    parser.add_argument("--size-kb", type=int, default=2048, help="File size for sparse and real payloads")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    generate(args.directory, args.count, args.payload, args.size_kb * 1024)
+    print(f"Generated {args.count} files in {time.perf_counter() - start:.1f} s: {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
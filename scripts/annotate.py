@@ -1,82 +1,263 @@
+import argparse
+import contextlib
 import json
+import mmap
+import os
+import zlib
+from array import array
 from pathlib import Path
-from .utils import parse_filename
+from .bitmaps import BitmapIndex
+from .cache import FileCache
+from .columnar import load_columns, write_columns
+from .dataset import DatasetIndex
+from .derive import rendered_paths
+from .headers import image_headers
+from .instrument import instrumented
 
 IMAGES_DIR = Path("images")
 OUTPUT_DIR = Path("annotations")
 OUTPUT_FILE = OUTPUT_DIR / "annotations.json"
 
+# Pieces of the exact layout json.dump({"images": [...]}, f, indent=2) produces.
+JSON_HEADER = '{\n  "images": ['
+JSON_FIRST = "\n    "
+JSON_SEPARATOR = ",\n    "
+JSON_FOOTER = "\n  ]\n}"
+JSON_FOOTER_EMPTY = "]\n}"
 
-def generate_annotations():
-    annotations = []
-    groups = {}
 
-    for file in IMAGES_DIR.iterdir():
-        if file.is_dir() or file.name.startswith("."):
-            continue
+def build_entry(file, group_size, header, renditions):
+    info = file.info
 
-        info = parse_filename(file)
-        if info is None:
-            continue
+    return {
+        "filename": file.name,
+        "extension": file.path.suffix[1:].lower(),
+        "collection": {
+          "index": int(info["index"]),
+          "of": group_size,
+        },
+        "parameters": {
+          "type": info["type"],
+          "color": info["color"],
+          "fill": info["fill"],
+          "liquid": info["liquid"],
+          "label": info["label"],
+          "cap": info["cap"]
+        },
+        "dimensions": {
+          "width": header["width"],
+          "height": header["height"],
+          "orientation": header["orientation"],
+        },
+        "renditions": {name: path.as_posix() for name, path in renditions.items()}
+    }
+
+
+def entry_json(entry) -> str:
+    return json.dumps(entry, indent=2).replace("\n", JSON_FIRST)
+
+
+def renditions_checksum(entry) -> int:
+    return zlib.crc32(json.dumps(entry["renditions"], sort_keys=True).encode("utf-8"))
 
-        key = (
-            info["type"],
-            info["color"],
-            info["fill"],
-            info["liquid"],
-            info["label"],
-            info["cap"],
-        )
 
-        groups[key] = groups.get(key, 0) + 1
+class PreviousAnnotations:
+    """Annotations of the previous run: columnar file plus mapped JSON text."""
 
-    for file in sorted(IMAGES_DIR.iterdir()):
-        if file.is_dir() or file.name.startswith("."):
-            continue
+    def __init__(self, columns, text):
+        self.columns = columns
+        self.text = text
 
-        info = parse_filename(file)
-        if info is None:
-            continue
+    @classmethod
+    def load(cls, json_file: Path, columns_file: Path):
+        if not json_file.exists() or not columns_file.exists():
+            return None
 
-        key = (
-            info["type"],
-            info["color"],
-            info["fill"],
-            info["liquid"],
-            info["label"],
-            info["cap"],
+        columns = load_columns(columns_file)
+        if (any(name not in columns.columns for name in ("json_end", "width", "renditions")) or len(columns) == 0
+                or json_file.stat().st_size != columns["json_end"][-1] + len(JSON_FOOTER)):
+            columns.close()
+            return None
+
+        with open(json_file, "rb") as f:
+            text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(columns, text)
+
+    def close(self):
+        """Unmap both files, so that they can be replaced (not possible while mapped on Windows)."""
+        self.columns.close()
+        self.text.close()
+
+    def reusable(self, row, file, group_size, checksum) -> bool:
+        columns = self.columns
+        return (
+            columns["of"][row] == group_size
+            and columns["renditions"][row] == checksum
+            and columns["size"][row] == file.size
+            and columns["mtime_ns"][row] == file.mtime_ns
         )
 
-        entry = {
-            "filename": file.name,
-            "extension": file.suffix[1:].lower(),
-            "collection": {
-              "index": int(info["index"]),
-              "of": groups[key],
-            },
-            "parameters": {
-              "type": info["type"],
-              "color": info["color"],
-              "fill": info["fill"],
-              "liquid": info["liquid"],
-              "label": info["label"],
-              "cap": info["cap"]
-            }
-        }
-
-        annotations.append(entry)
+
+def plan_rows(index, entries, previous=None):
+    """Yield (file, entry, previous_row) for every annotated file in output order.
+
+       entries builds the entry of a file. previous_row points at an
+       identical entry of the previous run, or is None when the entry has to
+       be regenerated: the file is new or changed, or its group size or
+       renditions changed. Both listings are sorted by name, so they are
+       merged in a single pass.
+    """
+    row = 0
+    count = len(previous.columns) if previous is not None else 0
+
+    for file in index.records:
+        entry = entries(file)
+        while row < count and previous.columns.filename(row) < file.name:
+            row += 1
+
+        if row < count and previous.columns.filename(row) == file.name:
+            reuse = previous.reusable(row, file, entry["collection"]["of"], renditions_checksum(entry))
+            yield file, entry, row if reuse else None
+            row += 1
+        else:
+            yield file, entry, None
+
+
+def stream_annotations(index, entries, out, previous, rows, counts):
+    """Write annotations JSON to `out` entry by entry, yielding each entry.
+
+       Unchanged runs of entries are copied from the previous file as raw text
+       instead of being serialized again. Per-entry byte spans, source stat
+       info and dimensions are appended to the arrays in `rows` for the
+       columnar file. previous is closed once the last entry was copied.
+    """
+    position = out.write(JSON_HEADER)
+    run = None  # [old_start, old_end, new_start] of entries being copied verbatim
+
+    def flush():
+        old_start, old_end, _ = run
+        return out.write(previous.text[old_start:old_end].decode("ascii"))
+
+    for number, (file, entry, row) in enumerate(plan_rows(index, entries, previous)):
+        separator = JSON_FIRST if number == 0 else JSON_SEPARATOR
+
+        if row is not None:
+            start = previous.columns["json_start"][row]
+            end = previous.columns["json_end"][row]
+
+            if run is not None and start == run[1] + len(JSON_SEPARATOR):
+                run[1] = end
+            else:
+                if run is not None:
+                    position += flush()
+                position += out.write(separator)
+                run = [start, end, position]
+
+            entry_start = run[2] + (start - run[0])
+            entry_end = entry_start + (end - start)
+            counts["reused"] += 1
+        else:
+            if run is not None:
+                position += flush()
+                run = None
+            position += out.write(separator)
+            entry_start = position
+            position += out.write(entry_json(entry))
+            entry_end = position
+            counts["generated"] += 1
+
+        rows["json_start"][1].append(entry_start)
+        rows["json_end"][1].append(entry_end)
+        dimensions = entry["dimensions"]
+        rows["size"][1].append(file.size)
+        rows["mtime_ns"][1].append(file.mtime_ns)
+        rows["width"][1].append(dimensions["width"] or 0)
+        rows["height"][1].append(dimensions["height"] or 0)
+        rows["orientation"][1].append(dimensions["orientation"] or 0)
+        rows["renditions"][1].append(renditions_checksum(entry))
+        yield entry
+
+    if run is not None:
+        position += flush()
+    if previous is not None:
+        previous.close()
+    out.write(JSON_FOOTER if rows["json_start"][1] else JSON_FOOTER_EMPTY)
+
+
+def write_bitmaps(columns_file: Path, bitmaps_file: Path):
+    with load_columns(columns_file) as columns:
+        BitmapIndex.from_columns(columns.vocabulary, columns).write(bitmaps_file)
+
+
+@instrumented("generate_annotations")
+def generate_annotations(index=None, incremental=False, cache=None):
+    """Write annotations JSON, columns and bitmaps; returns reused/generated counts.
+
+       A FileCache that is already open (e.g. in watch mode) can be passed
+       in, otherwise the persistent cache is opened for this run.
+    """
+    if index is None:
+        index = DatasetIndex.build(IMAGES_DIR)
+
+    columns_file = OUTPUT_FILE.with_suffix(".npz")
+    bitmaps_file = OUTPUT_FILE.with_name("bitmaps.json")
+    previous = PreviousAnnotations.load(OUTPUT_FILE, columns_file) if incremental else None
+
+    with contextlib.nullcontext(cache) if cache is not None else FileCache() as cache:
+        headers = image_headers(index.records, cache)
+    renditions = rendered_paths(index.records)
+
+    def entries(file):
+        return build_entry(file, index.group_size(file.key), headers[file.name], renditions.get(file.name, {}))
+
+    if previous is not None:
+        rows = [row for _, _, row in plan_rows(index, entries, previous)]
+        if rows == list(range(len(previous.columns))):
+            previous.close()
+            if not bitmaps_file.exists():
+                write_bitmaps(columns_file, bitmaps_file)
+            print(f"Annotations up to date: {OUTPUT_FILE}")
+            print(f"Total annotated images: {len(rows)}")
+            return {"reused": len(rows), "generated": 0}
 
     OUTPUT_DIR.mkdir(exist_ok=True)
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump({"images": annotations}, f, indent=2)
+    tmp = OUTPUT_FILE.with_name(OUTPUT_FILE.name + ".tmp")
+    counts = {"reused": 0, "generated": 0}
+    rows = {
+        name: (typecode, array(typecode))
+        for name, typecode in [
+            ("json_start", "Q"), ("json_end", "Q"), ("size", "Q"), ("mtime_ns", "Q"),
+            ("width", "I"), ("height", "I"), ("orientation", "B"), ("renditions", "I"),
+        ]
+    }
+
+    with open(tmp, "w", encoding="utf-8") as f:
+        write_columns(stream_annotations(index, entries, f, previous, rows, counts), columns_file, rows)
+    os.replace(tmp, OUTPUT_FILE)
+    write_bitmaps(columns_file, bitmaps_file)
 
     print(f"Annotations written to: {OUTPUT_FILE}")
-    print(f"Total annotated images: {len(annotations)}")
+    print(f"Columnar annotations written to: {columns_file}")
+    print(f"Bitmap index written to: {bitmaps_file}")
+    print(f"Total annotated images: {counts['reused'] + counts['generated']}")
+    if incremental:
+        print(f"Reused entries: {counts['reused']}, regenerated entries: {counts['generated']}")
+    return counts
+
+
+def load_options():
+    parser = argparse.ArgumentParser(description="Generate dataset annotations.")
+    parser.add_argument(
+        "--incremental", "-i", action="store_true",
+        help="Only regenerate entries of new, changed or resized groups"
+    )
+    return parser.parse_args()
 
 
-def main():
-    generate_annotations()
+def main(index=None, incremental=False):
+    generate_annotations(index, incremental)
 
 
 if __name__ == "__main__":
-    main()
+    options = load_options()
+    main(incremental=options.incremental)
@@ -0,0 +1,145 @@
+import collections
+import json
+from pathlib import Path
+
+from .stats import code_column, parse_filter
+from .utils import ATTR_FIELDS
+
+TO_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+def code_digits(column, count):
+    """Yield one b"0"/b"1" digit string per code of a code column, digit i for row i.
+
+       uint8 columns (bytes) go through bytes.translate; wider array columns
+       are split into row lists per code in one pass.
+    """
+    if isinstance(column, bytes):
+        for code in range(count):
+            table = bytes(int(byte == code) for byte in range(256))
+            yield column.translate(table).translate(TO_DIGITS)
+        return
+    rows = collections.defaultdict(list)
+    for row, code in enumerate(column):
+        rows[code].append(row)
+    for code in range(count):
+        digits = bytearray(b"0" * len(column))
+        for row in rows[code]:
+            digits[row] = ord("1")
+        yield digits
+
+
+def bit_count(bits: int) -> int:
+    return bin(bits).count("1")
+
+
+def encode_runs(bits: int, size: int):
+    """Run-length encode a bitset as alternating lengths of 0- and 1-runs, starting with 0s."""
+    digits = format(bits, "b").zfill(size)[::-1] if size else ""
+    runs = []
+    current = "0"
+    position = 0
+    while position < size:
+        end = digits.find("1" if current == "0" else "0", position)
+        end = size if end == -1 else end
+        runs.append(end - position)
+        position = end
+        current = "1" if current == "0" else "0"
+    return runs
+
+
+def decode_runs(runs) -> int:
+    bits = 0
+    position = 0
+    for number, length in enumerate(runs):
+        if number % 2:
+            bits |= ((1 << length) - 1) << position
+        position += length
+    return bits
+
+
+class BitmapIndex:
+    """One bitset per value of every attribute; bit i stands for row i.
+
+       Bitsets are Python integers, so filters are answered with & and |
+       over machine words instead of a scan over rows. On disk each bitset is
+       stored run-length encoded, which is compact because rows are sorted by
+       filename and therefore grouped by attributes.
+    """
+
+    def __init__(self, size, bitmaps):
+        self.size = size
+        self.bitmaps = bitmaps
+        self.all = (1 << size) - 1
+
+    @classmethod
+    def from_columns(cls, vocabulary, columns, fields=ATTR_FIELDS):
+        """Build from code columns (e.g. AnnotationColumns or StatsEngine), uint8 or wider."""
+        size = len(columns[fields[0]])
+        bitmaps = {}
+        for field in fields:
+            column = code_column(columns[field])
+            bitmaps[field] = {}
+            for value, digits in zip(vocabulary[field], code_digits(column, len(vocabulary[field]))):
+                bits = int(digits[::-1], 2) if digits else 0
+                if bits:
+                    bitmaps[field][value] = bits
+        return cls(size, bitmaps)
+
+    def values(self, field, values):
+        bits = 0
+        for value in values:
+            bits |= self.bitmaps[field].get(value, 0)
+        return bits
+
+    def query(self, filters) -> int:
+        """Return bitset of rows matching filters in the stats syntax ("amber,tulip", "!empty")."""
+        bits = self.all
+        for field, spec in filters.items():
+            if spec is None:
+                continue
+            values, negated = parse_filter(spec)
+            selected = self.values(field, values)
+            bits &= (self.all & ~selected) if negated else selected
+        return bits
+
+    def count(self, filters) -> int:
+        return bit_count(self.query(filters))
+
+    def counts(self, field, bits=None):
+        """Number of rows per value of field among rows in bits."""
+        bits = self.all if bits is None else bits
+        return {value: bit_count(bitmap & bits) for value, bitmap in self.bitmaps[field].items()}
+
+    @staticmethod
+    def rows(bits: int):
+        """Yield row numbers of set bits."""
+        while bits:
+            lowest = bits & -bits
+            yield lowest.bit_length() - 1
+            bits ^= lowest
+
+    def to_json(self):
+        return {
+            "size": self.size,
+            "fields": {
+                field: {value: encode_runs(bits, self.size) for value, bits in bitmaps.items()}
+                for field, bitmaps in self.bitmaps.items()
+            },
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["size"], {
+            field: {value: decode_runs(runs) for value, runs in bitmaps.items()}
+            for field, bitmaps in data["fields"].items()
+        })
+
+    def write(self, path: Path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: Path):
+        with open(path, encoding="utf-8") as f:
+            return cls.from_json(json.load(f))
@@ -1,32 +1,83 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from io import StringIO
+from typing import Callable, NamedTuple
 import contextlib
+import hashlib
+import json
 import sys
+import threading
 
-from scripts import validate, stats, annotate, docs
+from scripts import validate, stats, derive, annotate, docs, package, manifest
+from scripts.cache import CACHE_DIR
+from scripts.dataset import DatasetIndex, IMAGES_DIR
+from scripts.instrument import RECORDER
+from scripts.schema import SCHEMA_FILE
 
 
 TEMPLATE = Path("templates/readme.md")
 README = Path("readme.md")
+SCRIPTS_DIR = Path("scripts")
+STATE_FILE = CACHE_DIR / "build.json"
+PROFILE_FILE = CACHE_DIR / "profile.json"
 
 STATS_START = "<!-- STATS_START -->"
 STATS_END = "<!-- STATS_END -->"
 
 
-def run_validation():
+class StageOutput:
+    """Stand-in for sys.stdout that keeps output of concurrent stages apart.
+
+       Text printed by a thread inside capture() goes to that capture's
+       buffer; everything else is passed on to the real stream.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buffers = getattr(self.local, "buffers", None)
+        return (buffers[-1] if buffers else self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    @contextlib.contextmanager
+    def capture(self):
+        buffers = self.local.__dict__.setdefault("buffers", [])
+        buffers.append(StringIO())
+        try:
+            yield buffers[-1]
+        finally:
+            buffers.pop()
+
+
+@contextlib.contextmanager
+def captured_output():
+    if isinstance(sys.stdout, StageOutput):
+        with sys.stdout.capture() as stream:
+            yield stream
+    else:
+        stream = StringIO()
+        with contextlib.redirect_stdout(stream):
+            yield stream
+
+
+def run_validation(index):
     print("Running validation...")
-    ok = validate.main(return_success=True)
+    ok = validate.main(return_success=True, index=index)
     if not ok:
         print("Validation failed. Aborting build.")
         sys.exit(1)
     print("Validation successful.\n")
 
 
-def capture_stats_output():
+def capture_stats_output(index):
     print("Collecting statistics...")
-    stream = StringIO()
-    with contextlib.redirect_stdout(stream):
-        stats.main()
+    with captured_output() as stream:
+        stats.main(index, args=[])
     output = stream.getvalue().strip()
     print("Statistics collected.\n")
     return output
@@ -53,29 +104,251 @@ def update_readme(stats_block: str):
     print("readme.md updated.\n")
 
 
-def run_annotations():
+def run_readme(index):
+    update_readme(capture_stats_output(index))
+
+
+def run_derive(index):
+    print("Deriving images...")
+    ok = derive.main(index)
+    if not ok:
+        print("Deriving images failed. Aborting build.")
+        sys.exit(1)
+    print("Derived images ready.\n")
+
+
+def run_annotations(index):
     print("Generating annotations...")
-    annotate.main()
+    annotate.main(index, incremental=True)
     print("Annotations generated.\n")
 
 
-def run_docs_build():
+def run_docs_build(index):
     print("Generating docs build files...")
-    docs.main()
+    docs.main(index)
     print("Docs build files generated.\n")
 
 
-def main():
+def run_manifest(index):
+    print("Writing release manifest...")
+    manifest.main(index)
+    print("Release manifest written.\n")
+
+
+def run_package(index):
+    print("Packaging release shards...")
+    package.main(index)
+    print("Release shards packaged.\n")
+
+
+class Stage(NamedTuple):
+    name: str
+    run: Callable
+    inputs: list   # "images", "code" or file paths
+    outputs: list  # paths written by the stage
+    after: list    # stages that have to finish first
+    processes: bool = False  # forks a process pool, so runs on the main thread with no sibling stages
+
+
+def build_stages(package_release=False):
+    annotation_files = [annotate.OUTPUT_FILE, annotate.OUTPUT_FILE.with_suffix(".npz"),
+                        annotate.OUTPUT_FILE.with_name("bitmaps.json")]
+    stages = [
+        Stage("validate", run_validation, ["images", "code"], [], [], processes=True),
+        Stage("readme", run_readme, ["images", "code", TEMPLATE], [README], ["validate"]),
+        Stage("derive", run_derive, ["images", "code"], [derive.INDEX_FILE], ["validate"], processes=True),
+        Stage("annotations", run_annotations, ["images", "code", derive.INDEX_FILE], annotation_files, ["derive"]),
+        Stage("docs", run_docs_build, ["images", "code", docs.BITMAPS_FILE], [docs.BUNDLE_DIR / "manifest.json"],
+              ["annotations"]),
+        # After derive, which hashes every image, so the manifest reads digests from the cache.
+        Stage("manifest", run_manifest, ["images", "code"], [manifest.MANIFEST_FILE], ["derive"]),
+    ]
+    if package_release:
+        stages.append(Stage("package", run_package, ["images", "code", annotate.OUTPUT_FILE],
+                            [package.PACKAGE_DIR / package.MANIFEST_NAME], ["annotations"]))
+    return stages
+
+
+def file_stamp(path: Path):
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def index_fingerprint(index) -> str:
+    digest = hashlib.sha256()
+    for file in index.files:
+        digest.update(f"{file.name}\0{file.size}\0{file.mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def code_fingerprint() -> str:
+    digest = hashlib.sha256()
+    for path in sorted(SCRIPTS_DIR.glob("*.py")) + [SCRIPTS_DIR / SCHEMA_FILE.name]:
+        digest.update(f"{path.name}\0{file_stamp(path)}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def fingerprint(name, index):
+    if name == "images":
+        return index_fingerprint(index)
+    if name == "code":
+        return code_fingerprint()
+    return file_stamp(Path(name))
+
+
+def load_state():
+    try:
+        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_state(state):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    STATE_FILE.write_text(json.dumps(state, indent=2), encoding="utf-8")
+
+
+def stage_reasons(stage, previous, inputs, force=False):
+    """Reasons for running a stage; an empty list means it is up to date."""
+    if force:
+        return ["forced"]
+    if previous is None:
+        return ["no previous build"]
+
+    reasons = [f"{name} changed" for name, value in inputs.items() if previous["inputs"].get(name) != value]
+    for path in stage.outputs:
+        stamp = file_stamp(path)
+        if stamp is None:
+            reasons.append(f"{path} is missing")
+        elif previous["outputs"].get(str(path)) != stamp:
+            reasons.append(f"{path} was modified")
+    return reasons
+
+
+class StageResult(NamedTuple):
+    stage: Stage
+    reasons: list
+    output: str
+    ok: bool
+    record: dict
+
+
+def run_stage(stage, index, state, force=False):
+    inputs = {str(name): fingerprint(name, index) for name in stage.inputs}
+    reasons = stage_reasons(stage, state.get(stage.name), inputs, force)
+    if not reasons:
+        return StageResult(stage, reasons, "", True, state[stage.name])
+
+    ok = True
+    with captured_output() as stream:
+        try:
+            with RECORDER.span(stage.name):
+                stage.run(index)
+        except SystemExit:
+            ok = False
+
+    record = {"inputs": inputs, "outputs": {str(path): file_stamp(path) for path in stage.outputs}}
+    return StageResult(stage, reasons, stream.getvalue(), ok, record)
+
+
+def run_stages(stages, index, force=False, explain=False):
+    """Run stages whose inputs or outputs changed, independent ones concurrently.
+
+       Stages are started in waves: every stage whose dependencies finished
+       runs at the same time on a thread pool. Stages that fork a process
+       pool run first, one at a time on the main thread, since forking while
+       other threads are busy is unsafe. Output of each stage is collected
+       and printed in declaration order once its wave completes.
+       Returns False when a stage failed; raises ValueError when stages wait
+       on an unknown stage or on each other.
+    """
+    state = load_state()
+    finished = set()
+    pending = list(stages)
+
+    with ThreadPoolExecutor(max_workers=len(stages) or 1) as pool:
+        while pending:
+            wave = [stage for stage in pending if all(name in finished for name in stage.after)]
+            if not wave:
+                blocked = ", ".join(f"{stage.name} (after {', '.join(stage.after)})" for stage in pending)
+                raise ValueError(f"Stages with unknown or circular dependencies: {blocked}")
+            results = {
+                stage.name: run_stage(stage, index, state, force) for stage in wave if stage.processes
+            }
+            futures = {
+                stage.name: pool.submit(run_stage, stage, index, state, force)
+                for stage in wave if not stage.processes
+            }
+            results.update((name, future.result()) for name, future in futures.items())
+
+            for result in (results[stage.name] for stage in wave):
+                name = result.stage.name
+                if not result.reasons:
+                    print(f"Skipping {name}: up to date.")
+                    continue
+                if explain:
+                    print(f"Running {name}: {', '.join(result.reasons)}.")
+                print(result.output, end="")
+                if not result.ok:
+                    save_state(state)
+                    return False
+                state[name] = result.record
+
+            finished.update(stage.name for stage in wave)
+            pending = [stage for stage in pending if stage.name not in finished]
+
+    save_state(state)
+    return True
+
+
+def load_options():
+    parser = argparse.ArgumentParser(description="Validate the dataset and rebuild generated files.")
+    parser.add_argument(
+        "--package", action="store_true",
+        help="Also write release tar shards and their manifest to dist/"
+    )
+    parser.add_argument("--force", action="store_true", help="Run every stage, even when up to date")
+    parser.add_argument("--explain", action="store_true", help="Print why each stage runs or is skipped")
+    parser.add_argument(
+        "--profile", action="store_true",
+        help=f"Print time, memory and I/O per stage and hot function; write a JSON trace to {PROFILE_FILE}"
+    )
+    return parser.parse_args()
+
+
+def print_profile():
+    RECORDER.stop()
+    print("\nProfile:")
+    RECORDER.print_summary()
+    RECORDER.write(PROFILE_FILE)
+    print(f"\nTrace written to: {PROFILE_FILE}")
+
+
+def main(package_release=False, force=False, explain=False, profile=False):
     print("Build started.\n")
+    if profile:
+        RECORDER.start()
 
-    run_validation()
-    stats_text = capture_stats_output()
-    update_readme(stats_text)
-    run_annotations()
-    run_docs_build()
+    with RECORDER.span("index"):
+        index = DatasetIndex.build(IMAGES_DIR)
 
+    stdout = sys.stdout
+    sys.stdout = StageOutput(stdout)
+    try:
+        ok = run_stages(build_stages(package_release), index, force, explain)
+    finally:
+        sys.stdout = stdout
+
+    if profile:
+        print_profile()
+    if not ok:
+        sys.exit(1)
     print("Build completed successfully.")
 
 
 if __name__ == "__main__":
-    main()
+    options = load_options()
+    main(package_release=options.package, force=options.force, explain=options.explain, profile=options.profile)
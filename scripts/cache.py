@@ -0,0 +1,96 @@
+import sqlite3
+from pathlib import Path
+
+CACHE_DIR = Path(".cache")
+CACHE_FILE = CACHE_DIR / "files.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    value BLOB,
+    PRIMARY KEY (kind, path)
+)
+"""
+
+
+class FileCache:
+    """Persistent sidecar cache of values derived from file content.
+
+       Entries are stored per kind (e.g. "sha256") and keyed by path, size,
+       mtime_ns and inode. A file whose stat info changed is treated as a miss.
+       Entries of a kind are loaded into memory on first use and written back
+       in one transaction on flush() or close().
+    """
+
+    def __init__(self, path: Path = None):
+        path = Path(path or CACHE_FILE)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(path))
+        self.connection.execute(SCHEMA)
+        self.entries = {}
+        self.pending = {}
+        self.pruned = {}
+
+    def _load(self, kind):
+        if kind not in self.entries:
+            rows = self.connection.execute(
+                "SELECT path, size, mtime_ns, inode, value FROM entries WHERE kind = ?", (kind,)
+            )
+            self.entries[kind] = {path: (size, mtime_ns, inode, value) for path, size, mtime_ns, inode, value in rows}
+        return self.entries[kind]
+
+    def get(self, kind, file):
+        """Return cached value for an ImageFile, or None when missing or stale."""
+        cached = self._load(kind).get(str(file.path))
+        if cached is None:
+            return None
+        size, mtime_ns, inode, value = cached
+        if (size, mtime_ns, inode) != (file.size, file.mtime_ns, file.inode):
+            return None
+        return value
+
+    def put(self, kind, file, value):
+        row = (file.size, file.mtime_ns, file.inode, value)
+        self._load(kind)[str(file.path)] = row
+        self.pending.setdefault(kind, {})[str(file.path)] = row
+
+    def prune(self, kind, files):
+        """Drop entries of a kind whose paths are not among the given files."""
+        alive = {str(file.path) for file in files}
+        entries = self._load(kind)
+        stale = [path for path in entries if path not in alive]
+        for path in stale:
+            del entries[path]
+            self.pending.get(kind, {}).pop(path, None)
+        self.pruned.setdefault(kind, []).extend(stale)
+        return len(stale)
+
+    def flush(self):
+        """Write pending changes without closing the connection."""
+        with self.connection:
+            for kind, paths in self.pruned.items():
+                self.connection.executemany(
+                    "DELETE FROM entries WHERE kind = ? AND path = ?",
+                    [(kind, path) for path in paths],
+                )
+            for kind, rows in self.pending.items():
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                    [(kind, path, *row) for path, row in rows.items()],
+                )
+        self.pending = {}
+        self.pruned = {}
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
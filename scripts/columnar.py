@@ -0,0 +1,234 @@
+import ast
+import mmap
+import os
+import struct
+import sys
+import zipfile
+from array import array
+from pathlib import Path
+
+from .utils import ALLOWED_VALUES, ATTR_FIELDS
+
+NPY_MAGIC = b"\x93NUMPY"
+NPY_ALIGNMENT = 64
+ZIP_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+TYPECODES = {"<u1": "B", "<u2": "H", "<u4": "I", "<u8": "Q"}
+
+
+def npy_bytes(descr: str, shape, data: bytes) -> bytes:
+    """Serialize raw little-endian data as a version 1.0 .npy file."""
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': {tuple(shape)!r}, }}"
+    padding = -(len(NPY_MAGIC) + 4 + len(header) + 1) % NPY_ALIGNMENT
+    header = header + " " * padding + "\n"
+    return NPY_MAGIC + b"\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1") + data
+
+
+def integer_npy(values, typecode: str) -> bytes:
+    data = values if isinstance(values, array) and values.typecode == typecode else array(typecode, values)
+    if sys.byteorder == "big":
+        data = array(typecode, data)
+        data.byteswap()
+    descr = next(descr for descr, code in TYPECODES.items() if code == typecode)
+    return npy_bytes(descr, (len(data),), data.tobytes())
+
+
+def string_npy(values) -> bytes:
+    width = max((len(value) for value in values), default=1) or 1
+    data = b"".join(value.ljust(width, "\0").encode("utf-32-le") for value in values)
+    return npy_bytes(f"<U{width}", (len(values),), data)
+
+
+def code_typecode(vocabulary) -> str:
+    return "B" if len(vocabulary) <= 256 else "H"
+
+
+def build_vocabulary(field, values):
+    known = ALLOWED_VALUES.get(field, [])
+    return known + sorted(set(values) - set(known))
+
+
+def provisional_code(codes, value) -> int:
+    code = codes.get(value)
+    if code is None:
+        code = codes[value] = len(codes)
+    return code
+
+
+def final_codes(field, codes, column):
+    """Vocabulary of a field and its column recoded to build_vocabulary() order.
+
+       Codes are handed out while streaming, known values first; values
+       outside ALLOWED_VALUES are only sorted (and the column remapped) once
+       all of them have been seen.
+    """
+    vocabulary = build_vocabulary(field, codes)
+    if list(codes) != vocabulary:
+        order = {value: code for code, value in enumerate(vocabulary)}
+        remap = [order[value] for value in codes]
+        column = array(column.typecode, (remap[code] for code in column))
+    return vocabulary, column
+
+
+def write_columns(annotations, path: Path, extra_columns=None):
+    """Write annotation entries as an uncompressed .npz of categorical columns.
+
+       Every attribute in ATTR_FIELDS (and the extension) is stored as small
+       integer codes plus a "vocab_<field>" array of strings; collection index
+       and size are uint32 columns; filenames are one UTF-8 blob addressed by
+       a uint64 offset table. The file loads with numpy.load() as well as with
+       load_columns() below.
+
+       Entries are consumed one at a time into typed arrays, a few bytes per
+       row and column, and the file is written member by member.
+
+       extra_columns maps a column name to (typecode, values); values are read
+       only after all annotations were consumed, so they may be filled while
+       annotations is being generated.
+    """
+    fields = ATTR_FIELDS + ["extension"]
+    codes = {field: {value: code for code, value in enumerate(ALLOWED_VALUES.get(field, []))} for field in fields}
+    columns = {field: array("I") for field in fields}
+    indices = array("I")
+    sizes = array("I")
+    names = bytearray()
+    offsets = array("Q", [0])
+
+    for entry in annotations:
+        parameters = entry["parameters"]
+        for field in ATTR_FIELDS:
+            columns[field].append(provisional_code(codes[field], parameters[field]))
+        columns["extension"].append(provisional_code(codes["extension"], entry["extension"]))
+        indices.append(entry["collection"]["index"])
+        sizes.append(entry["collection"]["of"])
+        names += entry["filename"].encode("utf-8")
+        offsets.append(len(names))
+
+    def members():
+        for field in fields:
+            vocabulary, column = final_codes(field, codes[field], columns.pop(field))
+            yield field, integer_npy(column, code_typecode(vocabulary))
+            yield f"vocab_{field}", string_npy(vocabulary)
+        yield "index", integer_npy(indices, "I")
+        yield "of", integer_npy(sizes, "I")
+        yield "filenames", integer_npy(names, "B")
+        yield "filename_offsets", integer_npy(offsets, "Q")
+        for name, (typecode, column) in (extra_columns or {}).items():
+            yield name, integer_npy(column, typecode)
+
+    write_npz(members(), path)
+
+
+def write_npz(members, path: Path):
+    """Atomically write (name, .npy bytes) pairs as an uncompressed, mmap-friendly .npz."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as archive:
+        for name, data in members:
+            archive.writestr(name + ".npy", data)
+    os.replace(tmp, path)
+
+
+def parse_npy_header(buffer, offset: int):
+    if bytes(buffer[offset:offset + 6]) != NPY_MAGIC:
+        raise ValueError("Not a .npy member")
+    major = buffer[offset + 6]
+    if major == 1:
+        (header_len,) = struct.unpack_from("<H", buffer, offset + 8)
+        start = offset + 10
+    else:
+        (header_len,) = struct.unpack_from("<I", buffer, offset + 8)
+        start = offset + 12
+    header = ast.literal_eval(bytes(buffer[start:start + header_len]).decode("latin1"))
+    return header, start + header_len
+
+
+class AnnotationColumns:
+    """Memory-mapped view of a columnar annotations file.
+
+       Integer columns are zero-copy memoryviews over the mapped file (use
+       numpy.frombuffer on them for array arithmetic); only the small
+       vocabularies are decoded into Python strings.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.columns = {}
+        self.vocabulary = {}
+
+        with zipfile.ZipFile(self.path) as archive:
+            infos = archive.infolist()
+
+        for info in infos:
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"Compressed member cannot be memory-mapped: {info.filename}")
+            local = ZIP_LOCAL_HEADER.unpack_from(self.buffer, info.header_offset)
+            name_length, extra_length = local[-2], local[-1]
+            member_start = info.header_offset + ZIP_LOCAL_HEADER.size + name_length + extra_length
+            header, data_start = parse_npy_header(self.buffer, member_start)
+
+            name = info.filename[:-len(".npy")]
+            descr = header["descr"]
+            count = header["shape"][0]
+
+            if descr.startswith("<U"):
+                width = int(descr[2:])
+                raw = bytes(self.buffer[data_start:data_start + count * width * 4])
+                self.vocabulary[name[len("vocab_"):]] = [
+                    raw[i * width * 4:(i + 1) * width * 4].decode("utf-32-le").rstrip("\0")
+                    for i in range(count)
+                ]
+                continue
+
+            typecode = TYPECODES[descr]
+            nbytes = count * array(typecode).itemsize
+            column = memoryview(self.buffer)[data_start:data_start + nbytes].cast(typecode)
+            if sys.byteorder == "big":
+                column = array(typecode, column)
+                column.byteswap()
+            self.columns[name] = column
+
+    def close(self):
+        """Release the column views and unmap the file (required before replacing it on Windows)."""
+        for column in self.columns.values():
+            if isinstance(column, memoryview):
+                column.release()
+        self.columns = {}
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.columns["index"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def filename(self, row: int) -> str:
+        offsets = self.columns["filename_offsets"]
+        return bytes(self.columns["filenames"][offsets[row]:offsets[row + 1]]).decode("utf-8")
+
+    def value(self, field: str, row: int) -> str:
+        return self.vocabulary[field][self.columns[field][row]]
+
+
+def load_columns(path: Path, required=()) -> AnnotationColumns:
+    """Map a columnar file; raise ValueError if it lacks any of the required columns.
+
+       A file written by an older version has fewer columns, and is better
+       rejected with the missing names than failing later with a KeyError.
+    """
+    columns = AnnotationColumns(path)
+    missing = [name for name in required if name not in columns.columns]
+    if missing:
+        columns.close()
+        raise ValueError(
+            f"{path} is out of date (no {', '.join(missing)} columns); regenerate it with python -m scripts.annotate"
+        )
+    return columns
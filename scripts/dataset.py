@@ -0,0 +1,133 @@
+import os
+from bisect import bisect_left, insort
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from .utils import ImageInfo, parse_filename, parse_names
+
+IMAGES_DIR = Path("images")
+
+
+class ImageFile(NamedTuple):
+    name: str
+    path: Path
+    size: int
+    mtime_ns: int
+    inode: int
+    info: Optional[ImageInfo]
+    key: Optional[tuple]
+
+
+def make_file(entry, info):
+    """Build an ImageFile from an os.DirEntry (or anything with name/path/stat())."""
+    stat = entry.stat()
+    key = info.key if info is not None else None
+    return ImageFile(entry.name, Path(entry.path), stat.st_size, stat.st_mtime_ns, stat.st_ino, info, key)
+
+
+def scan_file(entry):
+    return make_file(entry, parse_filename(Path(entry.name)))
+
+
+class DatasetIndex:
+    """Snapshot of images_dir built from a single os.scandir pass.
+
+       Holds every regular, non-hidden file sorted by name together with its
+       stat info, parsed filename and attribute group key, so that validation,
+       statistics, annotations, docs and import never list the directory again.
+    """
+
+    def __init__(self, images_dir: Path, files):
+        self.images_dir = images_dir
+        self.files = sorted(files)
+        self.records = []  # files whose names follow the naming convention
+        self.invalid = []  # names of files that cannot be parsed
+        self.groups = {}
+        self._max_indices = None
+        for file in self.files:
+            if file.info is None:
+                self.invalid.append(file.name)
+            else:
+                self.records.append(file)
+            if file.key is not None:
+                self.groups.setdefault(file.key, []).append(file)
+
+    @classmethod
+    def build(cls, images_dir: Path = IMAGES_DIR):
+        with os.scandir(images_dir) as entries:
+            entries = [entry for entry in entries if not entry.name.startswith(".") and not entry.is_dir()]
+        infos = parse_names([entry.name for entry in entries])
+        return cls(Path(images_dir), [make_file(entry, info) for entry, info in zip(entries, infos)])
+
+    def group_size(self, key) -> int:
+        return len(self.groups.get(key, ()))
+
+    @property
+    def max_indices(self):
+        """Map of group key -> highest numeric index, computed once and kept up to date."""
+        if self._max_indices is None:
+            self._max_indices = {}
+            for file in self.records:
+                self._note_index(file.key, file.info.index)
+        return self._max_indices
+
+    def _note_index(self, key, index):
+        if index is not None and index > self._max_indices.get(key, 0):
+            self._max_indices[key] = index
+
+    def next_index(self, key) -> int:
+        """Return next free index for a group (per-group numbering)."""
+        return self.max_indices.get(key, 0) + 1
+
+    def allocate(self, key) -> int:
+        """Reserve and return next free index for a group."""
+        index = self.next_index(key)
+        self._max_indices[key] = index
+        return index
+
+    def add(self, path: Path):
+        """Register a file that was written into images_dir after the scan."""
+        file = scan_file(_PathEntry(Path(path)))
+        insort(self.files, file)
+        if file.info is None:
+            insort(self.invalid, file.name)
+        else:
+            insort(self.records, file)
+        if file.key is not None:
+            insort(self.groups.setdefault(file.key, []), file)
+            if self._max_indices is not None:
+                self._note_index(file.key, file.info.index)
+        return file
+
+    def get(self, name: str):
+        """Return the ImageFile with the given name, or None."""
+        position = bisect_left(self.files, (name,))
+        if position < len(self.files) and self.files[position].name == name:
+            return self.files[position]
+        return None
+
+    def remove(self, name: str):
+        """Forget a file that disappeared from images_dir; returns it or None."""
+        file = self.get(name)
+        if file is None:
+            return None
+        del self.files[bisect_left(self.files, file)]
+        if file.info is None:
+            del self.invalid[bisect_left(self.invalid, file.name)]
+        else:
+            del self.records[bisect_left(self.records, file)]
+        if file.key is not None:
+            group = self.groups[file.key]
+            del group[bisect_left(group, file)]
+            if not group:
+                del self.groups[file.key]
+            # The highest index may have gone; recompute it on next use.
+            self._max_indices = None
+        return file
+
+
+class _PathEntry:
+    def __init__(self, path: Path):
+        self.name = path.name
+        self.path = str(path)
+        self.stat = path.stat
@@ -0,0 +1,230 @@
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from .cache import FileCache
+from .dataset import DatasetIndex, IMAGES_DIR
+from .validate import content_hashes
+from .workers import run_parallel
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:
+    pass
+
+DERIVED_DIR = Path("derived")
+INDEX_NAME = "index.json"
+INDEX_FILE = DERIVED_DIR / INDEX_NAME
+
+# Rendition name -> parameters. "size" bounds the longer edge (None keeps the
+# original resolution); "extensions" limits a rendition to some source formats.
+RENDITIONS = {
+    "thumbnail": {"size": 320, "format": "JPEG", "quality": 80},
+    "jpeg": {"size": None, "format": "JPEG", "quality": 90, "extensions": ["heic"]},
+}
+
+FORMAT_SUFFIXES = {"JPEG": ".jpg", "WEBP": ".webp", "PNG": ".png"}
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def rendition_key(digest: str, params) -> str:
+    """Cache key of a rendition: the source content hash plus its parameters."""
+    encoded = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{digest}:{encoded}".encode("utf-8")).hexdigest()[:40]
+
+
+def rendition_path(name: str, digest: str, params, derived_dir: Path = DERIVED_DIR) -> Path:
+    key = rendition_key(digest, params)
+    return derived_dir / name / key[:2] / (key + FORMAT_SUFFIXES[params["format"]])
+
+
+def applies(params, file) -> bool:
+    extensions = params.get("extensions")
+    return extensions is None or file.path.suffix[1:].lower() in extensions
+
+
+def rendition_paths(files, cache=None, jobs=None, renditions=None, derived_dir: Path = DERIVED_DIR, digests=None):
+    """Return {filename: {rendition: path}} for the configured renditions.
+
+       Paths only depend on file content and rendition parameters, so they
+       are known without rendering anything; unchanged images always map to
+       the same, already rendered files. Content hashes are computed unless
+       digests already holds them.
+    """
+    renditions = RENDITIONS if renditions is None else renditions
+    if digests is None:
+        digests = content_hashes(files, cache, jobs=jobs)
+
+    return {
+        file.name: {
+            name: rendition_path(name, digests[file.name], params, derived_dir)
+            for name, params in renditions.items()
+            if applies(params, file)
+        }
+        for file in files
+    }
+
+
+def load_index(derived_dir: Path = DERIVED_DIR):
+    try:
+        return json.loads((derived_dir / INDEX_NAME).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def rendered_paths(files, renditions=None, derived_dir: Path = None):
+    """rendition_paths() limited to renditions that exist on disk.
+
+       Annotations list only these, so a rendition that was never rendered
+       (Pillow missing, failed render, derived/ deleted) is not advertised.
+       Nothing is hashed: content hashes come from the sources recorded in
+       index.json by the last derive run, and a file changed since then
+       (other size or mtime) has no renditions until it is rendered again.
+    """
+    derived_dir = DERIVED_DIR if derived_dir is None else derived_dir
+    sources = load_index(derived_dir).get("sources")
+    if not sources:
+        return {}
+
+    digests = {}
+    for file in files:
+        source = sources.get(file.name)
+        if source is not None and source["size"] == file.size and source["mtime_ns"] == file.mtime_ns:
+            digests[file.name] = source["sha256"]
+    known = [file for file in files if file.name in digests]
+    paths = rendition_paths(known, renditions=renditions, derived_dir=derived_dir, digests=digests)
+    return {
+        name: {rendition: path for rendition, path in targets.items() if path.exists()}
+        for name, targets in paths.items()
+    }
+
+
+def write_index(derived_dir: Path = DERIVED_DIR, sources=None) -> Path:
+    """Record which renditions exist, and of which sources, in derived_dir/index.json.
+
+       sources maps filenames to their size, mtime_ns and sha256, so
+       annotations can find renditions without hashing; None keeps the
+       sources of the previous index. The file is only rewritten when it
+       changes, so the builder can tell from its stamp whether annotations
+       list other renditions than before.
+    """
+    if sources is None:
+        sources = load_index(derived_dir).get("sources", {})
+    names = []
+    if derived_dir.exists():
+        names = sorted(
+            path.relative_to(derived_dir).as_posix()
+            for path in derived_dir.rglob("*")
+            if path.is_file() and path.name != INDEX_NAME
+        )
+    digest = hashlib.sha256("\n".join(names).encode("utf-8")).hexdigest()
+    data = json.dumps({"files": len(names), "digest": digest, "sources": sources}, sort_keys=True)
+
+    path = derived_dir / INDEX_NAME
+    if not path.exists() or path.read_text(encoding="utf-8") != data:
+        derived_dir.mkdir(parents=True, exist_ok=True)
+        path.write_text(data, encoding="utf-8")
+    return path
+
+
+def render(task):
+    """Render one rendition into place; returns an error message or None."""
+    source, target, params = task
+    try:
+        with Image.open(source) as image:
+            if params["size"] is not None:
+                image.draft("RGB", (params["size"], params["size"]))
+            image = ImageOps.exif_transpose(image).convert("RGB")
+        if params["size"] is not None:
+            image.thumbnail((params["size"], params["size"]), Image.LANCZOS)
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(target.name + ".tmp")
+        image.save(tmp, params["format"], quality=params.get("quality"))
+        os.replace(tmp, target)
+    except Exception as e:
+        return f"{Path(source).name}: {e}"
+    return None
+
+
+def derive(index, jobs=None, renditions=None, derived_dir: Path = DERIVED_DIR):
+    """Render missing renditions and remove ones no longer referenced.
+
+       Returns counts of kept, rendered and removed files and a list of errors.
+    """
+    renditions = RENDITIONS if renditions is None else renditions
+    with FileCache() as cache:
+        digests = content_hashes(index.records, cache, jobs=jobs)
+    paths = rendition_paths(index.records, renditions=renditions, derived_dir=derived_dir, digests=digests)
+
+    expected = set()
+    tasks = []
+    for file in index.records:
+        for name, target in paths[file.name].items():
+            expected.add(target)
+            if not target.exists():
+                tasks.append((file.path, target, renditions[name]))
+
+    errors = [error for error in run_parallel(render, tasks, jobs, processes=True) if error]
+
+    removed = 0
+    if derived_dir.exists():
+        for path in sorted(derived_dir.rglob("*"), reverse=True):
+            if path.is_file() and path not in expected and path != derived_dir / INDEX_NAME:
+                path.unlink()
+                removed += 1
+            elif path.is_dir() and not any(path.iterdir()):
+                path.rmdir()
+
+    sources = {
+        file.name: {"size": file.size, "mtime_ns": file.mtime_ns, "sha256": digests[file.name]}
+        for file in index.records
+    }
+    write_index(derived_dir, sources)
+    counts = {"kept": len(expected) - len(tasks), "rendered": len(tasks) - len(errors), "removed": removed}
+    return counts, errors
+
+
+def load_options():
+    parser = argparse.ArgumentParser(description="Render derived images (thumbnails, format conversions).")
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=None,
+        help="Number of parallel workers (default: number of CPUs)"
+    )
+    return parser.parse_args()
+
+
+def main(index=None, jobs=None):
+    if not available():
+        print("Skipped derived images (Pillow is not installed)")
+        write_index()
+        return True
+
+    if index is None:
+        index = DatasetIndex.build(IMAGES_DIR)
+
+    counts, errors = derive(index, jobs)
+
+    print(f"Derived images written to: {DERIVED_DIR}")
+    print(f"Up to date: {counts['kept']}, rendered: {counts['rendered']}, removed: {counts['removed']}")
+    if errors:
+        print("Failed renditions:")
+        for error in errors:
+            print(f"  {error}")
+    return not errors
+
+
+if __name__ == "__main__":
+    options = load_options()
+    main(jobs=options.jobs)
@@ -1,7 +1,28 @@
+import collections
+import gzip
 import json
+import re
+from array import array
+from pathlib import Path
 
+from .bitmaps import BitmapIndex
+from .columnar import build_vocabulary, code_typecode
+from .utils import ATTR_FIELDS
 
-def main():
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BUNDLE_DIR = Path("docs/data")
+BITMAPS_FILE = Path("annotations/bitmaps.json")
+SHARD_SIZE = 1000
+
+# Files write_bundle() produces; anything else in the bundle directory is left alone.
+BUNDLE_FILE = re.compile(r"(manifest|bitmaps|rows-\d+)\.json(\.gz|\.br)?")
+
+
+def load_rows():
     with open("annotations/annotations.json") as file:
         annotations = json.load(file)
 
@@ -17,9 +38,105 @@ def main():
             "label": parameters["label"],
             "cap": parameters["cap"]
         })
+    return out
+
+
+def index_rows(index):
+    out = []
+    for file in index.records:
+        row = {"filename": file.name}
+        for field in ATTR_FIELDS:
+            row[field] = file.info[field]
+        out.append(row)
+    return out
+
+
+def write_compressed(path: Path, data: bytes):
+    """Write a file together with precompressed .gz (and .br when brotli is installed) siblings."""
+    path.write_bytes(data)
+    path.with_name(path.name + ".gz").write_bytes(gzip.compress(data, 9, mtime=0))
+    if brotli is not None:
+        path.with_name(path.name + ".br").write_bytes(brotli.compress(data))
+
+
+def write_json(path: Path, data):
+    write_compressed(path, json.dumps(data, separators=(",", ":")).encode("utf-8"))
+    return path.name
+
+
+def load_bitmaps(path: Path, rows, facets):
+    """Bitmap index JSON written by scripts.annotate, or None if it does not describe rows.
+
+       The index is taken to match when it has one bit per row and the same
+       count for every attribute value as the facets of rows.
+    """
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+    bitmaps = BitmapIndex.from_json(data)
+    if bitmaps.size != len(rows) or any(bitmaps.counts(field) != facets[field] for field in ATTR_FIELDS):
+        return None
+    return data
+
+
+def write_bundle(rows, bundle_dir: Path = BUNDLE_DIR, bitmaps_file: Path = BITMAPS_FILE):
+    """Write the explorer bundle: manifest, facet counts, bitmaps and row shards.
+
+       Attributes are dictionary-encoded: every row in a shard is
+       [filename, code, code, ...] with codes into the manifest vocabulary.
+       The page renders facet counts from the small manifest, filters with
+       the bitmaps and fetches row shards only when rows are shown. The
+       bitmaps are copied from bitmaps_file when it is up to date, and only
+       built here otherwise.
+    """
+    bundle_dir.mkdir(parents=True, exist_ok=True)
+
+    vocabulary = {field: build_vocabulary(field, [row[field] for row in rows]) for field in ATTR_FIELDS}
+    codes = {field: {value: code for code, value in enumerate(values)} for field, values in vocabulary.items()}
+    facets = {
+        field: dict(collections.Counter(row[field] for row in rows).most_common())
+        for field in ATTR_FIELDS
+    }
+
+    bitmaps = load_bitmaps(bitmaps_file, rows, facets)
+    if bitmaps is None:
+        columns = {
+            field: array(code_typecode(vocabulary[field]), (codes[field][row[field]] for row in rows))
+            for field in ATTR_FIELDS
+        }
+        bitmaps = BitmapIndex.from_columns(vocabulary, columns).to_json()
+    written = {write_json(bundle_dir / "bitmaps.json", bitmaps)}
+
+    shards = []
+    for start in range(0, len(rows), SHARD_SIZE):
+        chunk = rows[start:start + SHARD_SIZE]
+        encoded = [[row["filename"]] + [codes[field][row[field]] for field in ATTR_FIELDS] for row in chunk]
+        name = write_json(bundle_dir / f"rows-{start // SHARD_SIZE:05d}.json", {"start": start, "rows": encoded})
+        shards.append({"file": name, "start": start, "count": len(chunk)})
+        written.add(name)
+
+    manifest = {
+        "version": 1,
+        "count": len(rows),
+        "fields": ATTR_FIELDS,
+        "vocabulary": vocabulary,
+        "facets": facets,
+        "bitmaps": "bitmaps.json",
+        "shard_size": SHARD_SIZE,
+        "shards": shards,
+    }
+    written.add(write_json(bundle_dir / "manifest.json", manifest))
+
+    for path in bundle_dir.iterdir():
+        match = BUNDLE_FILE.fullmatch(path.name)
+        if match and path.is_file() and path.name.removesuffix(match[2] or "") not in written:
+            path.unlink()
+
 
-    with open("docs/data.json", "w") as file:
-        json.dump(out, file, indent=2)
+def main(index=None):
+    rows = load_rows() if index is None else index_rows(index)
+    write_bundle(rows)
 
 
 if __name__ == "__main__":
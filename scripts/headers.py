@@ -0,0 +1,262 @@
+import json
+import os
+import struct
+
+from .workers import run_parallel
+
+HEADER_KIND = "header"
+TAIL_SIZE = 4096
+EXIF_READ_SIZE = 4096
+META_READ_LIMIT = 1024 * 1024
+
+EXTENSION_FORMATS = {"jpg": "jpeg", "jpeg": "jpeg", "heic": "heif", "heif": "heif"}
+HEIF_BRANDS = {b"heic", b"heix", b"heim", b"heis", b"hevc", b"hevx", b"mif1", b"msf1"}
+
+# SOF markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) share the range but do not.
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field.
+STANDALONE_MARKERS = set(range(0xD0, 0xD8)) | {0x01}
+
+# irot stores counter-clockwise quarter turns; map them to EXIF orientation codes.
+IROT_ORIENTATION = {0: 1, 1: 8, 2: 3, 3: 6}
+
+
+def read_exact(f, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Unexpected end of file in header")
+    return data
+
+
+def exif_orientation(payload: bytes):
+    """Orientation tag (0x0112) of IFD0 in an APP1 Exif payload, or None."""
+    if not payload.startswith(b"Exif\0\0") or len(payload) < 14:
+        return None
+    tiff = payload[6:]
+    order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if order is None:
+        return None
+
+    (offset,) = struct.unpack_from(order + "I", tiff, 4)
+    if offset + 2 > len(tiff):
+        return None
+    (count,) = struct.unpack_from(order + "H", tiff, offset)
+    for number in range(count):
+        entry = offset + 2 + number * 12
+        if entry + 12 > len(tiff):
+            return None
+        tag, kind, _, value = struct.unpack_from(order + "HHI4s", tiff, entry)
+        if tag == 0x0112 and kind == 3:
+            return struct.unpack_from(order + "H", value)[0]
+    return None
+
+
+def read_jpeg(f, size: int):
+    """Frame size and orientation from JPEG markers, stopping at the first scan."""
+    read_exact(f, 2)
+    width = height = None
+    orientation = 1
+
+    while True:
+        byte = read_exact(f, 1)
+        if byte != b"\xff":
+            raise ValueError("Corrupt JPEG marker structure")
+        marker = read_exact(f, 1)[0]
+        while marker == 0xFF:
+            marker = read_exact(f, 1)[0]
+        if marker in STANDALONE_MARKERS:
+            continue
+        if marker == 0xD9:
+            raise ValueError("JPEG ends before image data")
+
+        (length,) = struct.unpack(">H", read_exact(f, 2))
+        if length < 2:
+            raise ValueError("Corrupt JPEG segment length")
+        start = f.tell()
+
+        if marker in SOF_MARKERS:
+            _, height, width = struct.unpack(">BHH", read_exact(f, 5))
+        elif marker == 0xE1 and width is None:
+            found = exif_orientation(f.read(min(length - 2, EXIF_READ_SIZE)))
+            orientation = found or orientation
+        elif marker == 0xDA:
+            break
+
+        f.seek(start + length - 2)
+
+    if width is None:
+        raise ValueError("JPEG has no frame header before image data")
+    if start + length - 2 > size:
+        raise ValueError("Truncated JPEG (scan header exceeds file size)")
+
+    f.seek(max(size - TAIL_SIZE, 0))
+    if b"\xff\xd9" not in f.read(TAIL_SIZE):
+        raise ValueError("Truncated JPEG (missing EOI marker)")
+
+    return width, height, orientation
+
+
+def iter_boxes(data: bytes, start: int = 0, end: int = None):
+    """Yield (type, payload_start, payload_end) of ISO BMFF boxes in data[start:end]."""
+    end = len(data) if end is None else end
+    position = start
+    while position + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", data, position)
+        header = 8
+        if size == 1:
+            (size,) = struct.unpack_from(">Q", data, position + 8)
+            header = 16
+        elif size == 0:
+            size = end - position
+        if size < header or position + size > end:
+            raise ValueError(f"Corrupt HEIF box: {kind.decode('latin1')}")
+        yield kind, position + header, position + size
+        position += size
+
+
+def children(data: bytes, start: int, end: int):
+    return {kind: (child_start, child_end) for kind, child_start, child_end in iter_boxes(data, start, end)}
+
+
+def parse_heif_meta(meta: bytes):
+    """Size and orientation of the primary item from the payload of a meta box."""
+    boxes = children(meta, 4, len(meta))
+    if b"pitm" not in boxes or b"iprp" not in boxes:
+        raise ValueError("HEIF has no primary item properties")
+
+    pitm_start, _ = boxes[b"pitm"]
+    primary = struct.unpack_from(">I" if meta[pitm_start] else ">H", meta, pitm_start + 4)[0]
+
+    iprp = children(meta, *boxes[b"iprp"])
+    properties = [(kind, start) for kind, start, _ in iter_boxes(meta, *iprp[b"ipco"])]
+
+    ipma_start, _ = iprp[b"ipma"]
+    version = meta[ipma_start]
+    large = meta[ipma_start + 3] & 1
+    (count,) = struct.unpack_from(">I", meta, ipma_start + 4)
+    position = ipma_start + 8
+    associated = []
+    for _ in range(count):
+        item_format = ">I" if version else ">H"
+        (item,) = struct.unpack_from(item_format, meta, position)
+        position += struct.calcsize(item_format)
+        associations = meta[position]
+        position += 1
+        for _ in range(associations):
+            if large:
+                (value,) = struct.unpack_from(">H", meta, position)
+                property_index = value & 0x7FFF
+                position += 2
+            else:
+                property_index = meta[position] & 0x7F
+                position += 1
+            if item == primary and property_index:
+                associated.append(properties[property_index - 1])
+
+    width = height = None
+    orientation = 1
+    for kind, start in associated:
+        if kind == b"ispe":
+            width, height = struct.unpack_from(">II", meta, start + 4)
+        elif kind == b"irot":
+            orientation = IROT_ORIENTATION[meta[start] & 3]
+
+    if width is None:
+        raise ValueError("HEIF primary item has no ispe box")
+    return width, height, orientation
+
+
+def read_heif(f, size: int):
+    """Walk top-level boxes, reading only ftyp and meta; other boxes are skipped."""
+    width = None
+    position = 0
+
+    while position < size:
+        f.seek(position)
+        header = read_exact(f, 8)
+        box_size, kind = struct.unpack(">I4s", header)
+        header_size = 8
+        if box_size == 1:
+            (box_size,) = struct.unpack(">Q", read_exact(f, 8))
+            header_size = 16
+        elif box_size == 0:
+            box_size = size - position
+        if box_size < header_size:
+            raise ValueError("Corrupt HEIF box structure")
+        if position + box_size > size:
+            raise ValueError(f"Truncated HEIF ({kind.decode('latin1')} box exceeds file size)")
+
+        if kind == b"ftyp":
+            payload = read_exact(f, min(box_size - header_size, 256))
+            brands = {payload[:4]} | {payload[i:i + 4] for i in range(8, len(payload), 4)}
+            if not brands & HEIF_BRANDS:
+                raise ValueError("Unsupported HEIF brand")
+        elif kind == b"meta":
+            if box_size - header_size > META_READ_LIMIT:
+                raise ValueError("HEIF meta box is too large")
+            width, height, orientation = parse_heif_meta(read_exact(f, box_size - header_size))
+
+        position += box_size
+
+    if width is None:
+        raise ValueError("HEIF has no meta box")
+    return width, height, orientation
+
+
+def detect_format(head: bytes):
+    if head[:2] == b"\xff\xd8":
+        return "jpeg"
+    if head[4:8] == b"ftyp":
+        return "heif"
+    return None
+
+
+def probe_image(path) -> dict:
+    """Format, size and orientation from container headers only.
+
+       Only marker segments / boxes before the image data and the last few KB
+       of JPEG files are read; pixel data is never decoded. Problems are
+       reported in "error" instead of raised.
+    """
+    result = {"format": None, "width": None, "height": None, "orientation": None, "error": None}
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            result["format"] = detect_format(f.read(12))
+            f.seek(0)
+            if result["format"] == "jpeg":
+                width, height, orientation = read_jpeg(f, size)
+            elif result["format"] == "heif":
+                width, height, orientation = read_heif(f, size)
+            else:
+                raise ValueError("Unknown image format")
+    except (OSError, ValueError, struct.error, IndexError, KeyError) as e:
+        result["error"] = str(e) or type(e).__name__
+        return result
+
+    result.update(width=width, height=height, orientation=orientation)
+    extension = os.path.splitext(str(path))[1][1:].lower()
+    expected = EXTENSION_FORMATS.get(extension)
+    if expected is not None and expected != result["format"]:
+        result["error"] = f"Extension .{extension} does not match {result['format'].upper()} content"
+    return result
+
+
+def image_headers(files, cache=None, jobs=None):
+    """Return {filename: probe result}, probing only files without a cached result."""
+    result = {}
+    missing = []
+    for file in files:
+        cached = cache.get(HEADER_KIND, file) if cache is not None else None
+        if cached is not None:
+            result[file.name] = json.loads(cached)
+        else:
+            missing.append(file)
+
+    probes = run_parallel(probe_image, [file.path for file in missing], jobs)
+    for file, probe in zip(missing, probes):
+        result[file.name] = probe
+        if cache is not None:
+            cache.put(HEADER_KIND, file, json.dumps(probe))
+
+    return result
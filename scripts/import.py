@@ -1,54 +1,308 @@
 import csv
+import io
+import os
 import shutil
+import tarfile
+import tempfile
+import threading
+import zipfile
 import argparse
 from pathlib import Path
 
-from .utils import build_filename, get_next_index_for_group
+from .cache import FileCache
+from .dataset import DatasetIndex
+from .journal import commit_renames, fsync_batch, fsync_directory, recover
+from .store import STORE_DIR, adopt
+from .utils import build_filename, ATTR_FIELDS, SCHEMA
+from .workers import run_parallel
 
 IMAGES_DIR = Path("images")
 TEMP_DIR = Path("images_temp")
 
-METADATA_FILE = TEMP_DIR / "metadata.csv"
+METADATA_NAME = "metadata.csv"
+METADATA_FILE = TEMP_DIR / METADATA_NAME
 
+STAGING_PREFIX = ".import-"
+COPY_BUFFER_SIZE = 1024 * 1024
 
-def load_metadata(path: Path):
+
+def read_metadata(stream):
     entries = []
-    with open(path, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f, delimiter="\t")
-        for row in reader:
-            entry = {
-                "filename": row["Filename"],
-                "type": row["Bottle type"],
-                "color": row["Glass color"],
-                "fill": row["Fill level"],
-                "liquid": row["Liquid color"],
-                "label": row["Label presence"],
-                "cap": row["Cap presence"],
-            }
-            entries.append(entry)
+    reader = csv.DictReader(stream, delimiter="\t")
+    for row in reader:
+        entry = {
+            "filename": row["Filename"],
+            "type": row["Bottle type"],
+            "color": row["Glass color"],
+            "fill": row["Fill level"],
+            "liquid": row["Liquid color"],
+            "label": row["Label presence"],
+            "cap": row["Cap presence"],
+        }
+        entries.append(entry)
     return entries
 
 
-def process_entries(entries, dry_run=False):
+def load_metadata(path: Path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return read_metadata(f)
+
+
+def copy_stream(src, dst_path: Path):
+    with open(dst_path, "wb") as dst:
+        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+
+
+class DirectorySource:
+    """Loose files and metadata.csv in a directory (images_temp/ by default).
+
+       Files on the same device as images/ are hard-linked into staging, others
+       are copied. Originals are removed as part of the committed transaction.
+    """
+
+    duplicates = frozenset()
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+
+    def read_metadata(self):
+        path = self.directory / METADATA_NAME
+        return load_metadata(path) if path.exists() else None
+
+    def available(self, names):
+        return {name for name in names if (self.directory / name).is_file()}
+
+    def stage(self, items, jobs=None):
+        def stage_one(item):
+            name, staged = item
+            src = self.directory / name
+            if not src.is_file():
+                return None
+            try:
+                os.link(src, staged)
+            except OSError:
+                shutil.copyfile(src, staged)
+            return name
+
+        return {name for name in run_parallel(stage_one, items, jobs) if name is not None}
+
+    def originals(self, names):
+        return [self.directory / name for name in names]
+
+
+class ZipSource:
+    """Photo session packed as a zip archive with metadata.csv among its members.
+
+       Members are matched by base name and streamed into staging in parallel,
+       each worker thread using its own handle on the archive. Base names
+       shared by members in different folders are listed in duplicates.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.local = threading.local()
+        self.handles = []
+        self.members = {}
+        self.duplicates = set()
+        with zipfile.ZipFile(self.path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                name = Path(info.filename).name
+                if name in self.members:
+                    self.duplicates.add(name)
+                self.members[name] = info.filename
+
+    def _archive(self):
+        if not hasattr(self.local, "archive"):
+            self.local.archive = zipfile.ZipFile(self.path)
+            self.handles.append(self.local.archive)
+        return self.local.archive
+
+    def read_metadata(self):
+        if METADATA_NAME not in self.members:
+            return None
+        with zipfile.ZipFile(self.path) as archive, archive.open(self.members[METADATA_NAME]) as f:
+            return read_metadata(io.TextIOWrapper(f, encoding="utf-8", newline=""))
+
+    def available(self, names):
+        return {name for name in names if name in self.members}
+
+    def stage(self, items, jobs=None):
+        def stage_one(item):
+            name, staged = item
+            if name not in self.members:
+                return None
+            with self._archive().open(self.members[name]) as src:
+                copy_stream(src, staged)
+            return name
+
+        try:
+            return {name for name in run_parallel(stage_one, items, jobs) if name is not None}
+        finally:
+            for handle in self.handles:
+                handle.close()
+            self.handles = []
+            self.local = threading.local()
+
+    def originals(self, names):
+        return []
+
+
+class TarSource:
+    """Photo session packed as a (possibly compressed) tar archive.
+
+       Members are staged in archive order by a single streaming reader.
+       Metadata is looked up by walking the member headers: in a plain tar the
+       data in between is skipped with seeks, while compressed archives have
+       to be decompressed up to metadata.csv, so it is best stored first.
+       Base names of several members are collected in duplicates by every
+       full pass over the archive.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.duplicates = set()
+
+    def _members(self):
+        seen = set()
+        with tarfile.open(self.path, "r|*") as archive:
+            for member in archive:
+                if member.isfile():
+                    name = Path(member.name).name
+                    if name in seen:
+                        self.duplicates.add(name)
+                    seen.add(name)
+                    yield name, member, archive
+
+    def read_metadata(self):
+        with tarfile.open(self.path, "r:*") as archive:
+            member = archive.next()
+            while member is not None:
+                if member.isfile() and Path(member.name).name == METADATA_NAME:
+                    text = archive.extractfile(member).read().decode("utf-8")
+                    return read_metadata(io.StringIO(text, newline=""))
+                member = archive.next()
+        return None
+
+    def available(self, names):
+        wanted = set(names)
+        return {name for name, _, _ in self._members() if name in wanted}
+
+    def stage(self, items, jobs=None):
+        targets = {}
+        for name, staged in items:
+            targets.setdefault(name, staged)
+
+        staged_names = set()
+        for name, member, archive in self._members():
+            if name in targets and name not in staged_names:
+                copy_stream(archive.extractfile(member), targets[name])
+                staged_names.add(name)
+        return staged_names
+
+    def originals(self, names):
+        return []
+
+
+def open_source(path: Path):
+    if Path(path).is_dir():
+        return DirectorySource(path)
+    if zipfile.is_zipfile(path):
+        return ZipSource(path)
+    if tarfile.is_tarfile(path):
+        return TarSource(path)
+    raise ValueError(f"Unsupported import source: {path}")
+
+
+def recover_images():
+    """Undo a previously interrupted import and drop its staging directories."""
+    reverted = recover(IMAGES_DIR)
+    for staging in IMAGES_DIR.glob(STAGING_PREFIX + "*"):
+        shutil.rmtree(staging, ignore_errors=True)
+    if reverted:
+        print(f"Rolled back {reverted} files of an interrupted import.")
+
+
+def entry_key(entry):
+    """Attribute tuple of a metadata row, lowercased like the filename built from it."""
+    return tuple(entry[field].lower() for field in ATTR_FIELDS)
+
+
+def plan_entries(entries, available, index, staged_paths=None, duplicates=frozenset()):
     summary = []
+    renames = []
+    seen = set()
 
     for entry in entries:
         original_name = entry["filename"]
-        src = TEMP_DIR / original_name
 
-        if not src.exists():
+        errors = SCHEMA.check(entry_key(entry))
+        if errors:
+            summary.append((original_name, None, "Invalid attributes: " + "; ".join(errors)))
+            continue
+
+        if original_name in duplicates:
+            summary.append((original_name, None, "Several files with this name in the source"))
+            continue
+
+        if original_name not in available:
             summary.append((original_name, None, "File not found"))
             continue
 
-        next_index = get_next_index_for_group(entry, IMAGES_DIR)
+        if original_name in seen:
+            summary.append((original_name, None, "Duplicate metadata row"))
+            continue
+        seen.add(original_name)
 
-        new_name = build_filename(entry, next_index)
-        dst = IMAGES_DIR / new_name
+        next_index = index.allocate(entry_key(entry))
 
+        new_name = build_filename(entry, next_index)
         summary.append((original_name, new_name, "OK"))
 
-        if not dry_run:
-            shutil.move(str(src), str(dst))
+        if staged_paths is not None:
+            renames.append((staged_paths[original_name], IMAGES_DIR / new_name))
+
+    return summary, renames
+
+
+def process_entries(entries, dry_run=False, index=None, source=None, jobs=None):
+    """Import entries from source into images/ as a single transaction.
+
+       Files are first staged inside images/ (one read and one write each),
+       flushed to disk in one batch, and then renamed into place under a
+       rollback journal: either the whole batch lands or none of it does.
+    """
+    if index is None:
+        index = DatasetIndex.build(IMAGES_DIR)
+    if source is None:
+        source = DirectorySource(TEMP_DIR)
+
+    # Rows failing the schema are rejected before anything is staged.
+    names = list(dict.fromkeys(entry["filename"] for entry in entries if not SCHEMA.check(entry_key(entry))))
+
+    if dry_run:
+        summary, _ = plan_entries(entries, source.available(names), index, duplicates=source.duplicates)
+        return summary
+
+    recover_images()
+    staging = Path(tempfile.mkdtemp(prefix=STAGING_PREFIX, dir=IMAGES_DIR))
+    try:
+        staged_paths = {name: staging / f"{i:06d}" for i, name in enumerate(names)}
+        staged = source.stage(list(staged_paths.items()), jobs)
+
+        summary, renames = plan_entries(entries, staged, index, staged_paths, source.duplicates)
+        imported = [original for original, _, status in summary if status == "OK"]
+
+        fsync_batch([src for src, _ in renames], jobs)
+        fsync_directory(staging)
+        commit_renames(IMAGES_DIR, renames, cleanup=source.originals(imported))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    if STORE_DIR.is_dir():
+        with FileCache() as cache:
+            adopt([index.add(dst) for _, dst in renames], STORE_DIR, cache, jobs)
 
     return summary
 
@@ -66,21 +320,30 @@ def print_summary(summary, dry_run=False):
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Import new bottle images from images_temp/")
+    parser = argparse.ArgumentParser(description="Import new bottle images from images_temp/ or an archive")
     parser.add_argument(
         "--dry", "-d", action="store_true",
         help="Perform a dry run without modifying any files"
     )
+    parser.add_argument(
+        "--archive", "-a", type=Path,
+        help="Import a zip or tar archive containing images and metadata.csv"
+    )
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=None,
+        help="Number of parallel copy workers (default: number of CPUs)"
+    )
     args = parser.parse_args()
 
     dry_run = args.dry
+    source = open_source(args.archive) if args.archive else DirectorySource(TEMP_DIR)
 
-    if not METADATA_FILE.exists():
-        print(f"Metadata file not found: {METADATA_FILE}")
+    entries = source.read_metadata()
+    if entries is None:
+        print(f"Metadata file not found: {args.archive or METADATA_FILE}")
         return
 
-    entries = load_metadata(METADATA_FILE)
-    summary = process_entries(entries, dry_run=dry_run)
+    summary = process_entries(entries, dry_run=dry_run, source=source, jobs=args.jobs)
     print_summary(summary, dry_run=dry_run)
 
 
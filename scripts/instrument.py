@@ -0,0 +1,180 @@
+import contextlib
+import functools
+import json
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+PROCESS_IO = Path("/proc/self/io")
+THREAD_IO = Path("/proc/thread-self/io")
+
+
+def read_bytes(io_file: Path):
+    """Bytes read so far according to a Linux /proc io file, or None elsewhere."""
+    try:
+        with open(io_file, "rb") as f:
+            for line in f:
+                if line.startswith(b"rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+class SpanTotals:
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_memory = 0
+        self.files = 0
+        self.bytes_read = None
+
+    def to_json(self):
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "calls": self.calls,
+            "wall_s": round(self.wall, 6),
+            "cpu_s": round(self.cpu, 6),
+            "peak_memory_bytes": self.peak_memory,
+            "files": self.files,
+            "bytes_read": self.bytes_read,
+        }
+
+
+class Recorder:
+    """Collects wall time, CPU time, peak memory, opened files and bytes read per span.
+
+       Stages and batches are measured process-wide (CPU of all threads,
+       /proc/self/io), functions per calling thread (thread CPU time,
+       /proc/thread-self/io). Opening a span takes a lock and reads the
+       tracemalloc peak, so hot paths are recorded per batch of work rather
+       than per call.
+       Peak memory is the tracemalloc high-water mark of the process while a
+       span was open, so spans running concurrently report a shared peak.
+       While disabled, instrumented functions cost one attribute check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.totals = {}
+        self.open_spans = []
+        self.local = threading.local()
+        self.files = 0
+        self.started_tracing = False
+        self.hooked = False
+
+    def start(self):
+        if not self.hooked:
+            sys.addaudithook(self.audit)
+            self.hooked = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self.totals = {}
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def audit(self, event, args):
+        if event == "open" and self.enabled and not str(args[0]).startswith("/proc/"):
+            self.files += 1
+            self.local.files = getattr(self.local, "files", 0) + 1
+
+    def fold_peak(self, reset=False):
+        """Credit the current tracemalloc peak to every open span."""
+        with self.lock:
+            peak = tracemalloc.get_traced_memory()[1]
+            for span in self.open_spans:
+                span[0] = max(span[0], peak)
+            if reset:
+                tracemalloc.reset_peak()
+
+    @contextlib.contextmanager
+    def span(self, name, kind="stage", io=True):
+        if not self.enabled:
+            yield
+            return
+
+        process_wide = kind != "function"
+        clock = time.process_time if process_wide else time.thread_time
+        io_file = PROCESS_IO if process_wide else THREAD_IO
+
+        read_start = read_bytes(io_file) if io else None
+        files_start = self.files if process_wide else getattr(self.local, "files", 0)
+        peak = [0]
+        self.fold_peak(reset=True)
+        with self.lock:
+            self.open_spans.append(peak)
+        cpu_start = clock()
+        wall_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = clock() - cpu_start
+            self.fold_peak()
+            files = (self.files if process_wide else getattr(self.local, "files", 0)) - files_start
+            read_end = read_bytes(io_file) if read_start is not None else None
+
+            with self.lock:
+                self.open_spans = [span for span in self.open_spans if span is not peak]
+                totals = self.totals.setdefault((kind, name), SpanTotals(kind, name))
+                totals.calls += 1
+                totals.wall += wall
+                totals.cpu += cpu
+                totals.peak_memory = max(totals.peak_memory, peak[0])
+                totals.files += files
+                if read_end is not None:
+                    totals.bytes_read = (totals.bytes_read or 0) + read_end - read_start
+
+    def to_json(self):
+        return {
+            "version": 1,
+            "python": platform.python_version(),
+            "spans": [totals.to_json() for totals in self.totals.values()],
+        }
+
+    def write(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_json(), indent=2), encoding="utf-8")
+
+    def print_summary(self):
+        print(f"{'Span':<32} {'Calls':>8} {'Wall s':>9} {'CPU s':>9} {'Peak MiB':>9} {'Files':>7} {'Read MiB':>9}")
+        for totals in self.totals.values():
+            read = "-" if totals.bytes_read is None else f"{totals.bytes_read / 2 ** 20:.2f}"
+            print(
+                f"{totals.kind + ':' + totals.name:<32} {totals.calls:>8} {totals.wall:>9.3f} {totals.cpu:>9.3f} "
+                f"{totals.peak_memory / 2 ** 20:>9.2f} {totals.files:>7} {read:>9}"
+            )
+
+
+RECORDER = Recorder()
+
+
+def instrumented(name, io=True, kind="function"):
+    """Record calls of the decorated function as spans of the given kind.
+
+       Use kind="batch" for functions that process a whole batch (possibly
+       on worker threads), so the span covers the CPU time of all threads.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not RECORDER.enabled:
+                return func(*args, **kwargs)
+            with RECORDER.span(name, kind, io):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,112 @@
+import json
+import os
+from pathlib import Path
+
+from .workers import run_parallel
+
+JOURNAL_NAME = ".journal.json"
+
+
+def fsync_file(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_directory(path: Path):
+    """Persist directory entries (renames, new files); a no-op where unsupported."""
+    try:
+        fsync_file(path)
+    except OSError:
+        pass
+
+
+def fsync_batch(paths, jobs=None):
+    """Flush a whole batch of written files at once instead of after each write."""
+    run_parallel(fsync_file, paths, jobs)
+
+
+def write_journal(path: Path, data):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fsync_directory(path.parent)
+
+
+def commit_renames(directory: Path, renames, cleanup=()):
+    """Apply a list of (src, dst) renames as one transaction.
+
+       The plan is journaled in directory before anything moves. If a rename
+       fails, the ones already done are reverted and the error is re-raised;
+       if the process dies, recover() reverts them on the next run. Existing
+       destination files are never overwritten.
+
+       Files in cleanup (e.g. import originals) are removed once all renames
+       are done. The journal then only lists them, so recover() finishes the
+       removal instead of reverting a committed transaction.
+    """
+    journal = Path(directory) / JOURNAL_NAME
+    cleanup = [str(path) for path in cleanup]
+    write_journal(journal, {"renames": [[str(src), str(dst)] for src, dst in renames], "cleanup": cleanup})
+
+    done = []
+    try:
+        for src, dst in renames:
+            if os.path.lexists(dst):
+                raise FileExistsError(f"Refusing to overwrite existing file: {dst}")
+            os.rename(src, dst)
+            done.append((src, dst))
+        for parent in {Path(dst).parent for _, dst in renames}:
+            fsync_directory(parent)
+    except BaseException:
+        revert_renames(done)
+        journal.unlink()
+        raise
+
+    if cleanup:
+        write_journal(journal, {"cleanup": cleanup})
+        remove_files(cleanup)
+    journal.unlink()
+    fsync_directory(Path(directory))
+
+
+def remove_files(paths):
+    for path in paths:
+        Path(path).unlink(missing_ok=True)
+
+
+def revert_renames(renames):
+    reverted = 0
+    for src, dst in reversed(list(renames)):
+        if os.path.lexists(dst) and not os.path.lexists(src):
+            os.rename(dst, src)
+            reverted += 1
+    return reverted
+
+
+def recover(directory: Path) -> int:
+    """Roll back a transaction interrupted by a crash. Returns number of reverted renames.
+
+       A transaction that was interrupted after its renames, while removing
+       its cleanup files, is completed instead.
+    """
+    journal = Path(directory) / JOURNAL_NAME
+    if not journal.exists():
+        return 0
+
+    with open(journal, encoding="utf-8") as f:
+        data = json.load(f)
+
+    reverted = 0
+    if "renames" in data:
+        reverted = revert_renames((Path(src), Path(dst)) for src, dst in data["renames"])
+    else:
+        remove_files(data["cleanup"])
+    journal.unlink()
+    fsync_directory(Path(directory))
+    return reverted
@@ -0,0 +1,159 @@
+import argparse
+import json
+import shutil
+from pathlib import Path
+
+from . import package
+from .cache import FileCache
+from .dataset import DatasetIndex, IMAGES_DIR
+from .utils import ATTR_FIELDS
+from .validate import content_hashes
+
+MANIFEST_FILE = Path("annotations/release.json")
+MANIFEST_VERSION = 1
+DELTA_NAME = "delta.json"
+
+
+def build_manifest(index, cache=None, jobs=None):
+    """Filename, size, SHA-256 and parameters of every annotated image, sorted by filename."""
+    digests = content_hashes(index.records, cache, jobs=jobs)
+    return {
+        "version": MANIFEST_VERSION,
+        "images": [
+            {
+                "filename": file.name,
+                "size": file.size,
+                "sha256": digests[file.name],
+                "index": file.info.index,
+                "parameters": {field: file.info[field] for field in ATTR_FIELDS},
+            }
+            for file in index.records
+        ],
+    }
+
+
+def write_manifest(manifest, path: Path = MANIFEST_FILE):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+
+def load_manifest(path: Path):
+    manifest = json.loads(Path(path).read_text(encoding="utf-8"))
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"{path}: unsupported manifest version {manifest.get('version')}")
+    return manifest
+
+
+def diff_manifests(old, new):
+    """Compare two manifests in one pass over each.
+
+       Images present under the same name in both are unchanged or modified
+       (different content). Of the rest, a removed and an added image with
+       the same SHA-256 are reported as a rename; the others as removed or
+       added. Returns lists of names (renamed holds (old, new) pairs).
+    """
+    old_images = {image["filename"]: image for image in old["images"]}
+    new_images = {image["filename"]: image for image in new["images"]}
+
+    result = {"added": [], "removed": [], "renamed": [], "modified": [], "unchanged": 0}
+    removed_by_hash = {}
+    for name, image in old_images.items():
+        current = new_images.get(name)
+        if current is None:
+            removed_by_hash.setdefault(image["sha256"], []).append(name)
+        elif current["sha256"] != image["sha256"]:
+            result["modified"].append(name)
+        else:
+            result["unchanged"] += 1
+
+    for name, image in new_images.items():
+        if name in old_images:
+            continue
+        sources = removed_by_hash.get(image["sha256"])
+        if sources:
+            result["renamed"].append((sources.pop(0), name))
+        else:
+            result["added"].append(name)
+
+    result["removed"] = sorted(name for names in removed_by_hash.values() for name in names)
+    return result
+
+
+def write_delta(diff, new_manifest, index, delta_dir: Path, annotations_file: Path = package.ANNOTATIONS_FILE, jobs=None):
+    """Package only the content a holder of the old release is missing.
+
+       delta_dir receives tar shards (see scripts/package.py) with the added
+       and modified images and their annotation sidecars, the new release
+       manifest and annotations, and delta.json with the full diff: removals
+       and renames need no data.
+    """
+    changed = set(diff["added"]) | set(diff["modified"])
+    entries = package.load_entries(annotations_file)
+    files = [file for file in index.records if file.name in changed and file.name in entries]
+    if len(files) != len(changed):
+        missing = sorted(changed - {file.name for file in files})
+        raise FileNotFoundError(f"Images of the new manifest without a file or annotation entry: {missing[:5]}")
+
+    packaged = package.write_package(files, entries, delta_dir, jobs=jobs)
+    expected = {image["filename"]: image["sha256"] for image in new_manifest["images"]}
+    for member in packaged["members"]:
+        if member["name"] in expected and member["sha256"] != expected[member["name"]]:
+            raise ValueError(f"{member['name']} changed since the manifest was written")
+
+    write_manifest(new_manifest, delta_dir / MANIFEST_FILE.name)
+    shutil.copyfile(annotations_file, delta_dir / annotations_file.name)
+    (delta_dir / DELTA_NAME).write_text(json.dumps(diff, indent=2), encoding="utf-8")
+    return packaged
+
+
+def print_diff(diff):
+    print(f"Unchanged: {diff['unchanged']}")
+    for kind in ("added", "removed", "modified"):
+        print(f"{kind.capitalize()}: {len(diff[kind])}")
+        for name in diff[kind]:
+            print(f"  {name}")
+    print(f"Renamed: {len(diff['renamed'])}")
+    for old_name, new_name in diff["renamed"]:
+        print(f"  {old_name} -> {new_name}")
+
+
+def load_options():
+    parser = argparse.ArgumentParser(description="Write the dataset manifest or compare two manifests.")
+    parser.add_argument("old", nargs="?", type=Path, help="Manifest of an earlier release; omit to write the current manifest")
+    parser.add_argument("new", nargs="?", type=Path, default=MANIFEST_FILE, help="Manifest to compare with (default: %(default)s)")
+    parser.add_argument("--delta", type=Path, help="Write a delta package of the changes to this directory")
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=None,
+        help="Number of parallel workers (default: number of CPUs)"
+    )
+    return parser.parse_args()
+
+
+def main(index=None, jobs=None):
+    if index is None:
+        index = DatasetIndex.build(IMAGES_DIR)
+
+    with FileCache() as cache:
+        manifest = build_manifest(index, cache, jobs)
+    write_manifest(manifest)
+    print(f"Manifest written to: {MANIFEST_FILE}")
+    print(f"Images: {len(manifest['images'])}")
+
+
+def compare(old_path, new_path, delta_dir=None, jobs=None):
+    new = load_manifest(new_path)
+    diff = diff_manifests(load_manifest(old_path), new)
+    print_diff(diff)
+
+    if delta_dir is not None:
+        packaged = write_delta(diff, new, DatasetIndex.build(IMAGES_DIR), delta_dir, jobs=jobs)
+        size = sum(shard["size"] for shard in packaged["shards"])
+        print(f"\nDelta package written to: {delta_dir} ({len(packaged['shards'])} shards, {size} bytes)")
+
+
+if __name__ == "__main__":
+    options = load_options()
+    if options.old is None:
+        main(jobs=options.jobs)
+    else:
+        compare(options.old, options.new, options.delta, options.jobs)
@@ -0,0 +1,193 @@
+import argparse
+import gzip
+import hashlib
+import json
+import tarfile
+from pathlib import Path
+
+from .dataset import DatasetIndex, IMAGES_DIR
+from .workers import run_parallel
+
+ANNOTATIONS_FILE = Path("annotations/annotations.json")
+PACKAGE_DIR = Path("dist")
+MANIFEST_NAME = "manifest.json"
+SHARD_PREFIX = "bottles"
+SHARD_SIZE = 1024 * 1024 * 1024
+BATCH_SAMPLES = 64
+GZIP_LEVEL = 6
+
+END_OF_ARCHIVE = b"\0" * (2 * tarfile.BLOCKSIZE)
+
+
+def tar_header(name: str, size: int) -> bytes:
+    """A tar header with fixed owner, mode and mtime, so shards are reproducible."""
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mode = 0o644
+    info.mtime = 0
+    return info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+
+
+def build_sample(task):
+    """Tar bytes of one sample (image plus annotation sidecar) and its member records.
+
+       The sample is compressed as a gzip member of its own; concatenated
+       members form a valid .tar.gz, and each one can be decompressed alone.
+    """
+    path, entry, compress = task
+    data = Path(path).read_bytes()
+    key = Path(path).stem
+    sidecar = json.dumps(entry, indent=2).encode("utf-8")
+
+    chunk = bytearray()
+    members = []
+    for name, content in ((Path(path).name, data), (key + ".json", sidecar)):
+        header = tar_header(name, len(content))
+        members.append({
+            "name": name,
+            "data_offset": len(chunk) + len(header),
+            "size": len(content),
+            "sha256": hashlib.sha256(content).hexdigest(),
+        })
+        chunk += header + content + b"\0" * (-len(content) % tarfile.BLOCKSIZE)
+
+    chunk = bytes(chunk)
+    return (gzip.compress(chunk, GZIP_LEVEL, mtime=0) if compress else chunk), members
+
+
+class ShardWriter:
+    """Writes samples into numbered shards, starting a new one past shard_size bytes."""
+
+    def __init__(self, package_dir: Path, shard_size: int, compress: bool):
+        self.package_dir = package_dir
+        self.shard_size = shard_size
+        self.compress = compress
+        self.suffix = ".tar.gz" if compress else ".tar"
+        self.shards = []
+        self.members = []
+        self.file = None
+
+    def open_shard(self):
+        name = f"{SHARD_PREFIX}-{len(self.shards):05d}{self.suffix}"
+        self.file = open(self.package_dir / name, "wb")
+        self.shards.append({"file": name, "size": 0, "samples": 0, "hash": hashlib.sha256()})
+
+    def close_shard(self):
+        shard = self.shards[-1]
+        self.write(gzip.compress(END_OF_ARCHIVE, GZIP_LEVEL, mtime=0) if self.compress else END_OF_ARCHIVE)
+        self.file.close()
+        self.file = None
+        shard["sha256"] = shard.pop("hash").hexdigest()
+
+    def write(self, data: bytes):
+        shard = self.shards[-1]
+        self.file.write(data)
+        shard["hash"].update(data)
+        shard["size"] += len(data)
+
+    def add(self, chunk: bytes, members):
+        if self.file is not None and self.shards[-1]["size"] + len(chunk) > self.shard_size:
+            self.close_shard()
+        if self.file is None:
+            self.open_shard()
+
+        shard = self.shards[-1]
+        offset = shard["size"]
+        self.write(chunk)
+        shard["samples"] += 1
+        for member in members:
+            self.members.append(dict(member, shard=shard["file"], offset=offset, length=len(chunk)))
+
+    def close(self):
+        if self.file is not None:
+            self.close_shard()
+
+
+def write_package(files, entries, package_dir: Path = PACKAGE_DIR, shard_size=SHARD_SIZE, jobs=None, compress=True):
+    """Stream files with their annotation entries into deterministic tar shards.
+
+       Samples are ordered by filename and read and compressed on a pool of
+       threads in batches, so memory use does not grow with the dataset. The
+       manifest lists for every member its shard, the byte range of the
+       compressed sample holding it (offset, length) and the position of its
+       data inside the decompressed sample (data_offset, size).
+    """
+    package_dir.mkdir(parents=True, exist_ok=True)
+    writer = ShardWriter(package_dir, shard_size, compress)
+
+    files = [file for file in files if file.name in entries]
+    for start in range(0, len(files), BATCH_SAMPLES):
+        batch = files[start:start + BATCH_SAMPLES]
+        tasks = [(str(file.path), entries[file.name], compress) for file in batch]
+        for chunk, members in run_parallel(build_sample, tasks, jobs):
+            writer.add(chunk, members)
+    writer.close()
+
+    manifest = {
+        "version": 1,
+        "compression": "gzip-members" if compress else None,
+        "shards": writer.shards,
+        "members": writer.members,
+    }
+    (package_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    written = {shard["file"] for shard in writer.shards} | {MANIFEST_NAME}
+    for path in package_dir.glob(f"{SHARD_PREFIX}-*"):
+        if path.name not in written:
+            path.unlink()
+
+    return manifest
+
+
+def extract_member(blob: bytes, member, compression) -> bytes:
+    """Member data from the bytes of its sample range (e.g. an HTTP Range response)."""
+    if compression is not None:
+        blob = gzip.decompress(blob)
+    data = blob[member["data_offset"]:member["data_offset"] + member["size"]]
+    if hashlib.sha256(data).hexdigest() != member["sha256"]:
+        raise ValueError(f"Checksum mismatch: {member['name']}")
+    return data
+
+
+def read_member(package_dir: Path, name: str) -> bytes:
+    """Read one member of a local package by seeking to its sample."""
+    manifest = json.loads((package_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+    member = next((member for member in manifest["members"] if member["name"] == name), None)
+    if member is None:
+        raise KeyError(f"No member {name!r} in {package_dir / MANIFEST_NAME}")
+    with open(package_dir / member["shard"], "rb") as f:
+        f.seek(member["offset"])
+        return extract_member(f.read(member["length"]), member, manifest["compression"])
+
+
+def load_entries(path: Path = ANNOTATIONS_FILE):
+    with open(path, encoding="utf-8") as f:
+        return {entry["filename"]: entry for entry in json.load(f)["images"]}
+
+
+def load_options():
+    parser = argparse.ArgumentParser(description="Package images and annotations into tar shards.")
+    parser.add_argument(
+        "--shard-size", type=int, default=SHARD_SIZE // (1024 * 1024),
+        help="Maximum shard size in MiB (default: %(default)s)"
+    )
+    parser.add_argument("--no-compress", action="store_true", help="Write plain .tar shards")
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=None,
+        help="Number of parallel workers (default: number of CPUs)"
+    )
+    return parser.parse_args()
+
+
+def main(index=None, shard_size=SHARD_SIZE, jobs=None, compress=True):
+    if index is None:
+        index = DatasetIndex.build(IMAGES_DIR)
+
+    manifest = write_package(index.records, load_entries(), PACKAGE_DIR, shard_size, jobs, compress)
+    print(f"Package written to: {PACKAGE_DIR}")
+    print(f"Shards: {len(manifest['shards'])}, members: {len(manifest['members'])}")
+
+
+if __name__ == "__main__":
+    options = load_options()
+    main(shard_size=options.shard_size * 1024 * 1024, jobs=options.jobs, compress=not options.no_compress)
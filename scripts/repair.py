@@ -0,0 +1,114 @@
+import argparse
+
+from .dataset import DatasetIndex, IMAGES_DIR
+from .journal import commit_renames, recover
+from .validate import check_group
+
+TEMP_PREFIX = ".repair-"
+
+
+def plan_group(records):
+    """Return [(file, new_name)] renumbering a group to 1..n with as few renames as possible.
+
+       Every index in 1..n that some file already holds under its canonical
+       name (e.g. 004) stays where it is; one file per duplicated index keeps
+       it. Only the remaining files (duplicates, indices past the group size,
+       non-numeric or unpadded indices) move, in index order, into the free
+       slots. No plan can keep more files in place.
+    """
+    kept = {}
+    for file in records:
+        info = file.info
+        if info.raw_index is None and info.index is not None and 1 <= info.index <= len(records):
+            kept.setdefault(info.index, file)
+
+    kept_names = {file.name for file in kept.values()}
+    movers = sorted(
+        (file for file in records if file.name not in kept_names),
+        key=lambda file: (file.info.index is None, file.info.index or 0, file.name),
+    )
+    free = [slot for slot in range(1, len(records) + 1) if slot not in kept]
+    return [(file, f"{'_'.join(file.key)}_{slot:03d}{file.path.suffix}") for file, slot in zip(movers, free)]
+
+
+def plan_repairs(index):
+    """Return {group key: [(file, new_name)]} for groups with index errors or duplicate indices."""
+    plans = {}
+    for key, records in index.groups.items():
+        index_errors, duplicates = check_group(records)
+        if index_errors or duplicates:
+            plans[key] = plan_group(records)
+    return plans
+
+
+def order_renames(renames):
+    """Order (src, dst) renames so that no step overwrites a file that still has to move.
+
+       A rename runs once its destination is free. Renames left waiting on
+       each other form cycles; one file of each cycle is parked under a
+       temporary hidden name first and moved to its target last.
+    """
+    pending = dict(renames)
+    by_dst = {dst: src for src, dst in renames}
+    ready = [src for src, dst in renames if dst not in pending]
+    sequence = []
+
+    while pending:
+        if not ready:
+            src = next(iter(pending))
+            dst = pending.pop(src)
+            temp = src.with_name(TEMP_PREFIX + src.name)
+            sequence.append((src, temp))
+            pending[temp] = dst
+            by_dst[dst] = temp
+        else:
+            src = ready.pop()
+            dst = pending.pop(src)
+            sequence.append((src, dst))
+        if by_dst.get(src) in pending:
+            ready.append(by_dst[src])
+    return sequence
+
+
+def print_plan(plans, total_files, apply=False):
+    if not apply:
+        print("Dry-run mode: no files were renamed. Use --apply to rename them.\n")
+
+    count = sum(len(moves) for moves in plans.values())
+    if not plans:
+        print("All groups have contiguous indices; nothing to repair.")
+        return
+
+    print("Repair plan:\n")
+    for key, moves in plans.items():
+        print(f"Group: {'_'.join(key)}")
+        for file, new_name in moves:
+            print(f"  {file.name} -> {new_name}")
+    print(f"\n{count} of {total_files} files in {len(plans)} groups {'renamed' if apply else 'to rename'}.")
+
+
+def load_options():
+    parser = argparse.ArgumentParser(description="Renumber groups with index gaps or duplicates using minimal renames.")
+    parser.add_argument("--apply", action="store_true", help="Rename the files (default: only print the plan)")
+    return parser.parse_args()
+
+
+def main(apply=False, images_dir=IMAGES_DIR):
+    reverted = recover(images_dir)
+    if reverted:
+        print(f"Rolled back {reverted} renames of an interrupted run.")
+
+    index = DatasetIndex.build(images_dir)
+    plans = plan_repairs(index)
+
+    if apply:
+        renames = [(file.path, file.path.with_name(new_name)) for moves in plans.values() for file, new_name in moves]
+        commit_renames(images_dir, order_renames(renames))
+
+    print_plan(plans, len(index.files), apply)
+    return plans
+
+
+if __name__ == "__main__":
+    options = load_options()
+    main(apply=options.apply)
@@ -0,0 +1,69 @@
+import itertools
+import json
+from pathlib import Path
+
+SCHEMA_FILE = Path(__file__).with_name("schema.json")
+
+
+class Rule:
+    """Cross-field constraint: when every "if" field has one of the listed
+       values, every "then" field must have one of its listed values.
+    """
+
+    def __init__(self, when, then, message):
+        self.when = {field: frozenset(values) for field, values in when.items()}
+        self.then = {field: frozenset(values) for field, values in then.items()}
+        self.message = message
+
+    def violated(self, attributes) -> bool:
+        return (
+            all(attributes[field] in values for field, values in self.when.items())
+            and not all(attributes[field] in values for field, values in self.then.items())
+        )
+
+
+class Schema:
+    """Allowed attribute values and rules, compiled into the set of valid tuples.
+
+       Every combination of allowed values is checked against the rules once
+       at load time; checking a file is then a single set lookup of its
+       attribute tuple. Error messages are only worked out for invalid ones.
+    """
+
+    def __init__(self, allowed, rules):
+        self.fields = list(allowed)
+        self.allowed = {field: list(values) for field, values in allowed.items()}
+        self.rules = rules
+        self.combinations = [
+            values for values in itertools.product(*self.allowed.values())
+            if not any(rule.violated(dict(zip(self.fields, values))) for rule in rules)
+        ]
+        self.valid = frozenset(self.combinations)
+
+    @classmethod
+    def load(cls, path: Path = SCHEMA_FILE, fields=None):
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        allowed = data["fields"]
+        if fields is not None and list(allowed) != list(fields):
+            raise ValueError(f"{path}: fields must be {list(fields)} in this order, found {list(allowed)}")
+
+        rules = []
+        for number, rule in enumerate(data.get("rules", []), 1):
+            unknown = (set(rule["if"]) | set(rule["then"])) - set(allowed)
+            if unknown:
+                raise ValueError(f"{path}: rule {number} refers to unknown fields {sorted(unknown)}")
+            rules.append(Rule(rule["if"], rule["then"], rule["message"]))
+        return cls(allowed, rules)
+
+    def check(self, key):
+        """Return error messages for a tuple of attribute values (empty if valid)."""
+        if key in self.valid:
+            return []
+
+        attributes = dict(zip(self.fields, key))
+        errors = [
+            f"{field}: '{value}' not in allowed set {self.allowed[field]}"
+            for field, value in attributes.items() if value not in self.allowed[field]
+        ]
+        errors.extend(rule.message.format(**attributes) for rule in self.rules if rule.violated(attributes))
+        return errors
@@ -0,0 +1,131 @@
+from .workers import run_parallel
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:
+    pass
+
+HASH_SIZE = 8
+SIMILARITY_THRESHOLD = 6
+FINGERPRINT_KIND = "dhash"
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def dhash(path, hash_size=HASH_SIZE) -> int:
+    """Difference hash: compares neighbouring pixels of a tiny grayscale thumbnail.
+
+       JPEG decoding is reduced with draft mode, so only a fraction of the
+       full-resolution image is actually decoded.
+    """
+    with Image.open(path) as image:
+        image.draft("L", (hash_size * 8, hash_size * 8))
+        pixels = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR).tobytes()
+
+    bits = 0
+    for row in range(hash_size):
+        for column in range(hash_size):
+            left = pixels[row * (hash_size + 1) + column]
+            right = pixels[row * (hash_size + 1) + column + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def safe_dhash(path):
+    try:
+        return dhash(path)
+    except Exception:
+        return None
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance.
+
+       A query with radius r only descends into children whose edge distance
+       lies within r of the distance to the current node, which prunes most of
+       the tree for small radii.
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value: int, item):
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+
+        node = self.root
+        while True:
+            node_value, items, children = node
+            distance = hamming(value, node_value)
+            if distance == 0:
+                items.append(item)
+                return
+            if distance not in children:
+                children[distance] = (value, [item], {})
+                return
+            node = children[distance]
+
+    def search(self, value: int, radius: int):
+        """Yield (distance, item) for all items within radius of value."""
+        if self.root is None:
+            return
+        stack = [self.root]
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                for item in items:
+                    yield distance, item
+            for edge, child in children.items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+
+
+def fingerprints(files, cache=None, jobs=None):
+    """Return {filename: dhash or None} using cached fingerprints of unchanged files."""
+    result = {}
+    missing = []
+    for file in files:
+        cached = cache.get(FINGERPRINT_KIND, file) if cache is not None else None
+        if cached is not None:
+            result[file.name] = int(cached, 16) if cached else None
+        else:
+            missing.append(file)
+
+    hashes = run_parallel(safe_dhash, [str(file.path) for file in missing], jobs, processes=True)
+    for file, value in zip(missing, hashes):
+        result[file.name] = value
+        if cache is not None:
+            cache.put(FINGERPRINT_KIND, file, "" if value is None else format(value, "016x"))
+
+    return result
+
+
+def find_similar(files, cache=None, jobs=None, threshold=SIMILARITY_THRESHOLD):
+    """Return sorted (name_a, name_b, distance) pairs of perceptually similar images."""
+    hashes = fingerprints(files, cache, jobs)
+    tree = BKTree()
+    pairs = []
+
+    for name in sorted(hashes):
+        value = hashes[name]
+        if value is None:
+            continue
+        for distance, other in tree.search(value, threshold):
+            pairs.append((other, name, distance))
+        tree.add(value, name)
+
+    return sorted(pairs)
@@ -1,68 +1,173 @@
 import argparse
 from pathlib import Path
 import collections
+import itertools
+from array import array
 from datetime import date
 
-from .utils import parse_filename, ATTR_FIELDS
+from .columnar import build_vocabulary, code_typecode
+from .dataset import DatasetIndex
+from .utils import ATTR_FIELDS
 
 IMAGES_DIR = Path("images")
 
 
-def load_filters():
+def load_options(args=None):
     parser = argparse.ArgumentParser(description="Compute dataset statistics with optional filters.")
-    parser.add_argument("--type")
-    parser.add_argument("--color")
-    parser.add_argument("--fill")
-    parser.add_argument("--liquid")
-    parser.add_argument("--label")
-    parser.add_argument("--cap")
-    return vars(parser.parse_args())
+    filter_help = "Comma-separated values to keep; prefix with ! to exclude them instead"
+    parser.add_argument("--type", help=filter_help)
+    parser.add_argument("--color", help=filter_help)
+    parser.add_argument("--fill", help=filter_help)
+    parser.add_argument("--liquid", help=filter_help)
+    parser.add_argument("--label", help=filter_help)
+    parser.add_argument("--cap", help=filter_help)
+    parser.add_argument(
+        "--crosstab", nargs=2, metavar=("ROW", "COLUMN"), choices=ATTR_FIELDS,
+        help="Print a two-way table of counts for a pair of attributes"
+    )
+    parser.add_argument(
+        "--pivot", metavar="FIELD", choices=ATTR_FIELDS,
+        help="Print distributions of all other attributes for each value of FIELD"
+    )
+    return parser.parse_args(args)
+
+
+def load_filters():
+    options = load_options()
+    return {field: getattr(options, field) for field in ATTR_FIELDS}
+
+
+def parse_filter(spec):
+    """Parse "amber,tulip" or "!empty" into (set of values, negated)."""
+    negated = spec.startswith("!")
+    values = frozenset(value.strip() for value in spec.lstrip("!").split(",") if value.strip())
+    return values, negated
+
+
+def filter_predicate(filters):
+    """Return a function telling whether parsed filename info matches filters.
+
+       Specs are parsed once here, not for every row the predicate is applied to.
+    """
+    parsed = [(field, *parse_filter(spec)) for field, spec in filters.items() if spec is not None]
+
+    def matches(info):
+        return all((info[field] in values) != negated for field, values, negated in parsed)
+
+    return matches
 
 
 def matches_filters(info, filters):
-    for field, expected in filters.items():
-        if expected is None:
-            continue
-        if info[field] != expected:
-            return False
-    return True
+    return filter_predicate(filters)(info)
+
+
+def code_column(column):
+    """bytes for uint8 code columns (fast translate/Counter paths), array otherwise."""
+    typecode = column.typecode if isinstance(column, array) else memoryview(column).format
+    return bytes(column) if typecode == "B" else array(typecode, column)
+
+
+class StatsEngine:
+    """Counting engine over categorical code columns.
+
+       Every field is a bytes column of uint8 codes into its vocabulary.
+       Filters turn into 0/1 byte masks (bytes.translate) combined as big
+       integers, and counts come from Counter over the selected codes, so a
+       query never loops over rows in Python. A field with more than 256
+       values (possible through invalid names) is an array("H") column
+       instead and takes a slower per-row path.
+    """
 
+    FIELDS = ATTR_FIELDS + ["ext"]
 
-def collect_statistics(filters):
-    attribute_counts = {field: collections.Counter() for field in ATTR_FIELDS}
-    combination_counts = collections.Counter()
-    extension_counts = collections.Counter()
-    parsing_errors = []
+    def __init__(self, vocabulary, columns):
+        self.vocabulary = vocabulary
+        self.columns = {field: code_column(column) for field, column in columns.items()}
+        self.size = len(self.columns[ATTR_FIELDS[0]])
 
-    for file in sorted(IMAGES_DIR.iterdir()):
-        if file.is_dir() or file.name.startswith("."):
-            continue
+    @classmethod
+    def from_index(cls, index):
+        records = index.records
+        vocabulary = {}
+        columns = {}
+        for field in cls.FIELDS:
+            values = [file.info[field] for file in records]
+            vocabulary[field] = build_vocabulary(field, values)
+            codes = {value: code for code, value in enumerate(vocabulary[field])}
+            columns[field] = array(code_typecode(vocabulary[field]), map(codes.__getitem__, values))
+        return cls(vocabulary, columns)
 
-        ext = file.suffix.lower()[1:]
+    @classmethod
+    def from_columns(cls, columns):
+        """Build from AnnotationColumns (annotations/annotations.npz)."""
+        names = {field: field for field in ATTR_FIELDS}
+        names["ext"] = "extension"
+        return cls(
+            {field: columns.vocabulary[name] for field, name in names.items()},
+            {field: columns[name] for field, name in names.items()},
+        )
 
-        info = parse_filename(file)
-        if info is None:
-            parsing_errors.append(file.name)
-            continue
+    def mask(self, filters):
+        """Return a 0/1 byte per row for rows matching filters, or None for all rows."""
+        selected = None
+        for field, spec in filters.items():
+            if spec is None:
+                continue
+            values, negated = parse_filter(spec)
+            codes = {code for code, value in enumerate(self.vocabulary[field]) if value in values}
+            table = bytes((code in codes) != negated for code in range(max(256, len(self.vocabulary[field]))))
+            column = self.columns[field]
+            flags = column.translate(table) if isinstance(column, bytes) else bytes(map(table.__getitem__, column))
+            bits = int.from_bytes(flags, "little")
+            selected = bits if selected is None else selected & bits
+        if selected is None:
+            return None
+        return selected.to_bytes(self.size, "little")
 
-        if not matches_filters(info, filters):
-            continue
+    def select(self, field, mask):
+        column = self.columns[field]
+        if mask is None:
+            return column
+        selected = itertools.compress(column, mask)
+        return bytes(selected) if isinstance(column, bytes) else array(column.typecode, selected)
 
-        extension_counts[ext] += 1
+    def total(self, mask) -> int:
+        return self.size if mask is None else mask.count(1)
 
-        for field in ATTR_FIELDS:
-            attribute_counts[field][info[field]] += 1
+    def counts(self, field, mask):
+        vocabulary = self.vocabulary[field]
+        counter = collections.Counter(self.select(field, mask))
+        return collections.Counter({vocabulary[code]: count for code, count in counter.items()})
 
-        combination_key = tuple(info[field] for field in ATTR_FIELDS)
-        combination_counts[combination_key] += 1
+    def crosstab(self, fields, mask):
+        """Count combinations of values of several fields (in order of first appearance)."""
+        vocabularies = [self.vocabulary[field] for field in fields]
+        counter = collections.Counter(zip(*(self.select(field, mask) for field in fields)))
+        return collections.Counter({
+            tuple(vocabulary[code] for vocabulary, code in zip(vocabularies, codes)): count
+            for codes, count in counter.items()
+        })
 
-    total_images = sum(attribute_counts[ATTR_FIELDS[0]].values())
+
+def collect_statistics(filters, index=None, engine=None):
+    if index is None:
+        index = DatasetIndex.build(IMAGES_DIR)
+    if engine is None:
+        engine = StatsEngine.from_index(index)
+
+    mask = engine.mask(filters)
+    attribute_counts = {field: engine.counts(field, mask) for field in ATTR_FIELDS}
+    combination_counts = engine.crosstab(ATTR_FIELDS, mask)
+    extension_counts = engine.counts("ext", mask)
+    parsing_errors = index.invalid
+
+    total_images = engine.total(mask)
 
     return total_images, attribute_counts, combination_counts, extension_counts, parsing_errors
 
 
-def print_statistics(filters):
-    total, attribute_counts, combination_counts, extension_counts, parsing_errors = collect_statistics(filters)
+def print_statistics(filters, index=None, engine=None):
+    total, attribute_counts, combination_counts, extension_counts, parsing_errors = collect_statistics(filters, index, engine)
 
     print(f"Date: {date.today()}")
     print(f"Total images: {total}")
@@ -99,9 +204,53 @@ def print_statistics(filters):
             print(f"  {name}")
 
 
-def main():
-    filters = load_filters()
-    print_statistics(filters)
+def print_crosstab(engine, row_field, column_field, filters):
+    mask = engine.mask(filters)
+    table = engine.crosstab([row_field, column_field], mask)
+    rows = [value for value in engine.vocabulary[row_field] if any(key[0] == value for key in table)]
+    columns = [value for value in engine.vocabulary[column_field] if any(key[1] == value for key in table)]
+
+    width = max([len(row_field)] + [len(value) for value in rows] + [len("total")]) + 2
+    cell = max([len(value) for value in columns] + [len(str(engine.total(mask))), len("total")]) + 2
+
+    print(f"Crosstab: {row_field} x {column_field}")
+    print(row_field.ljust(width) + "".join(value.rjust(cell) for value in columns) + "total".rjust(cell))
+    for row in rows:
+        counts = [table[(row, column)] for column in columns]
+        print(row.ljust(width) + "".join(str(count).rjust(cell) for count in counts) + str(sum(counts)).rjust(cell))
+    totals = [sum(table[(row, column)] for row in rows) for column in columns]
+    print("total".ljust(width) + "".join(str(count).rjust(cell) for count in totals) + str(sum(totals)).rjust(cell))
+    print()
+
+
+def print_pivot(engine, pivot_field, filters):
+    mask = engine.mask(filters)
+    totals = engine.counts(pivot_field, mask)
+    tables = {field: engine.crosstab([pivot_field, field], mask) for field in ATTR_FIELDS if field != pivot_field}
+
+    print(f"Pivot by {pivot_field}:")
+    for value, count in totals.most_common():
+        print(f"- {value}: {count}")
+        for field, table in tables.items():
+            breakdown = ", ".join(f"{other}: {n}" for (key, other), n in table.most_common() if key == value)
+            print(f"  - {field}: {breakdown}")
+    print()
+
+
+def main(index=None, args=None):
+    options = load_options(args)
+    filters = {field: getattr(options, field) for field in ATTR_FIELDS}
+
+    if index is None:
+        index = DatasetIndex.build(IMAGES_DIR)
+    engine = StatsEngine.from_index(index)
+
+    print_statistics(filters, index, engine)
+
+    if options.crosstab:
+        print_crosstab(engine, *options.crosstab, filters)
+    if options.pivot:
+        print_pivot(engine, options.pivot, filters)
 
 
 if __name__ == "__main__":
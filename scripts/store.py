@@ -0,0 +1,215 @@
+import argparse
+import errno
+import os
+import shutil
+from pathlib import Path
+
+from .cache import FileCache
+from .dataset import DatasetIndex, IMAGES_DIR
+from .validate import content_hashes
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+STORE_DIR = Path(".store")
+OBJECTS_DIR = "objects"
+TEMP_PREFIX = ".store-"
+FICLONE = 0x40049409  # ioctl(2) request cloning a whole file on btrfs, XFS and similar
+
+# link() errors after which a reflink or a copy is tried instead.
+LINK_FALLBACK_ERRORS = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP}
+
+
+def blob_path(store: Path, digest: str) -> Path:
+    return store / OBJECTS_DIR / digest[:2] / digest[2:]
+
+
+def reflink(src: Path, dst: Path):
+    if fcntl is None:
+        raise OSError(errno.ENOTSUP, "Reflinks are not supported on this platform")
+    with open(src, "rb") as source, open(dst, "xb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except OSError:
+            os.unlink(dst)
+            raise
+
+
+def place(src: Path, dst: Path) -> str:
+    """Create dst with the content of src without copying data where possible.
+
+       Tries a hard link, then a reflink (copy-on-write clone), then falls
+       back to a plain copy. Returns "link", "reflink" or "copy".
+    """
+    try:
+        os.link(src, dst)
+        return "link"
+    except OSError as error:
+        if error.errno not in LINK_FALLBACK_ERRORS:
+            raise
+    try:
+        reflink(src, dst)
+        return "reflink"
+    except OSError:
+        shutil.copyfile(src, dst)
+        return "copy"
+
+
+def adopt(files, store: Path = STORE_DIR, cache=None, jobs=None):
+    """Back files by blobs in the store, named by the SHA-256 of their content.
+
+       New content is linked into the store. A file whose content is already
+       stored under another inode is replaced (atomically) by a link to that
+       blob, so identical content is kept once; where that link cannot be
+       made the file is counted as not linked. Blobs that had to be reflinked
+       or copied are made read-only. A hard-linked blob shares its inode (and
+       mode) with the file in images/, so it is left writable: images should
+       be replaced, not edited in place. Returns counts per outcome.
+    """
+    counts = {"stored": 0, "already stored": 0, "deduplicated": 0, "not linked": 0, "bytes saved": 0}
+    digests = content_hashes(files, cache, jobs=jobs)
+
+    for file in files:
+        blob = blob_path(store, digests[file.name])
+        try:
+            stat = blob.stat()
+        except FileNotFoundError:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            if place(file.path, blob) != "link":
+                os.chmod(blob, 0o444)
+            counts["stored"] += 1
+            continue
+
+        current = os.stat(file.path)
+        if (current.st_dev, current.st_ino) == (stat.st_dev, stat.st_ino):
+            counts["already stored"] += 1
+            continue
+
+        # Same content under another inode: swap the file for a link to the blob.
+        temp = file.path.with_name(TEMP_PREFIX + file.name)
+        try:
+            os.link(blob, temp)
+        except OSError:
+            counts["not linked"] += 1
+            continue
+        os.replace(temp, file.path)
+        counts["deduplicated"] += 1
+        if current.st_nlink == 1:
+            counts["bytes saved"] += file.size
+        if cache is not None:
+            cache.put("sha256", file._replace(mtime_ns=stat.st_mtime_ns, inode=stat.st_ino), digests[file.name])
+    return counts
+
+
+def checkout(index, target: Path, store: Path = STORE_DIR, cache=None):
+    """Create target as a view of the index: a link (or reflink) to the blob of every file."""
+    target = Path(target)
+    if target.exists() and any(target.iterdir()):
+        raise FileExistsError(f"Checkout target is not empty: {target}")
+    target.mkdir(parents=True, exist_ok=True)
+
+    digests = content_hashes(index.files, cache)
+    methods = {"link": 0, "reflink": 0, "copy": 0}
+    for file in index.files:
+        blob = blob_path(store, digests[file.name])
+        if not blob.exists():
+            raise FileNotFoundError(f"{file.name} is not in the store; run adopt first")
+        methods[place(blob, target / file.name)] += 1
+    return methods
+
+
+def blobs(store: Path):
+    objects = store / OBJECTS_DIR
+    if not objects.is_dir():
+        return
+    for directory in sorted(objects.iterdir()):
+        for entry in sorted(directory.iterdir()):
+            yield entry
+
+
+def collect_garbage(index, store: Path = STORE_DIR, cache=None, jobs=None):
+    """Remove blobs of content no longer in images/. Returns (count, bytes).
+
+       The live set is the SHA-256 of every file in the index, so reflinked
+       or copied blobs of current images are kept. A blob still hard-linked
+       from elsewhere (an older checkout) is kept as well.
+    """
+    live = set(content_hashes(index.files, cache, jobs=jobs).values())
+    removed, size = 0, 0
+    for blob in blobs(store):
+        if blob.parent.name + blob.name in live:
+            continue
+        stat = blob.stat()
+        if stat.st_nlink == 1:
+            blob.unlink()
+            removed += 1
+            size += stat.st_size
+    return removed, size
+
+
+def store_status(index, store: Path = STORE_DIR):
+    inodes = set()
+    stored = 0
+    for blob in blobs(store):
+        stat = blob.stat()
+        inodes.add(stat.st_ino)
+        stored += stat.st_size
+    return {
+        "files": len(index.files),
+        "files in store": sum(file.inode in inodes for file in index.files),
+        "blobs": len(inodes),
+        "image bytes": sum(file.size for file in index.files),
+        "stored bytes": stored,
+    }
+
+
+def format_size(size: int) -> str:
+    return f"{size / 2 ** 20:.1f} MiB"
+
+
+def load_options():
+    parser = argparse.ArgumentParser(description="Content-addressed store backing images/ with hard links.")
+    parser.add_argument(
+        "command", choices=["adopt", "checkout", "gc", "status"],
+        help="adopt: move images/ content into the store; checkout: create a linked copy of images/; "
+             "gc: drop unreferenced blobs; status: show store usage"
+    )
+    parser.add_argument("target", nargs="?", type=Path, help="Directory to create (checkout only)")
+    parser.add_argument("--store", type=Path, default=STORE_DIR, help="Store directory (default: %(default)s)")
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=None,
+        help="Number of parallel hashing workers (default: number of CPUs)"
+    )
+    return parser.parse_args()
+
+
+def main(command, target=None, store=STORE_DIR, jobs=None):
+    index = DatasetIndex.build(IMAGES_DIR)
+    if command == "status":
+        for name, value in store_status(index, store).items():
+            print(f"{name.capitalize()}: {format_size(value) if name.endswith('bytes') else value}")
+        return
+
+    with FileCache() as cache:
+        if command == "gc":
+            removed, size = collect_garbage(index, store, cache, jobs)
+            print(f"Removed {removed} unreferenced blobs ({format_size(size)}).")
+        elif command == "adopt":
+            counts = adopt(index.files, store, cache, jobs)
+            counts["bytes saved"] = format_size(counts["bytes saved"])
+            print(f"Store: {store}")
+            for name, value in counts.items():
+                print(f"{name.capitalize()}: {value}")
+        elif target is None:
+            print("checkout needs a target directory")
+        else:
+            methods = checkout(index, target, store, cache)
+            print(f"Checked out {len(index.files)} files to {target} "
+                  f"({methods['link']} hard links, {methods['reflink']} reflinks, {methods['copy']} copies).")
+
+
+if __name__ == "__main__":
+    options = load_options()
+    main(options.command, options.target, options.store, options.jobs)
@@ -0,0 +1,331 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import queue
+import random
+import threading
+from array import array
+from pathlib import Path
+from typing import NamedTuple
+
+from .cache import CACHE_DIR
+from .columnar import code_typecode, integer_npy, load_columns, npy_bytes, parse_npy_header, string_npy, write_npz
+from .dataset import IMAGES_DIR
+from .utils import ATTR_FIELDS
+from .workers import run_parallel
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:
+    pass
+
+ANNOTATIONS_COLUMNS = Path("annotations/annotations.npz")
+# Columns copied from the annotations next to the attribute codes; build_cache needs all of them.
+ROW_COLUMNS = ["index", "filenames", "filename_offsets", "size", "mtime_ns"]
+TENSORS_DIR = CACHE_DIR / "tensors"
+CHANNELS = 3
+CHUNK_ROWS = 512
+PREFETCH_BATCHES = 2
+
+PENDING, DONE, FAILED = 0, 1, 2
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def tensor_dir(width: int, height: int) -> Path:
+    return TENSORS_DIR / f"{width}x{height}"
+
+
+def decode(task):
+    """Decode one image to height x width x RGB bytes (center crop), or None."""
+    path, width, height = task
+    try:
+        with Image.open(path) as image:
+            image.draft("RGB", (width, height))
+            image = ImageOps.exif_transpose(image).convert("RGB")
+        return ImageOps.fit(image, (width, height), Image.BILINEAR).tobytes()
+    except Exception:
+        return None
+
+
+def dataset_state(columns, width: int, height: int):
+    """Identity of a tensor cache: resolution plus names, sizes and mtimes of all rows."""
+    digest = hashlib.sha256()
+    digest.update(bytes(columns["filenames"]))
+    digest.update(bytes(columns["filename_offsets"]))
+    digest.update(bytes(columns["size"]))
+    digest.update(bytes(columns["mtime_ns"]))
+    return {"width": width, "height": height, "count": len(columns), "rows": digest.hexdigest()}
+
+
+def write_labels(columns, path: Path):
+    members = {}
+    for field in ATTR_FIELDS:
+        vocabulary = columns.vocabulary[field]
+        members[field] = integer_npy(columns[field], code_typecode(vocabulary))
+        members[f"vocab_{field}"] = string_npy(vocabulary)
+    for name in ROW_COLUMNS:
+        members[name] = integer_npy(columns[name], memoryview(columns[name]).format)
+    write_npz(members.items(), path)
+
+
+def row_keys(columns):
+    """(filename, size, mtime_ns) of every row: a decoded row stays valid while its key does."""
+    size, mtime_ns = columns["size"], columns["mtime_ns"]
+    return [(columns.filename(row), size[row], mtime_ns[row]) for row in range(len(columns))]
+
+
+def open_previous(directory: Path, width: int, height: int):
+    """TensorCache of an earlier build at the same resolution whose rows can be carried over, or None."""
+    try:
+        state = json.loads((directory / "state.json").read_text())
+        if (state["width"], state["height"]) != (width, height):
+            return None
+        previous = TensorCache(directory)
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+    if "mtime_ns" not in previous.labels.columns:
+        previous.close()
+        return None
+    return previous
+
+
+def write_progress(path: Path, progress):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(progress)
+    os.replace(tmp, path)
+
+
+def build_cache(width: int, height: int, directory: Path = None, columns_file: Path = ANNOTATIONS_COLUMNS,
+                images_dir: Path = IMAGES_DIR, jobs=None):
+    """Decode every annotated image once into directory/images.npy.
+
+       images.npy is a (count, height, width, 3) uint8 array, written in place
+       through mmap; labels.npz holds the attribute codes of the same rows.
+       progress.bin keeps one status byte per row and is saved after every
+       chunk, so an interrupted run continues where it stopped; rows that
+       failed to decode stay zero and are skipped by readers.
+
+       When annotated files change, the arrays are rewritten for the new rows,
+       but every row whose file is unchanged (same name, size and mtime) is
+       copied over from the previous cache instead of being decoded again.
+       Only a new resolution starts from scratch.
+    """
+    columns = load_columns(columns_file, ATTR_FIELDS + ROW_COLUMNS)
+    names = [columns.filename(row) for row in range(len(columns))]
+    directory = Path(directory or tensor_dir(width, height))
+    directory.mkdir(parents=True, exist_ok=True)
+
+    images_file = directory / "images.npy"
+    state_file = directory / "state.json"
+    progress_file = directory / "progress.bin"
+
+    state = dataset_state(columns, width, height)
+    row_size = width * height * CHANNELS
+    header = npy_bytes("|u1", (len(names), height, width, CHANNELS), b"")
+    total_size = len(header) + len(names) * row_size
+
+    resumable = (
+        state_file.exists()
+        and json.loads(state_file.read_text()) == state
+        and images_file.exists() and images_file.stat().st_size == total_size
+        and progress_file.exists() and progress_file.stat().st_size == len(names)
+    )
+    if resumable:
+        progress = bytearray(progress_file.read_bytes())
+    else:
+        progress = bytearray(len(names))
+        tmp = images_file.with_name(images_file.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.truncate(total_size)
+
+        previous = open_previous(directory, width, height)
+        if previous is not None:
+            with previous, open(tmp, "r+b") as f, mmap.mmap(f.fileno(), 0) as buffer:
+                old_keys = row_keys(previous.labels)
+                old_rows = {old_keys[row]: row for row in previous.rows}
+                for row, key in enumerate(row_keys(columns)):
+                    old_row = old_rows.get(key)
+                    if old_row is not None:
+                        offset = len(header) + row * row_size
+                        buffer[offset:offset + row_size] = previous.images[old_row * row_size:(old_row + 1) * row_size]
+                        progress[row] = DONE
+                buffer.flush()
+
+        # The old state no longer describes images.npy; a crash from here on starts over.
+        state_file.unlink(missing_ok=True)
+        os.replace(tmp, images_file)
+        write_progress(progress_file, progress)
+        write_labels(columns, directory / "labels.npz")
+        state_file.write_text(json.dumps(state))
+
+    pending = [row for row, status in enumerate(progress) if status == PENDING]
+    counts = {"reused": len(names) - len(pending), "decoded": 0, "failed": 0}
+
+    with open(images_file, "r+b") as f, mmap.mmap(f.fileno(), 0) as buffer:
+        for start in range(0, len(pending), CHUNK_ROWS):
+            chunk = pending[start:start + CHUNK_ROWS]
+            tasks = [(str(images_dir / names[row]), width, height) for row in chunk]
+
+            for row, pixels in zip(chunk, run_parallel(decode, tasks, jobs, processes=True)):
+                if pixels is None:
+                    progress[row] = FAILED
+                    counts["failed"] += 1
+                    continue
+                offset = len(header) + row * row_size
+                buffer[offset:offset + row_size] = pixels
+                progress[row] = DONE
+                counts["decoded"] += 1
+
+            buffer.flush()
+            write_progress(progress_file, progress)
+
+    return directory, counts
+
+
+class Batch(NamedTuple):
+    rows: list
+    images: memoryview
+    labels: dict
+
+
+class TensorCache:
+    """Read side of a tensor cache.
+
+       images is a memoryview over the mapped images.npy; numpy.asarray() on
+       a batch gives a (batch, height, width, 3) uint8 array without copying.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        with open(self.directory / "images.npy", "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header, data_start = parse_npy_header(self.buffer, 0)
+        self.count, self.height, self.width, _ = header["shape"]
+        self.row_size = self.width * self.height * CHANNELS
+        self.images = memoryview(self.buffer)[data_start:]
+        self.labels = load_columns(self.directory / "labels.npz")
+        progress = (self.directory / "progress.bin").read_bytes()
+        self.rows = [row for row, status in enumerate(progress) if status == DONE]
+
+    def close(self):
+        self.images.release()
+        self.buffer.close()
+        self.labels.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def batch(self, rows) -> Batch:
+        """Images and label codes of rows; a run of consecutive rows is not copied.
+
+           Labels are arrays of each column's own typecode: uint8, or uint16
+           for a field with more than 256 values.
+        """
+        size = self.row_size
+        if rows and rows == list(range(rows[0], rows[0] + len(rows))):
+            images = self.images[rows[0] * size:(rows[-1] + 1) * size]
+        else:
+            gathered = bytearray(len(rows) * size)
+            for number, row in enumerate(rows):
+                gathered[number * size:(number + 1) * size] = self.images[row * size:(row + 1) * size]
+            images = memoryview(gathered)
+
+        images = images.cast("B", (len(rows), self.height, self.width, CHANNELS))
+        labels = {}
+        for field in ATTR_FIELDS:
+            column = self.labels[field]
+            labels[field] = array(memoryview(column).format, (column[row] for row in rows))
+        return Batch(rows, images, labels)
+
+    def batches(self, batch_size: int, shuffle=True, seed=0, epoch=0, drop_last=False, prefetch=PREFETCH_BATCHES):
+        """Yield Batches of decoded rows, assembled by a background thread.
+
+           Shuffling is deterministic for a (seed, epoch) pair. Up to prefetch
+           batches are prepared ahead while the consumer works on the current one.
+        """
+        rows = list(self.rows)
+        if shuffle:
+            random.Random(f"{seed}:{epoch}").shuffle(rows)
+        chunks = [rows[start:start + batch_size] for start in range(0, len(rows), batch_size)]
+        if drop_last and chunks and len(chunks[-1]) < batch_size:
+            chunks.pop()
+
+        ready = queue.Queue(maxsize=max(1, prefetch))
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    ready.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for chunk in chunks:
+                    if not put(self.batch(chunk)):
+                        return
+            except Exception as e:
+                put(e)
+                return
+            put(None)
+
+        worker = threading.Thread(target=produce, daemon=True)
+        worker.start()
+        try:
+            while True:
+                item = ready.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            worker.join()
+
+
+def load_options():
+    parser = argparse.ArgumentParser(description="Decode annotated images into a memory-mapped tensor cache.")
+    parser.add_argument("--width", type=int, default=224, help="Width of decoded images")
+    parser.add_argument("--height", type=int, default=224, help="Height of decoded images")
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=None,
+        help="Number of parallel workers (default: number of CPUs)"
+    )
+    return parser.parse_args()
+
+
+def main(width=224, height=224, jobs=None):
+    if not available():
+        print("Skipped tensor cache (Pillow is not installed)")
+        return
+
+    directory, counts = build_cache(width, height, jobs=jobs)
+    print(f"Tensor cache written to: {directory}")
+    print(f"Reused images: {counts['reused']}, decoded: {counts['decoded']}, failed: {counts['failed']}")
+
+
+if __name__ == "__main__":
+    options = load_options()
+    main(options.width, options.height, options.jobs)
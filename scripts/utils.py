@@ -1,34 +1,171 @@
+import sys
+import threading
+from collections.abc import Mapping
 from pathlib import Path
 
+from .instrument import instrumented
+from .schema import SCHEMA_FILE, Schema
+
 ATTR_FIELDS = ["type", "color", "fill", "liquid", "label", "cap"]
+INFO_FIELDS = ATTR_FIELDS + ["index", "ext"]
+
+SCHEMA = Schema.load(SCHEMA_FILE, ATTR_FIELDS)
+ALLOWED_VALUES = SCHEMA.allowed
+
+# Field -> list of interned values; a value's position is its code. Allowed
+# values come first, other values seen in filenames are appended until the
+# field holds VOCABULARY_LIMIT values. Later ones are kept as plain strings
+# by their records, so junk names cannot grow the vocabulary of a
+# long-running process (watch mode) without bound.
+VOCABULARY_LIMIT = 1024
+VOCABULARY = {field: [sys.intern(value) for value in ALLOWED_VALUES.get(field, [])] for field in ATTR_FIELDS + ["ext"]}
+CODES = {field: {value: code for code, value in enumerate(values)} for field, values in VOCABULARY.items()}
+CODE_FIELDS = ATTR_FIELDS + ["ext"]
+CODE_POSITIONS = {field: position for position, field in enumerate(CODE_FIELDS)}
+ALLOWED_COUNTS = [len(ALLOWED_VALUES.get(field, [])) for field in ATTR_FIELDS]
+_vocabulary_lock = threading.Lock()
+
+# Codes of the six attributes -> shared group key tuple, for groups of allowed
+# values only (bounded by the schema).
+_group_keys = {}
+
+
+def value_code(field, value):
+    """Code of value in VOCABULARY[field], or value itself once the field is full."""
+    code = CODES[field].get(value)
+    if code is None:
+        with _vocabulary_lock:
+            code = CODES[field].get(value)
+            if code is None:
+                if len(VOCABULARY[field]) >= VOCABULARY_LIMIT:
+                    return value
+                code = len(VOCABULARY[field])
+                VOCABULARY[field].append(sys.intern(value))
+                CODES[field][VOCABULARY[field][code]] = code
+    return code
+
+
+def code_value(field, code) -> str:
+    return code if code.__class__ is str else VOCABULARY[field][code]
+
+
+def pack_codes(codes):
+    try:
+        return bytes(codes)
+    except (TypeError, ValueError):  # a code above 255 or a value kept as a string
+        return tuple(codes)
+
+
+class ImageInfo(Mapping):
+    """Attributes parsed from a filename, stored compactly.
+
+       Attribute values and the extension are codes into VOCABULARY, so every
+       distinct value exists once per process (values past VOCABULARY_LIMIT
+       are stored as strings instead); the index is an int. The raw
+       index text is kept only when it does not read back as a zero-padded
+       number (e.g. "7", "0012" or "x1"). info[field] returns the same strings
+       the former dict did.
+    """
+
+    __slots__ = ("codes", "index", "raw_index")
+
+    def __init__(self, codes, index, raw_index=None):
+        self.codes = codes
+        self.index = index
+        self.raw_index = raw_index
+
+    @classmethod
+    def from_values(cls, values, index: str, ext: str):
+        codes = pack_codes([value_code(field, value) for field, value in zip(ATTR_FIELDS, values)] + [value_code("ext", ext)])
+        return cls(codes, *split_index(index))
+
+    @property
+    def key(self):
+        """Group key: tuple of attribute values, shared by all files of a group."""
+        codes = self.codes[:len(ATTR_FIELDS)]
+        key = _group_keys.get(codes)
+        if key is None:
+            key = tuple(code_value(field, code) for field, code in zip(ATTR_FIELDS, codes))
+            if all(code.__class__ is int and code < count for code, count in zip(codes, ALLOWED_COUNTS)):
+                key = _group_keys.setdefault(codes, key)
+        return key
+
+    def __getitem__(self, field):
+        position = CODE_POSITIONS.get(field)
+        if position is not None:
+            return code_value(field, self.codes[position])
+        if field == "index":
+            return self.raw_index if self.raw_index is not None else f"{self.index:03d}"
+        raise KeyError(field)
+
+    def __iter__(self):
+        return iter(INFO_FIELDS)
+
+    def __len__(self):
+        return len(INFO_FIELDS)
+
+    def __repr__(self):
+        return f"ImageInfo({dict(self)!r})"
+
+    def __reduce__(self):
+        # Codes are only meaningful within one process; pickle the values.
+        return ImageInfo.from_values, ([self[field] for field in ATTR_FIELDS], self["index"], self["ext"])
+
+
+def split_index(text: str):
+    """Return (int index or None, raw text or None when it is canonical)."""
+    try:
+        index = int(text)
+    except ValueError:
+        return None, text
+    return index, None if f"{index:03d}" == text else text
+
+
+def split_name(name: str):
+    """Split a filename into stem and lowercase extension like Path.stem/suffix."""
+    dot = name.rfind(".")
+    if 0 < dot < len(name) - 1:
+        return name[:dot], name[dot + 1:].lower()
+    return name, ""
+
+
+@instrumented("parse_names", io=False, kind="batch")
+def parse_names(names):
+    """Parse a whole directory listing into ImageInfo records (None for mismatches).
+
+       Names sharing the attribute part (everything before the index) are
+       looked up once, so a listing costs one split per group plus an int()
+       per file.
+    """
+    groups = {}
+    infos = []
+    for name in names:
+        stem, ext = split_name(name)
+        prefix, _, index = stem.rpartition("_")
+        codes = groups.get(prefix)
+        if codes is None:
+            values = prefix.split("_")
+            codes = groups[prefix] = [value_code(field, value) for field, value in zip(ATTR_FIELDS, values)] if len(values) == 6 else ()
+        if not codes:
+            infos.append(None)
+            continue
+        infos.append(ImageInfo(pack_codes(codes + [value_code("ext", ext)]), *split_index(index)))
+    return infos
 
 
 def parse_filename(path: Path):
     """Parse filename formatted as:
        type_color_fill_liquid_label_cap_index.jpg
 
-       Returns dict or None if structure mismatches.
+       Returns ImageInfo or None if structure mismatches.
     """
-    stem = path.stem
-    ext = path.suffix.lower().lstrip(".")
-
+    stem, ext = split_name(path.name)
     parts = stem.split("_")
 
     if len(parts) != 7:
         return None
 
-    data = {
-        "type": parts[0],
-        "color": parts[1],
-        "fill": parts[2],
-        "liquid": parts[3],
-        "label": parts[4],
-        "cap": parts[5],
-        "index": parts[6],
-        "ext": ext,
-    }
-
-    return data
+    return ImageInfo.from_values(parts[:6], parts[6], ext)
 
 
 def build_filename(entry: dict, index: int, extension: str = "jpg") -> str:
@@ -1,36 +1,25 @@
+import argparse
 import hashlib
+import mmap
 from pathlib import Path
 
-from .utils import parse_filename, ATTR_FIELDS
+from . import similarity
+from .cache import FileCache
+from .dataset import DatasetIndex
+from .headers import HEADER_KIND, image_headers
+from .instrument import instrumented
+from .utils import ATTR_FIELDS, SCHEMA
+from .workers import run_parallel
 
 IMAGES_DIR = Path("images")
 
-ALLOWED_VALUES = {
-    "type": ["euro", "vichy", "vichylight", "bugel", "amber", "tulip", "steine", "kraft"],
-    "color": ["transparent", "brown", "green"],
-    "fill": ["filled", "unfilled", "overfilled", "empty"],
-    "liquid": ["transparent", "light", "dark", "black", "empty"],
-    "label": ["labeled", "unlabeled"],
-    "cap": ["crowned", "open"],
-}
+HASH_BLOCK_SIZE = 1024 * 1024
+HASH_MMAP_THRESHOLD = 16 * 1024 * 1024
+PARTIAL_HASH_SIZE = 4096
 
 
 def validate_attributes(attributes):
-    errors = []
-
-    for field in ATTR_FIELDS:
-        value = attributes[field]
-        if field in ALLOWED_VALUES and value not in ALLOWED_VALUES[field]:
-            allowed = ALLOWED_VALUES[field]
-            errors.append(f"{field}: '{value}' not in allowed set {allowed}")
-
-    if attributes.get("fill") == "empty" and attributes.get("liquid") != "empty":
-        errors.append(
-            f"Invalid liquid='{attributes.get('liquid')}' for fill='empty'. "
-            "Liquid must be 'empty' when fill='empty'."
-        )
-
-    return errors
+    return SCHEMA.check(tuple(attributes[field] for field in ATTR_FIELDS))
 
 
 def validate_group_indices(indices):
@@ -62,69 +51,159 @@ def validate_group_indices(indices):
     return errors
 
 
-def file_sha256(path: Path, block_size=65536):
-    """Compute SHA256 hash of a file for content-duplicate detection."""
+def check_group(records):
+    """Return (index errors, {index: [filenames]} of duplicate indices) for one group."""
+    index_errors = validate_group_indices([file.info["index"] for file in records])
+
+    index_map = {}
+    for file in records:
+        index_map.setdefault(file.info["index"], []).append(file.name)
+
+    duplicates = {idx: names for idx, names in index_map.items() if len(names) > 1}
+    return index_errors, duplicates
+
+
+def file_sha256(path: Path, block_size=HASH_BLOCK_SIZE):
+    """Compute SHA256 hash of a file for content-duplicate detection.
+
+       Large files are hashed straight from a memory map, smaller ones are read
+       into a single reused buffer.
+    """
     h = hashlib.sha256()
     with open(path, "rb") as f:
-        while chunk := f.read(block_size):
-            h.update(chunk)
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(0)
+
+        if size >= HASH_MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                h.update(mapped)
+            return h.hexdigest()
+
+        buffer = bytearray(min(block_size, max(size, 1)))
+        view = memoryview(buffer)
+        while read := f.readinto(buffer):
+            h.update(view[:read])
     return h.hexdigest()
 
 
-def main(return_success=False):
-    parsing_errors = []
-    attribute_errors = []
+def content_hashes(files, cache=None, rehash=False, jobs=None):
+    """Return {filename: sha256} reusing cached digests of unchanged files.
+
+       Files missing from the cache are hashed on a pool of `jobs` threads;
+       the result keeps the order of `files`.
+    """
+    digests = {}
+    missing = []
+    for file in files:
+        digest = None if rehash or cache is None else cache.get("sha256", file)
+        digests[file.name] = digest
+        if digest is None:
+            missing.append(file)
+
+    if missing:
+        hash_missing(missing, digests, cache, jobs)
+
+    return digests
+
+
+@instrumented("file_sha256", kind="batch")
+def hash_missing(missing, digests, cache=None, jobs=None):
+    """Hash files on the worker pool into digests; one profiling span per batch, not per file."""
+    for file, digest in zip(missing, run_parallel(file_sha256, [file.path for file in missing], jobs)):
+        digests[file.name] = digest
+        if cache is not None:
+            cache.put("sha256", file, digest)
+
+
+def file_partial_sha256(path: Path, size: int, block_size=PARTIAL_HASH_SIZE):
+    """Compute SHA256 hash of the first and last block_size bytes of a file."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        h.update(f.read(block_size))
+        if size > 2 * block_size:
+            f.seek(-block_size, 2)
+        h.update(f.read(block_size))
+    return h.hexdigest()
+
+
+def find_content_duplicates(files, cache=None, rehash=False, jobs=None):
+    """Return {sha256: [filenames]} for files with identical content.
 
-    groups = {}
+       Files are bucketed by size first. Only files sharing a size get a
+       partial hash of their head and tail, and only files still colliding
+       after that get a full SHA256 hash.
+    """
+    by_size = {}
+    for file in files:
+        by_size.setdefault(file.size, []).append(file)
 
-    for file in sorted(IMAGES_DIR.iterdir()):
-        if file.is_dir() or file.name.startswith("."):
-            continue
+    candidates = [file for file in files if len(by_size[file.size]) > 1]
+    partial_digests = run_parallel(
+        lambda file: file_partial_sha256(file.path, file.size), candidates, jobs
+    )
 
-        info = parse_filename(file)
-        if info is None:
-            parsing_errors.append(file.name)
-            continue
+    by_partial = {}
+    for file, digest in zip(candidates, partial_digests):
+        by_partial.setdefault((file.size, digest), []).append(file)
 
-        errors = validate_attributes(info)
+    suspects = [file for group in by_partial.values() if len(group) > 1 for file in group]
+    suspects.sort()
+    digests = content_hashes(suspects, cache, rehash, jobs)
+
+    hash_map = {}
+    for name, digest in digests.items():
+        hash_map.setdefault(digest, []).append(name)
+
+    return {digest: names for digest, names in hash_map.items() if len(names) > 1}
+
+
+def load_options():
+    parser = argparse.ArgumentParser(description="Validate dataset images.")
+    parser.add_argument(
+        "--rehash", action="store_true",
+        help="Ignore the hash cache and re-read every file"
+    )
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=None,
+        help="Number of parallel workers (default: number of CPUs)"
+    )
+    return parser.parse_args()
+
+
+def main(return_success=False, index=None, rehash=False, jobs=None):
+    if index is None:
+        index = DatasetIndex.build(IMAGES_DIR)
+
+    parsing_errors = index.invalid
+    attribute_errors = []
+
+    for file in index.records:
+        errors = SCHEMA.check(file.key)
         if errors:
             attribute_errors.append((file.name, errors))
 
-        group_key = tuple(info[field] for field in ATTR_FIELDS)
-        groups.setdefault(group_key, []).append((file.name, info["index"]))
-
     group_index_errors = {}
     duplicate_indices = {}
 
-    for key, files in groups.items():
-        indices = [index for _, index in files]
-        index_errors = validate_group_indices(indices)
+    for key, records in index.groups.items():
+        index_errors, duplicates = check_group(records)
 
         if index_errors:
             group_index_errors[key] = index_errors
-
-        index_map = {}
-        for filename, index in files:
-            index_map.setdefault(index, []).append(filename)
-
-        duplicates = {idx: names for idx, names in index_map.items() if len(names) > 1}
         if duplicates:
             duplicate_indices[key] = duplicates
 
-    hash_map = {}
-    duplicates_by_hash = {}
-
-    for file in sorted(IMAGES_DIR.iterdir()):
-        if file.is_dir() or file.name.startswith("."):
-            continue
-
-        digest = file_sha256(file)
-        hash_map.setdefault(digest, []).append(file.name)
+    with FileCache() as cache:
+        duplicates_by_hash = find_content_duplicates(index.files, cache, rehash, jobs)
+        cache.prune("sha256", index.files)
+        headers = image_headers(index.files, cache, jobs)
+        cache.prune(HEADER_KIND, index.files)
 
-    for digest, files in hash_map.items():
-        if len(files) > 1:
-            duplicates_by_hash[digest] = files
+    image_errors = [(name, header["error"]) for name, header in sorted(headers.items()) if header["error"]]
 
+    # The build only needs pass/fail. Near-duplicates never fail validation
+    # and need a decode of every new image, so they are left to the report.
     if return_success:
         return (
                 not parsing_errors
@@ -132,8 +211,15 @@ def main(return_success=False):
                 and not group_index_errors
                 and not duplicate_indices
                 and not duplicates_by_hash
+                and not image_errors
         )
 
+    similar_images = None
+    if similarity.available():
+        with FileCache() as cache:
+            similar_images = similarity.find_similar(index.records, cache, jobs)
+            cache.prune(similarity.FINGERPRINT_KIND, index.records)
+
     print("\nDataset validation report\n")
 
     print("Files with invalid naming:")
@@ -188,6 +274,25 @@ def main(return_success=False):
         print("  None")
     print()
 
+    print("Unreadable or mismatched images:")
+    if image_errors:
+        for name, error in image_errors:
+            print(f"  {name}: {error}")
+    else:
+        print("  None")
+    print()
+
+    print("Near-duplicate images (perceptual hash):")
+    if similar_images is None:
+        print("  Skipped (Pillow is not installed)")
+    elif similar_images:
+        for first, second, distance in similar_images:
+            print(f"  {first} ~ {second} (distance {distance})")
+    else:
+        print("  None")
+    print()
+
 
 if __name__ == "__main__":
-    main()
+    options = load_options()
+    main(rehash=options.rehash, jobs=options.jobs)
@@ -0,0 +1,306 @@
+import argparse
+import contextlib
+import ctypes
+import os
+import select
+import struct
+import time
+from io import StringIO
+from pathlib import Path
+
+from . import annotate, stats
+from .cache import FileCache
+from .dataset import DatasetIndex, IMAGES_DIR
+from .headers import image_headers
+from .utils import ATTR_FIELDS, SCHEMA
+from .validate import check_group, find_content_duplicates
+
+POLL_INTERVAL = 0.5
+SETTLE_TIME = 0.1     # quiet period that ends a batch of changes
+MAX_BATCH_WAIT = 0.5  # upper bound on collecting one batch
+
+# inotify(7) event masks.
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+# IN_CREATE is left out on purpose: a file being copied in is picked up
+# once it is closed, not while it is half written.
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+RESCAN_MASK = IN_Q_OVERFLOW | IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+
+class InotifyWatcher:
+    """Directory watcher on Linux inotify, called through ctypes."""
+
+    def __init__(self, directory: Path):
+        libc = ctypes.CDLL(None, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"Cannot watch {directory}")
+
+    def changes(self, timeout):
+        """Names changed within timeout seconds, or None when everything must be rescanned."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+
+        names = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return names
+            position = 0
+            while position < len(data):
+                _, mask, _, length = EVENT.unpack_from(data, position)
+                name = data[position + EVENT.size:position + EVENT.size + length].rstrip(b"\0")
+                position += EVENT.size + length
+                if mask & RESCAN_MASK:
+                    return None
+                if mask & IN_ISDIR or name.startswith(b"."):
+                    continue
+                names.add(os.fsdecode(name))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback watcher comparing stat snapshots of the directory."""
+
+    def __init__(self, directory: Path, interval=POLL_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                with contextlib.suppress(FileNotFoundError):
+                    stat = entry.stat()
+                    snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        return snapshot
+
+    def changes(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            current = self.scan()
+            names = {name for name in current.keys() | self.snapshot.keys() if current.get(name) != self.snapshot.get(name)}
+            self.snapshot = current
+            remaining = deadline - time.monotonic()
+            if names or remaining <= 0:
+                return names
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+def open_watcher(directory: Path, polling=False):
+    if not polling:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directory)
+
+
+class LiveValidation:
+    """Validation results of a DatasetIndex that are updated per changed file.
+
+       Per-file results (attribute values, image headers) are kept by name,
+       index checks by group key and content duplicates by file size, so a
+       change re-checks only the files, groups and size buckets it touches.
+    """
+
+    def __init__(self, index, cache, jobs=None):
+        self.index = index
+        self.cache = cache
+        self.jobs = jobs
+        self.attribute_errors = {}
+        self.image_errors = {}
+        self.group_errors = {}          # key -> (index errors, duplicate indices)
+        self.by_size = {}               # size -> {name: ImageFile}
+        self.content_duplicates = {}    # size -> {sha256: [names]}
+
+        for file in index.files:
+            self.by_size.setdefault(file.size, {})[file.name] = file
+        self.check_files(index.files)
+        self.check_groups(list(index.groups))
+        self.check_sizes(list(self.by_size))
+
+    def check_files(self, files):
+        headers = image_headers(files, self.cache, self.jobs)
+        for file in files:
+            errors = SCHEMA.check(file.key) if file.key is not None else []
+            if errors:
+                self.attribute_errors[file.name] = errors
+            if headers[file.name]["error"]:
+                self.image_errors[file.name] = headers[file.name]["error"]
+
+    def check_groups(self, keys):
+        for key in keys:
+            index_errors, duplicates = check_group(self.index.groups.get(key, []))
+            if index_errors or duplicates:
+                self.group_errors[key] = (index_errors, duplicates)
+            else:
+                self.group_errors.pop(key, None)
+
+    def check_sizes(self, sizes):
+        files = sorted(file for size in sizes for file in self.by_size.get(size, {}).values())
+        for size in sizes:
+            self.content_duplicates.pop(size, None)
+        for digest, names in find_content_duplicates(files, self.cache, jobs=self.jobs).items():
+            size = self.index.get(names[0]).size
+            self.content_duplicates.setdefault(size, {})[digest] = names
+
+    def apply(self, names):
+        """Rescan the given file names and re-check what they affect.
+
+           Returns counts of added, modified and removed files.
+        """
+        counts = {"added": 0, "modified": 0, "removed": 0}
+        checked, keys, sizes = [], set(), set()
+
+        for name in sorted(names):
+            old = self.index.remove(name)
+            new = None
+            with contextlib.suppress(FileNotFoundError, NotADirectoryError):
+                path = self.index.images_dir / name
+                if path.is_file():
+                    new = self.index.add(path)
+            if old is None and new is None:
+                continue
+
+            self.attribute_errors.pop(name, None)
+            self.image_errors.pop(name, None)
+            if old is not None:
+                del self.by_size[old.size][name]
+                if not self.by_size[old.size]:
+                    del self.by_size[old.size]
+            if new is not None:
+                self.by_size.setdefault(new.size, {})[name] = new
+                checked.append(new)
+
+            for file in (old, new):
+                if file is not None:
+                    sizes.add(file.size)
+                    if file.key is not None:
+                        keys.add(file.key)
+            counts["removed" if new is None else "added" if old is None else "modified"] += 1
+
+        self.check_files(checked)
+        self.check_groups(keys)
+        self.check_sizes(sizes)
+        return counts
+
+    def rescan(self):
+        """Re-check every file, e.g. after the watcher lost events."""
+        with os.scandir(self.index.images_dir) as entries:
+            names = {entry.name for entry in entries if not entry.name.startswith(".")}
+        return self.apply(names | {file.name for file in self.index.files})
+
+    def problems(self):
+        lines = [f"Invalid naming: {name}" for name in self.index.invalid]
+        for name, errors in sorted(self.attribute_errors.items()):
+            lines.extend(f"Invalid attributes: {name}: {error}" for error in errors)
+        for key, (index_errors, duplicates) in sorted(self.group_errors.items()):
+            label = "_".join(key)
+            lines.extend(f"Group {label}: {error}" for error in index_errors)
+            lines.extend(f"Group {label}: index {idx} used by {', '.join(names)}" for idx, names in duplicates.items())
+        for size in sorted(self.content_duplicates):
+            lines.extend(f"Identical content: {', '.join(names)}" for names in self.content_duplicates[size].values())
+        lines.extend(f"Unreadable image: {name}: {error}" for name, error in sorted(self.image_errors.items()))
+        return lines
+
+
+def refresh(live, annotations=True):
+    """Print statistics and problems of the current index; regenerate annotations."""
+    total, _, combination_counts, extension_counts, _ = stats.collect_statistics(
+        {field: None for field in ATTR_FIELDS}, live.index
+    )
+    extensions = ", ".join(f"{ext}: {count}" for ext, count in extension_counts.most_common())
+    print(f"  Images: {total} in {len(combination_counts)} groups ({extensions})")
+
+    problems = live.problems()
+    for line in problems:
+        print(f"  {line}")
+    if not problems:
+        print("  No problems found")
+
+    if annotations:
+        with contextlib.redirect_stdout(StringIO()):
+            counts = annotate.generate_annotations(live.index, incremental=True, cache=live.cache)
+        print(f"  Annotations: {counts['generated']} regenerated, {counts['reused']} reused")
+
+
+def watch(images_dir=IMAGES_DIR, polling=False, annotations=True, jobs=None):
+    watcher = open_watcher(images_dir, polling)
+    mode = "polling" if isinstance(watcher, PollingWatcher) else "inotify"
+
+    with FileCache() as cache:
+        start = time.perf_counter()
+        live = LiveValidation(DatasetIndex.build(images_dir), cache, jobs)
+        print(f"Watching {images_dir} ({mode}), checked in {time.perf_counter() - start:.2f} s. Press Ctrl+C to stop.")
+        refresh(live, annotations)
+        cache.flush()
+
+        try:
+            while True:
+                names = watcher.changes(timeout=3600)
+                if names is not None and not names:
+                    continue
+
+                # Collect the rest of a burst (a copied folder, an import) into one batch.
+                deadline = time.monotonic() + MAX_BATCH_WAIT
+                while names is not None and time.monotonic() < deadline:
+                    more = watcher.changes(SETTLE_TIME)
+                    if not more:
+                        break
+                    names = None if more is None else names | more
+
+                start = time.perf_counter()
+                counts = live.rescan() if names is None else live.apply(names)
+                elapsed = time.perf_counter() - start
+                print(f"\n[{time.strftime('%H:%M:%S')}] {counts['added']} added, {counts['modified']} modified, "
+                      f"{counts['removed']} removed, rechecked in {elapsed:.2f} s")
+                refresh(live, annotations)
+                cache.flush()
+        except KeyboardInterrupt:
+            print("\nStopped watching.")
+        finally:
+            watcher.close()
+
+
+def load_options():
+    parser = argparse.ArgumentParser(description="Watch images/ and revalidate changed files as they land.")
+    parser.add_argument("--poll", action="store_true", help="Poll the directory instead of using inotify")
+    parser.add_argument("--no-annotations", action="store_true", help="Do not regenerate annotations on changes")
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=None,
+        help="Number of parallel workers (default: number of CPUs)"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    options = load_options()
+    watch(polling=options.poll, annotations=not options.no_annotations, jobs=options.jobs)
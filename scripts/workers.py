@@ -0,0 +1,28 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+def default_jobs() -> int:
+    return os.cpu_count() or 1
+
+
+def run_parallel(func, items, jobs=None, processes=False):
+    """Apply func to every item on a pool of workers, preserving input order.
+
+       Threads suit I/O-bound work (reading and hashing files, hashlib releases
+       the GIL); processes suit CPU-bound pure Python work, in which case func
+       and items must be picklable. With a single job everything runs inline.
+    """
+    items = list(items)
+    jobs = jobs or default_jobs()
+
+    if jobs <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    if processes:
+        chunksize = max(1, len(items) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            return list(pool.map(func, items, chunksize=chunksize))
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(func, items))
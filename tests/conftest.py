@@ -2,6 +2,8 @@ import shutil
 import pytest
 from pathlib import Path
 
+from scripts import annotate
+
 
 @pytest.fixture
 def temp_images(tmp_path):
@@ -28,3 +30,30 @@ def temp_images(tmp_path):
         (images_dir / name).write_bytes(content)
 
     return images_dir
+
+
+@pytest.fixture(autouse=True)
+def temp_cache(tmp_path, monkeypatch):
+    """
+    Keeps the persistent file cache out of the working copy.
+    """
+    cache_file = tmp_path / "cache" / "files.sqlite"
+    monkeypatch.setattr("scripts.cache.CACHE_FILE", cache_file)
+    return cache_file
+
+
+@pytest.fixture
+def generate(temp_images, monkeypatch, tmp_path):
+    """
+    Returns a function that (re)writes annotations of temp_images into
+    out_dir (tmp_path/annotations by default) and returns that directory.
+    """
+    monkeypatch.setattr("scripts.annotate.IMAGES_DIR", temp_images)
+
+    def run(incremental=False, out_dir=tmp_path / "annotations"):
+        monkeypatch.setattr("scripts.annotate.OUTPUT_DIR", out_dir)
+        monkeypatch.setattr("scripts.annotate.OUTPUT_FILE", out_dir / "annotations.json")
+        annotate.generate_annotations(incremental=incremental)
+        return out_dir
+
+    return run
@@ -1,17 +1,83 @@
 import json
-from scripts import annotate
+from scripts import derive
+from scripts.dataset import DatasetIndex
+from scripts.validate import content_hashes
 
 
-def test_annotation_generation(temp_images, monkeypatch, tmp_path):
-    out_dir = tmp_path / "annotations"
-    monkeypatch.setattr("scripts.annotate.IMAGES_DIR", temp_images)
-    monkeypatch.setattr("scripts.annotate.OUTPUT_DIR", out_dir)
-    monkeypatch.setattr("scripts.annotate.OUTPUT_FILE", out_dir / "annotations.json")
-
-    annotate.generate_annotations()
+def test_annotation_generation(generate):
+    out_dir = generate()
 
     assert (out_dir / "annotations.json").exists()
 
     data = json.loads((out_dir / "annotations.json").read_text())
     assert "images" in data
     assert len(data["images"]) == 8  # invalid_name.jpg excluded
+
+
+def read_text(out_dir):
+    return (out_dir / "annotations.json").read_text()
+
+
+def test_streamed_json_matches_json_dump(generate):
+    text = read_text(generate())
+    assert text == json.dumps(json.loads(text), indent=2)
+
+
+def test_incremental_annotations(temp_images, tmp_path, capsys, generate):
+    generate()
+
+    generate(incremental=True)
+    assert "up to date" in capsys.readouterr().out
+
+    (temp_images / "euro_brown_filled_light_labeled_open_003.jpg").write_bytes(b"NEW")
+    capsys.readouterr()
+    text = read_text(generate(incremental=True))
+
+    assert "Reused entries: 6, regenerated entries: 3" in capsys.readouterr().out
+    assert text == read_text(generate(out_dir=tmp_path / "full"))
+
+    images = json.loads(text)["images"]
+    assert [image["collection"]["of"] for image in images] == [3, 3, 3, 6, 6, 6, 6, 6, 6]
+
+    (temp_images / "vichy_brown_filled_dark_labeled_open_006.HEIC").unlink()
+    (temp_images / "vichy_brown_filled_dark_labeled_open_001.jpg").write_bytes(b"CHANGED")
+    text = read_text(generate(incremental=True))
+    assert text == read_text(generate(out_dir=tmp_path / "full"))
+
+
+def test_annotations_include_dimensions(generate):
+    text = read_text(generate())
+    dimensions = json.loads(text)["images"][0]["dimensions"]
+    assert dimensions == {"width": None, "height": None, "orientation": None}
+
+
+def fake_renditions(temp_images):
+    """Create empty files at every rendition path and the index, as if derive had run."""
+    records = DatasetIndex.build(temp_images).records
+    digests = content_hashes(records)
+    for renditions in derive.rendition_paths(records, digests=digests).values():
+        for path in renditions.values():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.touch()
+    derive.write_index(sources={
+        file.name: {"size": file.size, "mtime_ns": file.mtime_ns, "sha256": digests[file.name]}
+        for file in records
+    })
+
+
+def test_incremental_annotations_follow_rendition_changes(temp_images, monkeypatch, tmp_path, capsys, generate):
+    monkeypatch.chdir(tmp_path)
+    text = read_text(generate())
+    assert json.loads(text)["images"][-1]["renditions"] == {}
+
+    fake_renditions(temp_images)
+    text = read_text(generate(incremental=True))
+    renditions = json.loads(text)["images"][-1]["renditions"]
+    assert set(renditions) == {"thumbnail", "jpeg"}
+    assert renditions["thumbnail"].startswith("derived/thumbnail/")
+    capsys.readouterr()
+
+    monkeypatch.setitem(derive.RENDITIONS, "jpeg", {"size": 2048, "format": "JPEG", "extensions": ["heic"]})
+    text = read_text(generate(incremental=True))
+    assert "Reused entries: 6, regenerated entries: 2" in capsys.readouterr().out
+    assert set(json.loads(text)["images"][-1]["renditions"]) == {"thumbnail"}
@@ -0,0 +1,28 @@
+from benchmarks.suite import BENCHMARKS, find_regressions, run_suite
+from benchmarks.synthetic import combinations, generate
+from scripts import validate
+from scripts.dataset import DatasetIndex
+
+
+def test_synthetic_dataset_is_valid(tmp_path):
+    for payload in ("tiny", "sparse"):
+        images = tmp_path / payload
+        generate(images, 120, payload, size=64 * 1024)
+        index = DatasetIndex.build(images)
+
+        assert len(index.records) == 120
+        assert len(index.groups) == min(120, len(combinations()))
+        assert validate.main(return_success=True, index=index)
+        if payload == "sparse":
+            assert {file.size for file in index.files} == {64 * 1024}
+
+
+def test_suite_reports_every_benchmark_and_regressions(tmp_path):
+    report = run_suite([40, 80], tmp_path, repeat=1)
+
+    assert set(report["results"]) == {benchmark.name for benchmark in BENCHMARKS}
+    assert set(report["results"]["annotate"]) == {"40", "80"}
+    assert find_regressions(report, report) == []
+
+    slower = {"results": {"stats": {"40": {"items_per_s": report["results"]["stats"]["40"]["items_per_s"] * 2}}}}
+    assert [name for name, *_ in find_regressions(report, slower)] == ["stats"]
@@ -0,0 +1,44 @@
+from scripts.bitmaps import BitmapIndex, decode_runs, encode_runs
+from scripts.dataset import DatasetIndex
+from scripts.stats import StatsEngine
+
+
+def test_runs_roundtrip():
+    bits = 0b1110011000
+    runs = encode_runs(bits, 12)
+    assert runs == [3, 2, 2, 3, 2]
+    assert decode_runs(runs) == bits
+    assert encode_runs(0, 4) == [4]
+
+
+def test_bitmap_queries(temp_images):
+    engine = StatsEngine.from_index(DatasetIndex.build(temp_images))
+    bitmaps = BitmapIndex.from_columns(engine.vocabulary, engine.columns)
+
+    assert bitmaps.count({}) == 8
+    assert bitmaps.count({"type": "euro"}) == 2
+    assert bitmaps.count({"type": "euro,vichy", "liquid": "!light"}) == 6
+    assert list(BitmapIndex.rows(bitmaps.query({"type": "euro"}))) == [0, 1]
+    assert bitmaps.counts("liquid", bitmaps.query({"type": "vichy"})) == {"light": 0, "dark": 6}
+
+
+def test_bitmaps_with_more_than_256_values(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    for number in range(300):
+        (images / f"type{number}_brown_filled_dark_labeled_open_001.jpg").write_bytes(b"X")
+    (images / "euro_brown_filled_dark_labeled_open_001.jpg").write_bytes(b"X")
+    engine = StatsEngine.from_index(DatasetIndex.build(images))
+    bitmaps = BitmapIndex.from_columns(engine.vocabulary, engine.columns)
+
+    assert bitmaps.count({"type": "euro"}) == 1
+    assert bitmaps.count({"type": "type299,type7"}) == 2
+    assert bitmaps.counts("type") == dict(engine.counts("type", None))
+
+
+def test_bitmaps_written_with_annotations(generate):
+    out_dir = generate()
+
+    bitmaps = BitmapIndex.load(out_dir / "bitmaps.json")
+    assert bitmaps.size == 8
+    assert bitmaps.count({"type": "vichy", "cap": "open"}) == 6
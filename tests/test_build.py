@@ -0,0 +1,123 @@
+import sys
+import threading
+
+import pytest
+
+from scripts import build
+from scripts.build import Stage, run_stages
+from scripts.dataset import DatasetIndex
+
+
+def make_stages(tmp_path, calls):
+    source = tmp_path / "source.txt"
+    output = tmp_path / "output.txt"
+    source.write_text("1")
+
+    def first(index):
+        calls.append("first")
+        print("first ran")
+
+    def second(index):
+        calls.append("second")
+        output.write_text(source.read_text())
+
+    def third(index):
+        calls.append("third")
+
+    return source, output, [
+        Stage("first", first, ["images"], [], []),
+        Stage("second", second, [source], [output], ["first"]),
+        Stage("third", third, [], [], ["first"]),
+    ]
+
+
+def test_unchanged_stages_are_skipped(temp_images, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr("scripts.build.STATE_FILE", tmp_path / "build.json")
+    index = DatasetIndex.build(temp_images)
+    calls = []
+    source, output, stages = make_stages(tmp_path, calls)
+
+    assert run_stages(stages, index)
+    assert calls == ["first", "second", "third"]
+    assert "first ran" in capsys.readouterr().out
+
+    calls.clear()
+    assert run_stages(stages, index, explain=True)
+    assert calls == []
+    assert capsys.readouterr().out.count("up to date") == 3
+
+    source.write_text("22")
+    output.unlink()
+    assert run_stages(stages, index, explain=True)
+    assert calls == ["second"]
+    out = capsys.readouterr().out
+    assert f"Running second: {source} changed, {output} is missing." in out
+
+    calls.clear()
+    (temp_images / "euro_brown_filled_light_labeled_open_003.jpg").write_bytes(b"NEW")
+    assert run_stages(stages, DatasetIndex.build(temp_images))
+    assert calls == ["first"]
+
+    calls.clear()
+    assert run_stages(stages, index, force=True)
+    assert sorted(calls) == ["first", "second", "third"]
+
+
+def test_failed_stage_stops_build_and_reruns(temp_images, tmp_path, monkeypatch):
+    monkeypatch.setattr("scripts.build.STATE_FILE", tmp_path / "build.json")
+    index = DatasetIndex.build(temp_images)
+    calls = []
+    _, _, stages = make_stages(tmp_path, calls)
+    stages[0] = stages[0]._replace(run=lambda index: sys.exit(1))
+
+    assert not run_stages(stages, index)
+    assert calls == []
+    assert "first" not in build.load_state()
+
+
+def test_unknown_or_circular_dependencies_raise(temp_images, tmp_path, monkeypatch):
+    monkeypatch.setattr("scripts.build.STATE_FILE", tmp_path / "build.json")
+    index = DatasetIndex.build(temp_images)
+    calls = []
+    _, _, stages = make_stages(tmp_path, calls)
+
+    with pytest.raises(ValueError, match="third"):
+        run_stages(stages[:2] + [stages[2]._replace(after=["missing"])], index)
+    with pytest.raises(ValueError, match="first"):
+        run_stages([stages[0]._replace(after=["second"]), stages[1]], index)
+
+
+def test_process_pool_stages_run_alone_on_the_main_thread(temp_images, tmp_path, monkeypatch):
+    monkeypatch.setattr("scripts.build.STATE_FILE", tmp_path / "build.json")
+    index = DatasetIndex.build(temp_images)
+    events = []
+
+    def record(name):
+        def run(index):
+            events.append((name, "start", threading.current_thread() is threading.main_thread()))
+            events.append((name, "end", None))
+        return run
+
+    stages = [
+        Stage("threaded", record("threaded"), [], [], []),
+        Stage("forking", record("forking"), [], [], [], processes=True),
+    ]
+    assert run_stages(stages, index)
+    assert events[:2] == [("forking", "start", True), ("forking", "end", None)]
+    assert events[2] == ("threaded", "start", False)
+
+
+def test_manifest_follows_derive_and_forking_stages_are_marked():
+    stages = {stage.name: stage for stage in build.build_stages()}
+    assert stages["manifest"].after == ["derive"]
+    assert stages["derive"].processes and stages["validate"].processes
+
+
+def test_stage_output_is_captured_per_thread(capsys):
+    output = build.StageOutput(sys.stdout)
+    with output.capture() as stream:
+        output.write("inside")
+    output.write("outside")
+
+    assert stream.getvalue() == "inside"
+    assert capsys.readouterr().out == "outside"
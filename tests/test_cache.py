@@ -0,0 +1,65 @@
+import os
+
+import scripts.validate as validate
+from scripts.cache import FileCache
+from scripts.dataset import DatasetIndex
+
+
+def test_cache_roundtrip(temp_images, temp_cache):
+    index = DatasetIndex.build(temp_images)
+    file = index.files[0]
+
+    with FileCache() as cache:
+        cache.put("sha256", file, "abc")
+
+    with FileCache() as cache:
+        assert cache.get("sha256", file) == "abc"
+        assert cache.get("other", file) is None
+
+
+def test_cache_invalidated_by_stat_change(temp_images):
+    index = DatasetIndex.build(temp_images)
+    file = index.files[0]
+
+    with FileCache() as cache:
+        cache.put("sha256", file, "abc")
+
+    file.path.write_bytes(b"CHANGED CONTENT")
+    os.utime(file.path, ns=(1, 1))
+    changed = DatasetIndex.build(temp_images).files[0]
+
+    with FileCache() as cache:
+        assert cache.get("sha256", changed) is None
+
+
+def test_cache_prune(temp_images):
+    index = DatasetIndex.build(temp_images)
+
+    with FileCache() as cache:
+        for file in index.files:
+            cache.put("sha256", file, "x")
+
+    with FileCache() as cache:
+        assert cache.prune("sha256", index.files[1:]) == 1
+
+    with FileCache() as cache:
+        assert cache.get("sha256", index.files[0]) is None
+        assert cache.get("sha256", index.files[1]) == "x"
+
+
+def test_content_hashes_only_hashes_misses(temp_images, monkeypatch):
+    index = DatasetIndex.build(temp_images)
+
+    with FileCache() as cache:
+        first = validate.content_hashes(index.files, cache)
+
+    hashed = []
+    monkeypatch.setattr("scripts.validate.file_sha256", lambda path: hashed.append(path) or "x")
+
+    with FileCache() as cache:
+        assert validate.content_hashes(index.files, cache) == first
+    assert hashed == []
+
+    with FileCache() as cache:
+        validate.content_hashes(index.files, cache, rehash=True)
+    assert len(hashed) == len(index.files)
@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+from scripts.columnar import load_columns
+
+
+def test_columns_match_json(generate):
+    out_dir = generate()
+    images = json.loads((out_dir / "annotations.json").read_text())["images"]
+    columns = load_columns(out_dir / "annotations.npz")
+
+    assert len(columns) == len(images) == 8
+    assert columns["type"].format == "B"
+    for row, entry in enumerate(images):
+        assert columns.filename(row) == entry["filename"]
+        assert columns.value("extension", row) == entry["extension"]
+        assert columns["index"][row] == entry["collection"]["index"]
+        assert columns["of"][row] == entry["collection"]["of"]
+        for field, value in entry["parameters"].items():
+            assert columns.value(field, row) == value
+
+
+def test_columns_load_with_numpy(generate):
+    np = pytest.importorskip("numpy")
+    out_dir = generate()
+
+    with np.load(out_dir / "annotations.npz") as data:
+        assert list(data["vocab_type"][data["type"]]).count("vichy") == 6
+        assert data["of"].sum() == 2 * 2 + 6 * 6
@@ -0,0 +1,74 @@
+from scripts.dataset import DatasetIndex
+
+
+def test_index_single_pass(temp_images):
+    index = DatasetIndex.build(temp_images)
+
+    assert len(index.files) == 9
+    assert len(index.records) == 8
+    assert index.invalid == ["invalid_name.jpg"]
+    assert [file.name for file in index.files] == sorted(file.name for file in index.files)
+
+
+def test_index_groups(temp_images):
+    index = DatasetIndex.build(temp_images)
+    key = ("vichy", "brown", "filled", "dark", "labeled", "open")
+
+    assert index.group_size(key) == 6
+    assert index.next_index(key) == 7
+    assert index.next_index(("euro", "green", "empty", "empty", "labeled", "open")) == 1
+
+
+def test_index_add(temp_images):
+    index = DatasetIndex.build(temp_images)
+    key = ("euro", "brown", "filled", "light", "labeled", "open")
+
+    new_file = temp_images / "euro_brown_filled_light_labeled_open_003.jpg"
+    new_file.write_bytes(b"NEW")
+    index.add(new_file)
+
+    assert index.group_size(key) == 3
+    assert index.next_index(key) == 4
+    assert index.files[0].name == "euro_brown_filled_light_labeled_open_001.jpg"
+
+
+def test_index_allocate(temp_images):
+    index = DatasetIndex.build(temp_images)
+    key = ("vichy", "brown", "filled", "dark", "labeled", "open")
+
+    assert index.allocate(key) == 7
+    assert index.allocate(key) == 8
+    assert index.next_index(key) == 9
+    assert index.allocate(("euro", "green", "empty", "empty", "labeled", "open")) == 1
+
+
+def test_index_remove(temp_images):
+    index = DatasetIndex.build(temp_images)
+    key = ("vichy", "brown", "filled", "dark", "labeled", "open")
+
+    removed = index.remove("vichy_brown_filled_dark_labeled_open_006.HEIC")
+
+    assert removed.key == key
+    assert index.get(removed.name) is None
+    assert index.remove(removed.name) is None
+    assert index.group_size(key) == 5
+    assert index.next_index(key) == 6
+    assert len(index.files) == 8
+
+
+def test_index_keeps_records_and_invalid_current(temp_images):
+    index = DatasetIndex.build(temp_images)
+    records = index.records
+    assert index.records is records and len(records) == 8
+    assert index.invalid == ["invalid_name.jpg"]
+
+    (temp_images / "another_bad.jpg").write_bytes(b"X")
+    (temp_images / "euro_brown_filled_light_labeled_open_003.jpg").write_bytes(b"X")
+    index.add(temp_images / "another_bad.jpg")
+    index.add(temp_images / "euro_brown_filled_light_labeled_open_003.jpg")
+    index.remove("invalid_name.jpg")
+    index.remove("vichy_brown_filled_dark_labeled_open_001.jpg")
+
+    assert index.invalid == ["another_bad.jpg"]
+    assert index.records == [file for file in index.files if file.info is not None]
+    assert len(index.records) == 8
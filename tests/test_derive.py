@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from scripts import derive as derive_module
+from scripts.dataset import DatasetIndex
+from scripts.derive import derive, rendered_paths, rendition_paths, write_index
+from scripts.validate import content_hashes
+
+
+def test_rendition_paths_depend_on_content_and_parameters(temp_images, tmp_path):
+    renditions = {
+        "small": {"size": 64, "format": "JPEG", "quality": 80},
+        "large": {"size": 512, "format": "JPEG", "quality": 80},
+        "jpeg": {"size": None, "format": "JPEG", "quality": 90, "extensions": ["heic"]},
+    }
+    index = DatasetIndex.build(temp_images)
+    paths = rendition_paths(index.records, renditions=renditions, derived_dir=tmp_path / "derived")
+
+    duplicates = [paths[f"euro_brown_filled_light_labeled_open_00{number}.jpg"] for number in (1, 2)]
+    assert duplicates[0] == duplicates[1]
+    assert set(duplicates[0]) == {"small", "large"}
+    assert duplicates[0]["small"] != duplicates[0]["large"]
+    assert set(paths["vichy_brown_filled_dark_labeled_open_005.HEIC"]) == {"small", "large", "jpeg"}
+
+
+def test_derive_renders_only_missing_renditions(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+
+    images = tmp_path / "images"
+    images.mkdir()
+    for number in (1, 2):
+        picture = Image.effect_mandelbrot((400, 300), (-2, -1.5, 1, 1.5), 20 * number).convert("RGB")
+        picture.save(images / f"euro_brown_filled_dark_labeled_crowned_{number}.jpg")
+    derived = tmp_path / "derived"
+    renditions = {"thumbnail": {"size": 100, "format": "JPEG", "quality": 80}}
+
+    index = DatasetIndex.build(images)
+    counts, errors = derive(index, jobs=1, renditions=renditions, derived_dir=derived)
+    assert (counts, errors) == ({"kept": 0, "rendered": 2, "removed": 0}, [])
+
+    path = rendition_paths(index.records, renditions=renditions, derived_dir=derived)[index.records[0].name]
+    with Image.open(path["thumbnail"]) as thumbnail:
+        assert thumbnail.size == (100, 75)
+
+    counts, _ = derive(index, jobs=1, renditions=renditions, derived_dir=derived)
+    assert counts == {"kept": 2, "rendered": 0, "removed": 0}
+
+    renditions["thumbnail"]["size"] = 50
+    counts, _ = derive(index, jobs=1, renditions=renditions, derived_dir=derived)
+    assert counts == {"kept": 0, "rendered": 2, "removed": 2}
+
+
+def test_index_changes_only_with_rendered_files(tmp_path):
+    derived = tmp_path / "derived"
+    index = write_index(derived)
+    stamp = index.stat().st_mtime_ns
+    assert json.loads(index.read_text())["files"] == 0
+
+    assert write_index(derived).stat().st_mtime_ns == stamp
+    (derived / "thumbnail" / "ab").mkdir(parents=True)
+    (derived / "thumbnail" / "ab" / "abcd.jpg").write_bytes(b"X")
+    assert json.loads(write_index(derived).read_text())["files"] == 1
+
+
+def test_rendered_paths_come_from_the_index_without_hashing(temp_images, tmp_path, monkeypatch):
+    derived = tmp_path / "derived"
+    records = DatasetIndex.build(temp_images).records
+    digests = content_hashes(records)
+    name = "vichy_brown_filled_dark_labeled_open_005.HEIC"
+    target = rendition_paths(records, derived_dir=derived, digests=digests)[name]["jpeg"]
+
+    def refuse(*args, **kwargs):
+        raise AssertionError("rendered_paths hashed files")
+
+    monkeypatch.setattr(derive_module, "content_hashes", refuse)
+    assert rendered_paths(records, derived_dir=derived) == {}
+
+    target.parent.mkdir(parents=True)
+    target.touch()
+    write_index(derived, {
+        file.name: {"size": file.size, "mtime_ns": file.mtime_ns, "sha256": digests[file.name]}
+        for file in records
+    })
+    paths = rendered_paths(records, derived_dir=derived)
+    assert paths[name] == {"jpeg": target}
+    assert sum(map(len, paths.values())) == 1
+
+    (temp_images / name).write_bytes(b"CHANGED")
+    assert name not in rendered_paths(DatasetIndex.build(temp_images).records, derived_dir=derived)
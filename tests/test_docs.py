@@ -0,0 +1,65 @@
+import gzip
+import json
+
+from scripts import docs
+from scripts.bitmaps import BitmapIndex
+from scripts.dataset import DatasetIndex
+
+
+def test_bundle(temp_images, tmp_path, monkeypatch):
+    monkeypatch.setattr("scripts.docs.SHARD_SIZE", 3)
+    bundle_dir = tmp_path / "data"
+    (bundle_dir).mkdir()
+    (bundle_dir / "rows-00099.json").write_text("stale")
+
+    rows = docs.index_rows(DatasetIndex.build(temp_images))
+    docs.write_bundle(rows, bundle_dir)
+
+    manifest = json.loads((bundle_dir / "manifest.json").read_text())
+    assert manifest["count"] == 8
+    assert manifest["facets"]["type"] == {"vichy": 6, "euro": 2}
+    assert [shard["count"] for shard in manifest["shards"]] == [3, 3, 2]
+    assert not (bundle_dir / "rows-00099.json").exists()
+
+    shard = json.loads((bundle_dir / "rows-00001.json").read_text())
+    encoded = shard["rows"][0]
+    decoded = {field: manifest["vocabulary"][field][code] for field, code in zip(manifest["fields"], encoded[1:])}
+    assert dict(decoded, filename=encoded[0]) == rows[3]
+
+    compressed = (bundle_dir / "manifest.json.gz").read_bytes()
+    assert gzip.decompress(compressed) == (bundle_dir / "manifest.json").read_bytes()
+
+
+def test_bundle_reuses_annotation_bitmaps_and_keeps_other_files(temp_images, tmp_path):
+    bundle_dir = tmp_path / "data"
+    (bundle_dir / "images").mkdir(parents=True)
+    (bundle_dir / "notes.txt").write_text("keep")
+    bitmaps_file = tmp_path / "bitmaps.json"
+    rows = docs.index_rows(DatasetIndex.build(temp_images))
+
+    docs.write_bundle(rows, bundle_dir, bitmaps_file)
+    built = (bundle_dir / "bitmaps.json").read_text()
+    assert (bundle_dir / "notes.txt").exists() and (bundle_dir / "images").is_dir()
+
+    bitmaps_file.write_text(built)
+    assert docs.load_bitmaps(bitmaps_file, rows[:-1], {}) is None
+    data = json.loads(built)
+    data["source"] = "annotate"
+    bitmaps_file.write_text(json.dumps(data))
+    docs.write_bundle(rows, bundle_dir, bitmaps_file)
+    assert json.loads((bundle_dir / "bitmaps.json").read_text())["source"] == "annotate"
+
+
+def test_bundle_with_more_than_256_values(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    for number in range(300):
+        (images / f"type{number}_brown_filled_dark_labeled_open_001.jpg").write_bytes(b"X")
+    (images / "euro_brown_filled_dark_labeled_open_001.jpg").write_bytes(b"X")
+    bundle_dir = tmp_path / "data"
+
+    docs.write_bundle(docs.index_rows(DatasetIndex.build(images)), bundle_dir, tmp_path / "bitmaps.json")
+
+    bitmaps = BitmapIndex.from_json(json.loads((bundle_dir / "bitmaps.json").read_text()))
+    assert bitmaps.size == 301
+    assert bitmaps.count({"type": "euro"}) == 1
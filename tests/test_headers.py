@@ -0,0 +1,71 @@
+import struct
+
+from scripts.cache import FileCache
+from scripts.dataset import DatasetIndex
+from scripts.headers import image_headers, probe_image
+
+
+def segment(marker, payload):
+    return b"\xff" + bytes([marker]) + struct.pack(">H", len(payload) + 2) + payload
+
+
+def jpeg_bytes(width, height, orientation):
+    ifd = struct.pack("<H", 1) + struct.pack("<HHIHH", 0x0112, 3, 1, orientation, 0) + b"\0\0\0\0"
+    exif = b"Exif\0\0" + b"II*\0" + struct.pack("<I", 8) + ifd
+    sof = struct.pack(">BHHB", 8, height, width, 1) + b"\x01\x11\x00"
+    sos = b"\x01\x01\x00\x00\x3f\x00"
+    return b"\xff\xd8" + segment(0xE1, exif) + segment(0xC0, sof) + segment(0xDA, sos) + b"\x12\x34" * 50 + b"\xff\xd9"
+
+
+def box(kind, payload, full=None):
+    if full is not None:
+        payload = bytes([full[0]]) + full[1].to_bytes(3, "big") + payload
+    return struct.pack(">I", len(payload) + 8) + kind + payload
+
+
+def heif_bytes(width, height, rotation):
+    ipco = box(b"ipco", box(b"ispe", struct.pack(">II", width, height), (0, 0)) + box(b"irot", bytes([rotation])))
+    ipma = box(b"ipma", struct.pack(">IHB", 1, 1, 2) + bytes([0x81, 0x02]), (0, 0))
+    meta = box(b"meta", box(b"pitm", struct.pack(">H", 1), (0, 0)) + box(b"iprp", ipco + ipma), (0, 0))
+    return box(b"ftyp", b"heic" + b"\0\0\0\0" + b"mif1heic") + meta + box(b"mdat", b"\0" * 64)
+
+
+def test_probe_jpeg_and_heif(tmp_path):
+    jpeg = tmp_path / "a.jpg"
+    jpeg.write_bytes(jpeg_bytes(4032, 3024, 6))
+    heif = tmp_path / "b.HEIC"
+    heif.write_bytes(heif_bytes(3024, 4032, 1))
+
+    assert probe_image(jpeg) == {"format": "jpeg", "width": 4032, "height": 3024, "orientation": 6, "error": None}
+    assert probe_image(heif) == {"format": "heif", "width": 3024, "height": 4032, "orientation": 8, "error": None}
+
+
+def test_probe_reports_corrupt_and_mismatched_files(tmp_path):
+    truncated = tmp_path / "truncated.jpg"
+    truncated.write_bytes(jpeg_bytes(10, 10, 1)[:-40])
+    truncated_heif = tmp_path / "truncated.heic"
+    truncated_heif.write_bytes(heif_bytes(10, 10, 0)[:-10])
+    mismatched = tmp_path / "mismatched.jpg"
+    mismatched.write_bytes(heif_bytes(10, 10, 0))
+    fake = tmp_path / "fake.jpg"
+    fake.write_bytes(b"FAKEIMAGE1")
+
+    assert "Truncated JPEG" in probe_image(truncated)["error"]
+    assert "Truncated HEIF" in probe_image(truncated_heif)["error"]
+    assert probe_image(mismatched)["error"] == "Extension .jpg does not match HEIF content"
+    assert probe_image(fake)["error"] == "Unknown image format"
+
+
+def test_image_headers_are_cached(temp_images, monkeypatch):
+    (temp_images / "vichy_brown_filled_dark_labeled_open_001.jpg").write_bytes(jpeg_bytes(640, 480, 1))
+    index = DatasetIndex.build(temp_images)
+
+    with FileCache() as cache:
+        first = image_headers(index.files, cache, jobs=2)
+
+    monkeypatch.setattr("scripts.headers.probe_image", lambda path: 1 / 0)
+    with FileCache() as cache:
+        assert image_headers(index.files, cache) == first
+
+    assert first["vichy_brown_filled_dark_labeled_open_001.jpg"]["width"] == 640
+    assert first["invalid_name.jpg"]["error"] == "Unknown image format"
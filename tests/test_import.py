@@ -0,0 +1,222 @@
+import importlib
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from scripts.journal import recover, write_journal, JOURNAL_NAME
+
+importer = importlib.import_module("scripts.import")
+
+
+def make_entry(filename, **attributes):
+    entry = {
+        "filename": filename,
+        "type": "vichy",
+        "color": "brown",
+        "fill": "filled",
+        "liquid": "dark",
+        "label": "labeled",
+        "cap": "open",
+    }
+    entry.update(attributes)
+    return entry
+
+
+def test_import_allocates_indices_per_group(temp_images, tmp_path, monkeypatch):
+    temp_dir = tmp_path / "images_temp"
+    temp_dir.mkdir()
+    for name in ["a.jpg", "b.jpg", "c.jpg"]:
+        (temp_dir / name).write_bytes(name.encode())
+
+    monkeypatch.setattr(importer, "IMAGES_DIR", temp_images)
+    monkeypatch.setattr(importer, "TEMP_DIR", temp_dir)
+
+    entries = [
+        make_entry("a.jpg"),
+        make_entry("b.jpg", type="euro", liquid="light"),
+        make_entry("missing.jpg"),
+        make_entry("c.jpg"),
+    ]
+    summary = importer.process_entries(entries)
+
+    assert summary == [
+        ("a.jpg", "vichy_brown_filled_dark_labeled_open_007.jpg", "OK"),
+        ("b.jpg", "euro_brown_filled_light_labeled_open_003.jpg", "OK"),
+        ("missing.jpg", None, "File not found"),
+        ("c.jpg", "vichy_brown_filled_dark_labeled_open_008.jpg", "OK"),
+    ]
+    assert (temp_images / "vichy_brown_filled_dark_labeled_open_008.jpg").read_bytes() == b"c.jpg"
+
+
+def test_import_dry_run_matches_real_run(temp_images, tmp_path, monkeypatch):
+    temp_dir = tmp_path / "images_temp"
+    temp_dir.mkdir()
+    for name in ["a.jpg", "b.jpg"]:
+        (temp_dir / name).write_bytes(name.encode())
+
+    monkeypatch.setattr(importer, "IMAGES_DIR", temp_images)
+    monkeypatch.setattr(importer, "TEMP_DIR", temp_dir)
+
+    entries = [make_entry("a.jpg"), make_entry("b.jpg")]
+    dry = importer.process_entries(entries, dry_run=True)
+    assert (temp_dir / "a.jpg").exists()
+
+    assert importer.process_entries(entries) == dry
+
+
+def write_metadata(rows):
+    header = "Filename\tBottle type\tGlass color\tFill level\tLiquid color\tLabel presence\tCap presence\n"
+    return header + "".join("\t".join(row) + "\n" for row in rows)
+
+
+def test_import_from_archives(temp_images, tmp_path, monkeypatch):
+    monkeypatch.setattr(importer, "IMAGES_DIR", temp_images)
+    metadata = write_metadata([
+        ("a.jpg", "euro", "green", "empty", "empty", "labeled", "open"),
+        ("b.jpg", "euro", "green", "empty", "empty", "labeled", "open"),
+    ])
+
+    zip_path = tmp_path / "session.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr("session/metadata.csv", metadata)
+        archive.writestr("session/a.jpg", b"ZIP-A")
+        archive.writestr("session/b.jpg", b"ZIP-B")
+
+    tar_dir = tmp_path / "tar"
+    tar_dir.mkdir()
+    (tar_dir / "metadata.csv").write_text(metadata.replace("green", "brown"))
+    (tar_dir / "a.jpg").write_bytes(b"TAR-A")
+    tar_path = tmp_path / "session.tar.gz"
+    with tarfile.open(tar_path, "w:gz") as archive:
+        archive.add(tar_dir / "metadata.csv", "metadata.csv")
+        archive.add(tar_dir / "a.jpg", "a.jpg")
+
+    before = sorted(path.name for path in temp_images.iterdir())
+    expected = {
+        zip_path: [("a.jpg", "euro_green_empty_empty_labeled_open_001.jpg", "OK"),
+                   ("b.jpg", "euro_green_empty_empty_labeled_open_002.jpg", "OK")],
+        tar_path: [("a.jpg", "euro_brown_empty_empty_labeled_open_001.jpg", "OK"),
+                   ("b.jpg", None, "File not found")],
+    }
+    for path, summary in expected.items():
+        source = importer.open_source(path)
+        assert importer.process_entries(source.read_metadata(), source=source, jobs=2) == summary
+
+    imported = {
+        "euro_green_empty_empty_labeled_open_001.jpg": b"ZIP-A",
+        "euro_green_empty_empty_labeled_open_002.jpg": b"ZIP-B",
+        "euro_brown_empty_empty_labeled_open_001.jpg": b"TAR-A",
+    }
+    assert sorted(path.name for path in temp_images.iterdir()) == sorted(before + list(imported))
+    for name, content in imported.items():
+        assert (temp_images / name).read_bytes() == content
+
+
+def test_archive_members_sharing_a_name_are_rejected(temp_images, tmp_path, monkeypatch):
+    monkeypatch.setattr(importer, "IMAGES_DIR", temp_images)
+    metadata = write_metadata([
+        ("a.jpg", "euro", "green", "empty", "empty", "labeled", "open"),
+        ("b.jpg", "euro", "green", "empty", "empty", "labeled", "open"),
+    ])
+    zip_path = tmp_path / "session.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr("metadata.csv", metadata)
+        archive.writestr("left/a.jpg", b"LEFT")
+        archive.writestr("right/a.jpg", b"RIGHT")
+        archive.writestr("right/b.jpg", b"B")
+    tar_path = tmp_path / "session.tar"
+    with tarfile.open(tar_path, "w") as archive:
+        for name, data in [("metadata.csv", metadata.encode()), ("left/a.jpg", b"LEFT"),
+                           ("right/a.jpg", b"RIGHT"), ("b.jpg", b"B")]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+    expected = [("a.jpg", None, "Several files with this name in the source"),
+                ("b.jpg", "euro_green_empty_empty_labeled_open_001.jpg", "OK")]
+    for path in [zip_path, tar_path]:
+        source = importer.open_source(path)
+        entries = source.read_metadata()
+        assert importer.process_entries(entries, dry_run=True, source=source) == expected
+        assert importer.process_entries(entries, source=source) == expected
+        (temp_images / "euro_green_empty_empty_labeled_open_001.jpg").unlink()
+
+
+def test_import_rolls_back_on_failure(temp_images, tmp_path, monkeypatch):
+    temp_dir = tmp_path / "images_temp"
+    temp_dir.mkdir()
+    for name in ["a.jpg", "b.jpg"]:
+        (temp_dir / name).write_bytes(name.encode())
+
+    monkeypatch.setattr(importer, "IMAGES_DIR", temp_images)
+    monkeypatch.setattr(importer, "TEMP_DIR", temp_dir)
+    before = sorted(path.name for path in temp_images.iterdir())
+
+    # a stale snapshot makes the second planned name collide with an existing file
+    stale_index = importer.DatasetIndex(temp_images, [])
+    entries = [make_entry("a.jpg", color="green"), make_entry("b.jpg")]
+
+    with pytest.raises(FileExistsError):
+        importer.process_entries(entries, index=stale_index)
+
+    assert sorted(path.name for path in temp_images.iterdir()) == before
+    assert (temp_dir / "a.jpg").exists() and (temp_dir / "b.jpg").exists()
+
+
+def test_recover_reverts_interrupted_commit(tmp_path):
+    staged = tmp_path / "staged.jpg"
+    final = tmp_path / "final.jpg"
+    final.write_bytes(b"X")
+    write_journal(tmp_path / JOURNAL_NAME, {"renames": [[str(staged), str(final)]]})
+
+    assert recover(tmp_path) == 1
+    assert staged.exists() and not final.exists()
+    assert not (tmp_path / JOURNAL_NAME).exists()
+
+
+def test_recover_finishes_cleanup_of_committed_import(tmp_path):
+    original = tmp_path / "a.jpg"
+    final = tmp_path / "final.jpg"
+    original.write_bytes(b"A")
+    final.write_bytes(b"A")
+    write_journal(tmp_path / JOURNAL_NAME, {"cleanup": [str(original)]})
+
+    assert recover(tmp_path) == 0
+    assert final.exists() and not original.exists()
+    assert not (tmp_path / JOURNAL_NAME).exists()
+
+
+def test_tar_metadata_found_after_images(tmp_path):
+    (tmp_path / "a.jpg").write_bytes(b"TAR-A")
+    (tmp_path / "metadata.csv").write_text(write_metadata([
+        ("a.jpg", "euro", "green", "empty", "empty", "labeled", "open"),
+    ]))
+    tar_path = tmp_path / "session.tar"
+    with tarfile.open(tar_path, "w") as archive:
+        archive.add(tmp_path / "a.jpg", "session/a.jpg")
+        archive.add(tmp_path / "metadata.csv", "session/metadata.csv")
+
+    entries = importer.open_source(tar_path).read_metadata()
+    assert [entry["filename"] for entry in entries] == ["a.jpg"]
+
+
+def test_import_rejects_rows_failing_the_schema(temp_images, tmp_path, monkeypatch):
+    temp_dir = tmp_path / "images_temp"
+    temp_dir.mkdir()
+    for name in ["a.jpg", "b.jpg"]:
+        (temp_dir / name).write_bytes(name.encode())
+
+    monkeypatch.setattr(importer, "IMAGES_DIR", temp_images)
+    monkeypatch.setattr(importer, "TEMP_DIR", temp_dir)
+
+    entries = [make_entry("a.jpg", fill="empty"), make_entry("b.jpg", type="Euro", liquid="light")]
+    summary = importer.process_entries(entries)
+
+    assert summary == [
+        ("a.jpg", None, "Invalid attributes: Invalid liquid='dark' for fill='empty'. Liquid must be 'empty' when fill='empty'."),
+        ("b.jpg", "euro_brown_filled_light_labeled_open_003.jpg", "OK"),
+    ]
+    assert (temp_dir / "a.jpg").exists()
+    assert not (temp_dir / "b.jpg").exists()
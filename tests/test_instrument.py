@@ -0,0 +1,67 @@
+import json
+
+from scripts.instrument import Recorder, instrumented, RECORDER
+from scripts.workers import run_parallel
+
+
+def test_recorder_measures_spans_and_functions(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"x" * 100_000)
+
+    @instrumented("read_file")
+    def read_file():
+        return len(path.read_bytes())
+
+    read_file()
+    assert RECORDER.totals == {}
+
+    RECORDER.start()
+    try:
+        with RECORDER.span("stage"):
+            for _ in range(3):
+                read_file()
+            blob = [bytes(1000) for _ in range(1000)]
+    finally:
+        RECORDER.stop()
+    del blob
+
+    trace = {span["name"]: span for span in RECORDER.to_json()["spans"]}
+    assert trace["read_file"]["calls"] == 3
+    assert trace["read_file"]["files"] == 3
+    assert trace["stage"]["files"] == 3
+    assert trace["stage"]["peak_memory_bytes"] >= 1_000_000
+    assert trace["stage"]["wall_s"] >= trace["read_file"]["wall_s"]
+    if trace["read_file"]["bytes_read"] is not None:
+        assert trace["read_file"]["bytes_read"] >= 300_000
+
+    RECORDER.write(tmp_path / "trace.json")
+    assert json.loads((tmp_path / "trace.json").read_text())["spans"]
+
+
+def test_disabled_recorder_records_nothing():
+    recorder = Recorder()
+    with recorder.span("stage"):
+        pass
+    assert recorder.totals == {}
+
+
+def test_batch_spans_cover_worker_threads(tmp_path):
+    paths = []
+    for number in range(8):
+        paths.append(tmp_path / f"{number}.bin")
+        paths[-1].write_bytes(b"x" * 1000)
+
+    @instrumented("read_all", kind="batch")
+    def read_all():
+        return run_parallel(lambda path: len(path.read_bytes()), paths, 4)
+
+    RECORDER.start()
+    try:
+        read_all()
+    finally:
+        RECORDER.stop()
+
+    trace = {span["name"]: span for span in RECORDER.to_json()["spans"]}
+    assert trace["read_all"]["kind"] == "batch"
+    assert trace["read_all"]["calls"] == 1
+    assert trace["read_all"]["files"] == 8
@@ -0,0 +1,55 @@
+import json
+
+from scripts.dataset import DatasetIndex
+from scripts.manifest import build_manifest, diff_manifests, write_delta
+from scripts.package import read_member
+
+
+def test_manifest_lists_hashes_and_parameters(temp_images):
+    manifest = build_manifest(DatasetIndex.build(temp_images))
+
+    images = manifest["images"]
+    assert [image["filename"] for image in images] == sorted(image["filename"] for image in images)
+    assert len(images) == 8
+    assert images[0]["sha256"] == images[1]["sha256"]
+    assert images[0]["size"] == len(b"FAKEIMAGE1")
+    assert images[0]["parameters"]["type"] == "euro"
+    assert images[-1]["index"] == 6
+
+
+def test_diff_detects_renames_by_hash(temp_images):
+    old = build_manifest(DatasetIndex.build(temp_images))
+
+    (temp_images / "vichy_brown_filled_dark_labeled_open_002.jpg").write_bytes(b"CHANGED")
+    (temp_images / "vichy_brown_filled_dark_labeled_open_003.jpg").unlink()
+    (temp_images / "vichy_brown_filled_dark_labeled_open_004.jpg").rename(
+        temp_images / "vichy_brown_filled_dark_labeled_open_007.jpg")
+    (temp_images / "euro_brown_filled_light_labeled_open_003.jpg").write_bytes(b"NEW")
+    diff = diff_manifests(old, build_manifest(DatasetIndex.build(temp_images)))
+
+    assert diff["added"] == ["euro_brown_filled_light_labeled_open_003.jpg"]
+    assert diff["removed"] == ["vichy_brown_filled_dark_labeled_open_003.jpg"]
+    assert diff["modified"] == ["vichy_brown_filled_dark_labeled_open_002.jpg"]
+    assert diff["renamed"] == [("vichy_brown_filled_dark_labeled_open_004.jpg",
+                                "vichy_brown_filled_dark_labeled_open_007.jpg")]
+    assert diff["unchanged"] == 5
+
+
+def test_delta_package_holds_only_changed_images(temp_images, tmp_path, generate):
+    old = build_manifest(DatasetIndex.build(temp_images))
+    (temp_images / "vichy_brown_filled_dark_labeled_open_002.jpg").write_bytes(b"CHANGED")
+    (temp_images / "vichy_brown_filled_dark_labeled_open_001.jpg").unlink()
+    annotations = generate() / "annotations.json"
+
+    index = DatasetIndex.build(temp_images)
+    new = build_manifest(index)
+    diff = diff_manifests(old, new)
+    delta_dir = tmp_path / "delta"
+    packaged = write_delta(diff, new, index, delta_dir, annotations)
+
+    assert [member["name"] for member in packaged["members"]] == [
+        "vichy_brown_filled_dark_labeled_open_002.jpg", "vichy_brown_filled_dark_labeled_open_002.json"]
+    assert read_member(delta_dir, "vichy_brown_filled_dark_labeled_open_002.jpg") == b"CHANGED"
+    assert json.loads((delta_dir / "delta.json").read_text())["removed"] == ["vichy_brown_filled_dark_labeled_open_001.jpg"]
+    assert json.loads((delta_dir / "release.json").read_text()) == new
+    assert (delta_dir / "annotations.json").read_bytes() == annotations.read_bytes()
@@ -0,0 +1,48 @@
+import json
+import tarfile
+
+import pytest
+
+from scripts.dataset import DatasetIndex
+from scripts.package import load_entries, read_member, write_package
+
+
+def package(generate, temp_images, package_dir, jobs, compress=True):
+    entries = load_entries(generate() / "annotations.json")
+    index = DatasetIndex.build(temp_images)
+    return write_package(index.records, entries, package_dir, shard_size=1024, jobs=jobs, compress=compress)
+
+
+def test_package_shards_are_deterministic_tar_files(temp_images, tmp_path, generate):
+    first = package(generate, temp_images, tmp_path / "first", jobs=1)
+    second = package(generate, temp_images, tmp_path / "second", jobs=4)
+
+    assert first == second
+    assert len(first["shards"]) > 1
+    assert sum(shard["samples"] for shard in first["shards"]) == 8
+    for shard in first["shards"]:
+        assert (tmp_path / "first" / shard["file"]).read_bytes() == (tmp_path / "second" / shard["file"]).read_bytes()
+
+    with tarfile.open(tmp_path / "first" / first["shards"][0]["file"], "r:gz") as archive:
+        names = archive.getnames()
+        sidecar = json.load(archive.extractfile(names[1]))
+    assert names[:2] == ["euro_brown_filled_light_labeled_open_001.jpg", "euro_brown_filled_light_labeled_open_001.json"]
+    assert sidecar["collection"] == {"index": 1, "of": 2}
+
+
+def test_read_member_by_byte_range(temp_images, tmp_path, generate):
+    for compress in (True, False):
+        package_dir = tmp_path / f"package-{compress}"
+        manifest = package(generate, temp_images, package_dir, jobs=2, compress=compress)
+
+        assert len(manifest["members"]) == 16
+        name = "vichy_brown_filled_dark_labeled_open_005.HEIC"
+        assert read_member(package_dir, name) == (temp_images / name).read_bytes()
+        sidecar = json.loads(read_member(package_dir, "vichy_brown_filled_dark_labeled_open_005.json"))
+        assert sidecar["filename"] == name
+
+
+def test_read_member_unknown_name(temp_images, tmp_path, generate):
+    package(generate, temp_images, tmp_path / "package", jobs=1)
+    with pytest.raises(KeyError, match="missing.jpg"):
+        read_member(tmp_path / "package", "missing.jpg")
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from scripts import repair
+from scripts.dataset import DatasetIndex
+from scripts.validate import check_group
+
+
+def test_repair_moves_only_misplaced_files(temp_images, capsys):
+    for name in ["vichy_brown_filled_dark_labeled_open_003.HEIC", "vichy_brown_filled_dark_labeled_open_010.jpg",
+                 "vichy_brown_filled_dark_labeled_open_8.jpg"]:
+        (temp_images / name).write_bytes(name.encode())
+    (temp_images / "vichy_brown_filled_dark_labeled_open_002.jpg").unlink()
+    before = sorted(path.name for path in temp_images.iterdir())
+
+    plans = repair.main(images_dir=temp_images)
+    assert sorted(path.name for path in temp_images.iterdir()) == before
+    out = capsys.readouterr().out
+    assert "Dry-run mode" in out
+    assert "3 of 11 files in 1 groups to rename." in out
+
+    assert [(file.name, new_name) for file, new_name in plans[("vichy", "brown", "filled", "dark", "labeled", "open")]] == [
+        ("vichy_brown_filled_dark_labeled_open_003.jpg", "vichy_brown_filled_dark_labeled_open_002.jpg"),
+        ("vichy_brown_filled_dark_labeled_open_8.jpg", "vichy_brown_filled_dark_labeled_open_007.jpg"),
+        ("vichy_brown_filled_dark_labeled_open_010.jpg", "vichy_brown_filled_dark_labeled_open_008.jpg"),
+    ]
+    assert len(plans) == 1
+
+    repair.main(apply=True, images_dir=temp_images)
+    index = DatasetIndex.build(temp_images)
+    assert all(check_group(records) == ([], {}) for records in index.groups.values())
+    assert (temp_images / "vichy_brown_filled_dark_labeled_open_008.jpg").read_bytes().endswith(b"010.jpg")
+    assert repair.plan_repairs(index) == {}
+
+
+def test_order_renames_breaks_cycles_and_chains():
+    a, b, c, d = (Path(name) for name in "abcd")
+    sequence = repair.order_renames([(a, b), (b, a), (c, d), (d, Path("e"))])
+
+    files = {a: "A", b: "B", c: "C", d: "D"}
+    for src, dst in sequence:
+        assert dst not in files
+        files[dst] = files.pop(src)
+    assert files == {a: "B", b: "A", d: "C", Path("e"): "D"}
+    assert len(sequence) == 5
@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+from scripts.schema import Schema
+from scripts.utils import SCHEMA
+
+
+def test_compiled_schema_lists_valid_combinations():
+    assert len(SCHEMA.valid) == 8 * 3 * 4 * 5 * 2 * 2 - 8 * 3 * 4 * 2 * 2
+    assert ("euro", "brown", "empty", "empty", "labeled", "open") in SCHEMA.valid
+    assert SCHEMA.check(("euro", "brown", "filled", "dark", "labeled", "open")) == []
+    assert SCHEMA.check(("euro", "pink", "empty", "dark", "labeled", "open")) == [
+        "color: 'pink' not in allowed set ['transparent', 'brown', 'green']",
+        "Invalid liquid='dark' for fill='empty'. Liquid must be 'empty' when fill='empty'.",
+    ]
+
+
+def test_schema_rules_are_declarative(tmp_path):
+    path = tmp_path / "schema.json"
+    path.write_text(json.dumps({
+        "fields": {"type": ["amber", "kraft"], "cap": ["crowned", "open"]},
+        "rules": [{"if": {"type": ["kraft"]}, "then": {"cap": ["crowned"]}, "message": "{type} bottles are always crowned"}],
+    }))
+    schema = Schema.load(path)
+
+    assert schema.combinations == [("amber", "crowned"), ("amber", "open"), ("kraft", "crowned")]
+    assert schema.check(("kraft", "open")) == ["kraft bottles are always crowned"]
+
+    with pytest.raises(ValueError, match="fields must be"):
+        Schema.load(path, ["cap", "type"])
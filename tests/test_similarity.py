@@ -0,0 +1,37 @@
+import pytest
+
+from scripts.cache import FileCache
+from scripts.dataset import DatasetIndex
+from scripts.similarity import BKTree, find_similar, hamming
+
+
+def test_bktree_search_matches_linear_scan():
+    values = [(index * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF for index in range(300)]
+    tree = BKTree()
+    for number, value in enumerate(values):
+        tree.add(value, number)
+
+    query = values[7] ^ 0b1011
+    for radius in (0, 3, 20, 40):
+        expected = {number for number, value in enumerate(values) if hamming(query, value) <= radius}
+        assert {item for _, item in tree.search(query, radius)} == expected
+
+
+def test_find_similar_reports_resized_copy(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+
+    images = tmp_path / "images"
+    images.mkdir()
+    picture = Image.effect_mandelbrot((256, 256), (-2, -1.5, 1, 1.5), 100).convert("RGB")
+    picture.save(images / "euro_brown_filled_dark_labeled_crowned_1.jpg", quality=95)
+    picture.resize((200, 200)).save(images / "euro_brown_filled_dark_labeled_crowned_2.jpg", quality=70)
+    picture.transpose(Image.FLIP_LEFT_RIGHT).save(images / "euro_brown_filled_dark_labeled_crowned_3.jpg")
+    (images / "euro_brown_filled_dark_labeled_crowned_4.jpg").write_bytes(b"not an image")
+
+    index = DatasetIndex.build(images)
+    with FileCache() as cache:
+        first = find_similar(index.records, cache, jobs=1)
+    with FileCache() as cache:
+        assert find_similar(index.records, cache, jobs=1) == first
+
+    assert [(a[-5:], b[-5:]) for a, b, _ in first] == [("1.jpg", "2.jpg")]
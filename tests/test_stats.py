@@ -1,4 +1,5 @@
 from scripts import stats
+from scripts.dataset import DatasetIndex
 
 
 def test_stats_basic(temp_images, monkeypatch):
@@ -11,3 +12,58 @@ def test_stats_basic(temp_images, monkeypatch):
     assert combos[("euro", "brown", "filled", "light", "labeled", "open")] == 2
     assert combos[("vichy", "brown", "filled", "dark", "labeled", "open")] == 6
     assert ext_counts["jpg"] == 6
+
+
+def test_stats_set_and_negated_filters(temp_images, monkeypatch):
+    monkeypatch.setattr("scripts.stats.IMAGES_DIR", temp_images)
+
+    total, attr_counts, _, ext_counts, _ = stats.collect_statistics({"type": "euro,amber"})
+    assert total == 2
+    assert attr_counts["type"] == {"euro": 2}
+
+    total, _, _, ext_counts, _ = stats.collect_statistics({"type": "!euro", "liquid": "dark"})
+    assert total == 6
+    assert ext_counts == {"jpg": 4, "heic": 2}
+
+    total, *_ = stats.collect_statistics({"type": "!euro,vichy"})
+    assert total == 0
+
+
+def test_matches_filters_sets():
+    info = {"type": "amber", "fill": "filled"}
+    assert stats.matches_filters(info, {"type": "amber,tulip", "fill": "!empty"})
+    assert not stats.matches_filters(info, {"type": "!amber"})
+    assert not stats.matches_filters(info, {"type": "euro"})
+
+
+def test_engine_crosstab(temp_images):
+    index = DatasetIndex.build(temp_images)
+    engine = stats.StatsEngine.from_index(index)
+
+    table = engine.crosstab(["type", "liquid"], engine.mask({"label": "labeled"}))
+    assert table == {("euro", "light"): 2, ("vichy", "dark"): 6}
+
+
+def test_print_crosstab_and_pivot(temp_images, capsys):
+    engine = stats.StatsEngine.from_index(DatasetIndex.build(temp_images))
+
+    stats.print_crosstab(engine, "type", "liquid", {})
+    stats.print_pivot(engine, "type", {})
+    out = capsys.readouterr().out
+
+    assert "vichy" in out and "total" in out
+    assert "- vichy: 6" in out
+    assert "  - liquid: dark: 6" in out
+
+
+def test_engine_handles_more_than_256_values(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    for number in range(300):
+        (images / f"type{number}_brown_filled_dark_labeled_open_001.jpg").write_bytes(b"X")
+    engine = stats.StatsEngine.from_index(DatasetIndex.build(images))
+
+    mask = engine.mask({"type": "type299,type7"})
+    assert engine.total(mask) == 2
+    assert engine.counts("type", mask) == {"type299": 1, "type7": 1}
+    assert engine.total(engine.mask({"type": "!type0"})) == 299
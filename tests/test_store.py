@@ -0,0 +1,87 @@
+import importlib
+import os
+import shutil
+
+from scripts import store
+from scripts.dataset import DatasetIndex
+
+importer = importlib.import_module("scripts.import")
+
+
+def inode(path):
+    return os.stat(path).st_ino
+
+
+def test_adopt_checkout_and_gc(temp_images, tmp_path):
+    backing = tmp_path / "store"
+    index = DatasetIndex.build(temp_images)
+
+    counts = store.adopt(index.files, backing)
+    assert counts == {"stored": 8, "already stored": 0, "deduplicated": 1, "not linked": 0, "bytes saved": 10}
+    first, second = (temp_images / f"euro_brown_filled_light_labeled_open_00{n}.jpg" for n in (1, 2))
+    assert inode(first) == inode(second)
+    assert first.stat().st_mode & 0o200
+    assert len(list(store.blobs(backing))) == 8
+
+    index = DatasetIndex.build(temp_images)
+    assert store.adopt(index.files, backing)["already stored"] == 9
+    assert store.store_status(index, backing)["files in store"] == 9
+
+    view = tmp_path / "release"
+    assert store.checkout(index, view, backing) == {"link": 9, "reflink": 0, "copy": 0}
+    assert inode(view / first.name) == inode(first)
+
+    (temp_images / "invalid_name.jpg").unlink()
+    assert store.collect_garbage(DatasetIndex.build(temp_images), backing) == (0, 0)
+    (view / "invalid_name.jpg").unlink()
+    assert store.collect_garbage(DatasetIndex.build(temp_images), backing) == (1, len(b"FAKEIMAGE8"))
+    assert len(list(store.blobs(backing))) == 7
+
+
+def test_gc_keeps_copied_blobs_of_current_images(temp_images, tmp_path, monkeypatch):
+    backing = tmp_path / "store"
+    monkeypatch.setattr(store, "place", lambda src, dst: shutil.copyfile(src, dst) and "copy")
+    index = DatasetIndex.build(temp_images)
+
+    assert store.adopt(index.files, backing)["stored"] == 8
+    assert store.collect_garbage(index, backing) == (0, 0)
+    assert len(list(store.blobs(backing))) == 8
+    assert all(blob.stat().st_mode & 0o222 == 0 for blob in store.blobs(backing))
+    assert (temp_images / "invalid_name.jpg").stat().st_mode & 0o200
+
+
+def test_adopt_counts_files_that_cannot_be_linked(temp_images, tmp_path, monkeypatch):
+    backing = tmp_path / "store"
+    store.adopt(DatasetIndex.build(temp_images).files, backing)
+    copy = temp_images / "vichy_brown_filled_dark_labeled_open_001.jpg"
+    content = copy.read_bytes()
+    copy.unlink()
+    copy.write_bytes(content)
+
+    def refuse(src, dst):
+        raise PermissionError(src)
+
+    monkeypatch.setattr(store.os, "link", refuse)
+    counts = store.adopt(DatasetIndex.build(temp_images).files, backing)
+    assert counts["not linked"] == 1
+    assert counts["already stored"] == 8
+
+
+def test_import_adopts_new_files_into_existing_store(temp_images, tmp_path, monkeypatch):
+    temp_dir = tmp_path / "images_temp"
+    temp_dir.mkdir()
+    (temp_dir / "a.jpg").write_bytes(b"FAKEIMAGE2")
+    backing = tmp_path / "store"
+    store.adopt(DatasetIndex.build(temp_images).files, backing)
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(importer, "IMAGES_DIR", temp_images)
+    monkeypatch.setattr(importer, "TEMP_DIR", temp_dir)
+    monkeypatch.setattr(importer, "STORE_DIR", backing)
+
+    entry = {"filename": "a.jpg", "type": "vichy", "color": "brown", "fill": "filled",
+             "liquid": "dark", "label": "labeled", "cap": "open"}
+    importer.process_entries([entry])
+
+    imported = temp_images / "vichy_brown_filled_dark_labeled_open_007.jpg"
+    assert inode(imported) == inode(temp_images / "vichy_brown_filled_dark_labeled_open_001.jpg")
@@ -0,0 +1,109 @@
+import zipfile
+
+import pytest
+
+from scripts.columnar import write_npz
+from scripts.tensors import TensorCache, build_cache
+
+
+def fake_decode(task):
+    path, width, height = task
+    if path.endswith(".HEIC"):
+        return None
+    return bytes([int(path[-7:-4]) % 256]) * (width * height * 3)
+
+
+def test_build_cache_resumes_after_interruption(temp_images, monkeypatch, tmp_path, generate):
+    columns_file = generate() / "annotations.npz"
+    monkeypatch.setattr("scripts.tensors.CHUNK_ROWS", 3)
+    calls = []
+
+    def interrupted(task):
+        calls.append(task)
+        if len(calls) == 5:
+            raise KeyboardInterrupt
+        return fake_decode(task)
+
+    monkeypatch.setattr("scripts.tensors.decode", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        build_cache(4, 2, tmp_path / "tensors", columns_file, temp_images, jobs=1)
+
+    monkeypatch.setattr("scripts.tensors.decode", fake_decode)
+    directory, counts = build_cache(4, 2, tmp_path / "tensors", columns_file, temp_images, jobs=1)
+    assert counts == {"reused": 3, "decoded": 3, "failed": 2}
+
+    _, counts = build_cache(4, 2, directory, columns_file, temp_images, jobs=1)
+    assert counts == {"reused": 8, "decoded": 0, "failed": 0}
+
+    cache = TensorCache(directory)
+    assert len(cache) == 6
+    assert cache.labels.filename(0) == "euro_brown_filled_light_labeled_open_001.jpg"
+    assert cache.batch([0, 1]).images.shape == (2, 2, 4, 3)
+    assert bytes(cache.batch([2]).images) == bytes([1]) * 24
+
+
+def test_batches_cover_every_row_once(temp_images, monkeypatch, tmp_path, generate):
+    columns_file = generate() / "annotations.npz"
+    monkeypatch.setattr("scripts.tensors.decode", fake_decode)
+    directory, _ = build_cache(2, 2, tmp_path / "tensors", columns_file, temp_images, jobs=1)
+    cache = TensorCache(directory)
+
+    batches = list(cache.batches(4, seed=1, epoch=0))
+    assert [len(batch.rows) for batch in batches] == [4, 2]
+    assert sorted(row for batch in batches for row in batch.rows) == cache.rows
+    assert [batch.rows for batch in cache.batches(4, seed=1, epoch=0)] == [batch.rows for batch in batches]
+    assert [batch.rows for batch in cache.batches(4, shuffle=False, drop_last=True)] == [[0, 1, 2, 3]]
+
+    for batch in batches:
+        for number, row in enumerate(batch.rows):
+            assert batch.images[number, 0, 0, 0] == int(cache.labels.filename(row)[-7:-4])
+            assert batch.labels["type"][number] == cache.labels["type"][row]
+
+    next(iter(cache.batches(1, prefetch=1)))
+
+
+def test_build_cache_keeps_rows_of_unchanged_files(temp_images, monkeypatch, tmp_path, generate):
+    columns_file = generate() / "annotations.npz"
+    monkeypatch.setattr("scripts.tensors.decode", fake_decode)
+    directory, _ = build_cache(2, 2, tmp_path / "tensors", columns_file, temp_images, jobs=1)
+
+    (temp_images / "euro_brown_filled_light_labeled_open_002.jpg").unlink()
+    (temp_images / "vichy_brown_filled_dark_labeled_open_003.jpg").write_bytes(b"CHANGED")
+    generate()
+    decoded = []
+    monkeypatch.setattr("scripts.tensors.decode", lambda task: decoded.append(task[0]) or fake_decode(task))
+    _, counts = build_cache(2, 2, directory, columns_file, temp_images, jobs=1)
+
+    assert counts == {"reused": 4, "decoded": 1, "failed": 2}
+    assert [path.rsplit("/", 1)[1] for path in decoded if not path.endswith(".HEIC")] == [
+        "vichy_brown_filled_dark_labeled_open_003.jpg"]
+    cache = TensorCache(directory)
+    for row in cache.rows:
+        assert cache.batch([row]).images[0, 0, 0, 0] == int(cache.labels.filename(row)[-7:-4])
+
+
+def test_batch_labels_of_more_than_256_values(temp_images, monkeypatch, tmp_path, generate):
+    for number in range(300):
+        (temp_images / f"type{number}_brown_filled_dark_labeled_open_001.jpg").write_bytes(b"X")
+    columns_file = generate() / "annotations.npz"
+    monkeypatch.setattr("scripts.tensors.decode", fake_decode)
+    directory, _ = build_cache(2, 2, tmp_path / "tensors", columns_file, temp_images, jobs=1)
+
+    cache = TensorCache(directory)
+    rows = list(cache.rows)
+    labels = cache.batch(rows).labels
+    assert labels["type"].typecode == "H"
+    assert [cache.labels.vocabulary["type"][code] for code in labels["type"]] == [
+        cache.labels.filename(row).split("_")[0] for row in rows]
+    assert labels["cap"].typecode == "B"
+
+
+def test_build_cache_rejects_stale_annotation_columns(temp_images, tmp_path, generate):
+    columns_file = generate() / "annotations.npz"
+    with zipfile.ZipFile(columns_file) as archive:
+        members = [(info.filename[:-len(".npy")], archive.read(info)) for info in archive.infolist()
+                   if info.filename not in ("size.npy", "mtime_ns.npy")]
+    write_npz(members, columns_file)
+
+    with pytest.raises(ValueError, match="out of date .*size, mtime_ns"):
+        build_cache(2, 2, tmp_path / "tensors", columns_file, temp_images, jobs=1)
@@ -1,4 +1,6 @@
-from scripts.utils import parse_filename, build_filename
+import pickle
+from scripts import utils
+from scripts.utils import parse_filename, parse_names, build_filename
 from pathlib import Path
 
 
@@ -28,3 +30,38 @@ def test_build_filename_roundtrip():
     }
     result = build_filename(entry, 7)
     assert result == "euro_brown_empty_empty_labeled_open_007.jpg"
+
+
+def test_parsed_records_are_compact_and_shared():
+    names = [
+        "vichy_brown_filled_dark_labeled_open_012.jpg",
+        "vichy_brown_filled_dark_labeled_open_7.HEIC",
+        "weird_brown_filled_dark_labeled_open_x1.jpg",
+        "badfilename.jpg",
+    ]
+    infos = parse_names(names)
+
+    assert infos[3] is None
+    assert [dict(info) for info in infos[:3]] == [dict(parse_filename(Path(name))) for name in names[:3]]
+    assert infos[0].key is infos[1].key
+    assert infos[0].key == ("vichy", "brown", "filled", "dark", "labeled", "open")
+    assert (infos[0].index, infos[0]["index"]) == (12, "012")
+    assert (infos[1].index, infos[1]["index"], infos[1]["ext"]) == (7, "7", "heic")
+    assert (infos[2].index, infos[2]["index"], infos[2]["type"]) == (None, "x1", "weird")
+    assert len(infos[0].codes) == 7
+    assert dict(pickle.loads(pickle.dumps(infos[2]))) == dict(infos[2])
+
+
+def test_vocabulary_stops_growing_at_limit(monkeypatch):
+    monkeypatch.setitem(utils.VOCABULARY, "type", list(utils.VOCABULARY["type"]))
+    monkeypatch.setitem(utils.CODES, "type", dict(utils.CODES["type"]))
+    limit = len(utils.VOCABULARY["type"]) + 2
+    monkeypatch.setattr(utils, "VOCABULARY_LIMIT", limit)
+    names = [f"junk{number}_brown_filled_dark_labeled_open_001.jpg" for number in range(5)]
+    infos = parse_names(names)
+
+    assert len(utils.VOCABULARY["type"]) == limit
+    assert [info["type"] for info in infos] == [f"junk{number}" for number in range(5)]
+    assert infos[4].key == ("junk4", "brown", "filled", "dark", "labeled", "open")
+    assert pickle.loads(pickle.dumps(infos[4]))["type"] == "junk4"
+    assert dict(infos[4])["index"] == "001"
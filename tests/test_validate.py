@@ -1,4 +1,5 @@
 import scripts.validate as validate
+from scripts.dataset import DatasetIndex
 from scripts.utils import parse_filename
 
 
@@ -31,3 +32,34 @@ def test_sha256_duplicates(temp_images, monkeypatch):
     result = validate.main(return_success=True)
     # FAKEIMAGE1 appears twice → should detect duplicates → return False
     assert result is False
+
+
+def test_tiered_duplicates_only_full_hash_collisions(temp_images, monkeypatch):
+    (temp_images / "euro_brown_empty_empty_labeled_open_001.jpg").write_bytes(b"UNIQUE SIZE")
+    index = DatasetIndex.build(temp_images)
+
+    hashed = []
+    original = validate.file_sha256
+    monkeypatch.setattr("scripts.validate.file_sha256", lambda path: hashed.append(path.name) or original(path))
+
+    duplicates = validate.find_content_duplicates(index.files, jobs=1)
+
+    assert list(duplicates.values()) == [[
+        "euro_brown_filled_light_labeled_open_001.jpg",
+        "euro_brown_filled_light_labeled_open_002.jpg",
+    ]]
+    assert sorted(hashed) == sorted(duplicates[next(iter(duplicates))])
+
+
+def test_partial_hash_covers_head_and_tail(tmp_path):
+    first = tmp_path / "a.bin"
+    second = tmp_path / "b.bin"
+    first.write_bytes(b"A" * 100 + b"middle-1" + b"Z" * 100)
+    second.write_bytes(b"A" * 100 + b"middle-2" + b"Z" * 100)
+
+    digest_first = validate.file_partial_sha256(first, 208, block_size=16)
+    digest_second = validate.file_partial_sha256(second, 208, block_size=16)
+    assert digest_first == digest_second
+
+    second.write_bytes(b"A" * 100 + b"middle-1" + b"Y" * 100)
+    assert validate.file_partial_sha256(second, 208, block_size=16) != digest_first
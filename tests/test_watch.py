@@ -0,0 +1,65 @@
+import os
+import sys
+
+import pytest
+
+from scripts.cache import FileCache
+from scripts.dataset import DatasetIndex
+from scripts.watch import InotifyWatcher, LiveValidation, PollingWatcher
+
+
+def test_live_validation_rechecks_changed_groups(temp_images):
+    with FileCache() as cache:
+        live = LiveValidation(DatasetIndex.build(temp_images), cache, jobs=1)
+        key = ("euro", "brown", "filled", "light", "labeled", "open")
+        assert "Invalid naming: invalid_name.jpg" in live.problems()
+        assert key not in live.group_errors
+        assert any("euro_brown_filled_light_labeled_open_001.jpg" in line for line in live.problems())
+
+        (temp_images / "euro_brown_filled_light_labeled_open_004.jpg").write_bytes(b"FAKEIMAGE9")
+        assert live.apply({"euro_brown_filled_light_labeled_open_004.jpg"}) == {"added": 1, "modified": 0, "removed": 0}
+        assert live.group_errors[key][0] == ["Non-continuous sequence, missing: [3]"]
+        assert live.index.group_size(key) == 3
+
+        (temp_images / "euro_brown_filled_light_labeled_open_004.jpg").rename(temp_images / "euro_brown_filled_light_labeled_open_003.jpg")
+        (temp_images / "euro_brown_filled_light_labeled_open_002.jpg").write_bytes(b"FAKEIMAGEX")
+        counts = live.apply({
+            "euro_brown_filled_light_labeled_open_002.jpg",
+            "euro_brown_filled_light_labeled_open_003.jpg",
+            "euro_brown_filled_light_labeled_open_004.jpg",
+        })
+        assert counts == {"added": 1, "modified": 1, "removed": 1}
+        assert key not in live.group_errors
+        assert live.content_duplicates == {}
+
+        os.remove(temp_images / "invalid_name.jpg")
+        live.rescan()
+        assert not any(line.startswith("Invalid naming") for line in live.problems())
+        assert [file.name for file in live.index.files] == sorted(os.listdir(temp_images))
+
+
+def test_polling_watcher_reports_changed_names(tmp_path):
+    (tmp_path / "a.jpg").write_bytes(b"A")
+    (tmp_path / "b.jpg").write_bytes(b"B")
+    watcher = PollingWatcher(tmp_path, interval=0.01)
+    assert watcher.changes(0) == set()
+
+    (tmp_path / "a.jpg").write_bytes(b"AA")
+    (tmp_path / "b.jpg").unlink()
+    (tmp_path / "c.jpg").write_bytes(b"C")
+    (tmp_path / ".hidden").write_bytes(b"H")
+    assert watcher.changes(1) == {"a.jpg", "b.jpg", "c.jpg"}
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+def test_inotify_watcher_reports_closed_and_moved_files(tmp_path):
+    (tmp_path / "old.jpg").write_bytes(b"A")
+    watcher = InotifyWatcher(tmp_path)
+    try:
+        assert watcher.changes(0) == set()
+        (tmp_path / "new.jpg").write_bytes(b"B")
+        (tmp_path / "old.jpg").rename(tmp_path / "moved.jpg")
+        (tmp_path / ".staging").mkdir()
+        assert watcher.changes(1) == {"new.jpg", "old.jpg", "moved.jpg"}
+    finally:
+        watcher.close()
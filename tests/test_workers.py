@@ -0,0 +1,40 @@
+import hashlib
+
+import scripts.validate as validate
+from scripts.workers import run_parallel
+
+
+def square(value):
+    return value * value
+
+
+def test_run_parallel_keeps_order():
+    items = list(range(50))
+    expected = [square(item) for item in items]
+
+    assert run_parallel(square, items, jobs=1) == expected
+    assert run_parallel(square, items, jobs=4) == expected
+    assert run_parallel(square, items, jobs=2, processes=True) == expected
+
+
+def test_file_sha256_buffered_and_mmap(tmp_path, monkeypatch):
+    path = tmp_path / "blob.bin"
+    content = bytes(range(256)) * 1000
+    path.write_bytes(content)
+    expected = hashlib.sha256(content).hexdigest()
+
+    assert validate.file_sha256(path, block_size=4096) == expected
+
+    monkeypatch.setattr("scripts.validate.HASH_MMAP_THRESHOLD", 1024)
+    assert validate.file_sha256(path) == expected
+
+
+def test_parallel_validation_report_is_deterministic(temp_images, monkeypatch, capsys):
+    monkeypatch.setattr("scripts.validate.IMAGES_DIR", temp_images)
+
+    validate.main(jobs=1, rehash=True)
+    serial = capsys.readouterr().out
+    validate.main(jobs=4, rehash=True)
+    parallel = capsys.readouterr().out
+
+    assert serial == parallel